@@ -0,0 +1,26 @@
+"""Shared benchmark setup."""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+
+def use_throwaway_database():
+    """Point the server at a fresh database directory, removed at exit; call before importing ``server``.
+
+    Worker processes the benchmark spawns call this again on import and reuse the parent's directory,
+    leaving its removal to the parent. Returns the directory.
+    """
+    if "SAFESPACE_BENCH_DIR" in os.environ:
+        tmp_dir = os.environ["SAFESPACE_BENCH_DIR"]
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix="safespace-bench-")
+        os.environ["SAFESPACE_BENCH_DIR"] = tmp_dir
+        atexit.register(shutil.rmtree, tmp_dir, ignore_errors=True)
+    os.environ["SAFESPACE_DB_PATH"] = os.path.join(tmp_dir, "bench.db")
+    os.environ["SAFESPACE_EXPORT_CACHE_DIR"] = os.path.join(tmp_dir, "export_cache")
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    return tmp_dir
@@ -0,0 +1,152 @@
+"""Measure conversation PDF export time and peak memory: streamed segments vs. one in-memory document.
+
+Each run happens in a forked child so its memory growth is measured on its own. Memory is the child's
+anonymous resident set (Linux), which leaves out database pages SQLite reads through mmap. Streamed
+segments are laid out on the server's CPU worker processes, which are not counted.
+Usage: python backend/benchmarks/conversation_export.py [--messages 100000] [--baseline-messages 20000]
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import random
+import resource
+import threading
+import time
+from datetime import datetime, timedelta
+
+from _support import use_throwaway_database
+
+use_throwaway_database()
+import server  # noqa: E402
+
+WORDS = ["pickup", "school", "weekend", "doctor", "homework", "holiday", "dinner", "the", "at", "on",
+         "practice", "birthday", "schedule", "swap", "late", "tomorrow", "friday", "can", "you", "please"]
+
+
+def seed_conversation(count):
+    """Insert ``count`` messages into a new conversation and return its id"""
+    rng = random.Random(42)
+    started = datetime(2020, 1, 1)
+    with server.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO conversations (title, date) VALUES (?, ?)", (f"Benchmark {count}", "2020-01-01"))
+        conversation_id = cursor.lastrowid
+        rows = []
+        for i in range(count):
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 60)))
+            rewritten = text if rng.random() < 0.9 else text.upper()
+            timestamp = (started + timedelta(minutes=17 * i)).strftime("%Y-%m-%d %H:%M:%S")
+            rows.append(("Parent", "parent@example.com", text, rewritten, conversation_id, timestamp, "father", "mother"))
+        cursor.executemany("""
+            INSERT INTO messages (user_name, user_email, original_message, rewritten_message,
+                                  conversation_id, timestamp, parental_role, recipient_role)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+    return conversation_id
+
+
+def streamed(conversation_id):
+    """The export endpoint's engine: hash pass, then segments rendered and handed on one at a time"""
+    export = server.ConversationExport(conversation_id=conversation_id)
+    with server.get_db_connection() as conn:
+        cursor = conn.cursor()
+        conversation = cursor.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        cursor.execute("SELECT id, rewritten_message, timestamp FROM messages WHERE conversation_id = ? "
+                       "ORDER BY timestamp ASC, id ASC", (conversation_id,))
+        message_ids, conversation_hash = server.hash_conversation_messages(conversation, cursor)
+    size, first_page = 0, None
+    for chunk in server.stream_conversation_pdf(conversation, message_ids, conversation_hash, export):
+        size += len(chunk)
+        if first_page is None and size > 100:
+            first_page = time.perf_counter()
+    return size, first_page
+
+
+def in_memory(conversation_id):
+    """The previous behaviour: every row fetched, one story built and the whole PDF held in a buffer"""
+    export = server.ConversationExport(conversation_id=conversation_id)
+    with server.get_db_connection() as conn:
+        cursor = conn.cursor()
+        conversation = cursor.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        cursor.execute("""
+            SELECT id, user_name, original_message, rewritten_message, timestamp, parental_role, recipient_role
+            FROM messages WHERE conversation_id = ? ORDER BY timestamp ASC, id ASC
+        """, (conversation_id,))
+        messages = cursor.fetchall()
+    _, conversation_hash = server.hash_conversation_messages(conversation, ((m[0], m[3], m[4]) for m in messages))
+    story = server.conversation_export_header(conversation, len(messages), conversation_hash, export)
+    for number, message in enumerate(messages, 1):
+        story.extend(server.message_export_flowables(number, message))
+    buffer = io.BytesIO()
+    server.pdf_document(buffer).build(story)
+    data = buffer.getvalue()
+    return len(data), time.perf_counter()
+
+
+def anonymous_rss_mb():
+    """Resident anonymous memory; the database file mapped by SQLite's mmap is left out"""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(label, export, conversation_id, count, results):
+    """Child process body: run one export and report its timings and peak memory growth"""
+    # The server starts its CPU workers at startup, before any export
+    for future in server.cpu_workers.start():
+        future.result()
+    baseline = anonymous_rss_mb()
+    peak = baseline
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(0.02):
+            peak = max(peak, anonymous_rss_mb())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    size, first_page = export(conversation_id)
+    elapsed = time.perf_counter() - started
+    server.cpu_workers.shutdown()
+    done.set()
+    sampler.join()
+    peak = max(peak, anonymous_rss_mb())
+    results.put(f"{label:<10} messages={count} size={size / 1e6:.1f}MB first_bytes={first_page - started:.1f}s "
+                f"total={elapsed:.1f}s peak_memory_growth={peak - baseline:.0f}MB")
+
+
+def run(label, export, conversation_id, count):
+    results = multiprocessing.Queue()
+    child = multiprocessing.Process(target=measure, args=(label, export, conversation_id, count, results))
+    child.start()
+    print(results.get())
+    child.join()
+
+
+def main(args):
+    multiprocessing.set_start_method("fork")
+    sizes = sorted({args.baseline_messages, args.messages})
+    conversations = {}
+    for count in sizes:
+        print(f"Seeding {count} messages into {os.environ['SAFESPACE_DB_PATH']}")
+        conversations[count] = seed_conversation(count)
+    server.db_pool.close_all()
+
+    run("in-memory", in_memory, conversations[args.baseline_messages], args.baseline_messages)
+    for count in sizes:
+        run("streamed", streamed, conversations[count], count)
+    server.db_executor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--baseline-messages", type=int, default=20_000,
+                        help="conversation size for the in-memory comparison, which needs far more memory")
+    main(parser.parse_args())
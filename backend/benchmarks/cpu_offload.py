@@ -0,0 +1,103 @@
+"""Measure event-loop lag while PDF rendering and text extraction run on threads vs. the CPU worker processes.
+
+Threads were the previous behaviour (the database executor or asyncio.to_thread): the work holds the GIL,
+so the event loop, and every websocket it serves, waits behind it.
+Usage: python backend/benchmarks/cpu_offload.py [--jobs 8] [--paragraphs 400] [--pages 40]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from pathlib import Path
+
+from _support import use_throwaway_database
+
+TMP_DIR = use_throwaway_database()
+import server  # noqa: E402
+
+WORDS = ["pickup", "school", "weekend", "doctor", "homework", "holiday", "dinner",
+         "practice", "birthday", "schedule", "swap", "late", "tomorrow", "friday"]
+
+PROBE_INTERVAL = 0.005
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def build_tasks(args):
+    """(function, args) for a mix of journal PDFs, conversation segments and PDF text extraction"""
+    rng = random.Random(42)
+    journal = {'entry': ["Benchmark", "\n".join(sentence(rng, 40) for _ in range(args.paragraphs)), "calm",
+                         "2024-01-01 10:00", "parent@example.com", "2024-01-01 10:00"],
+               'files': [["receipt.pdf", "pdf", 120000]]}
+    messages = [(i, "Parent", text, text, f"2024-01-01 10:{i % 60:02d}:00", "father", "mother")
+                for i, text in ((i, sentence(rng, 30)) for i in range(server.EXPORT_SEGMENT_MESSAGES))]
+    document = Path(TMP_DIR) / "document.pdf"
+    pages = [server.Paragraph(sentence(rng, 400), server.getSampleStyleSheet()['Normal']) for _ in range(args.pages)]
+    server.SimpleDocTemplate(str(document), pagesize=server.letter).build(pages)
+
+    tasks = []
+    for job in range(args.jobs):
+        tasks.append((server.render_export, ('journal_entry', journal, os.path.join(TMP_DIR, f"journal-{job}.pdf"))))
+        tasks.append((server.render_conversation_segment, (messages, 1)))
+        tasks.append((server.extract_document_pages, (document,)))
+    return tasks
+
+
+async def probe_lag(stop, samples):
+    """Record how late each short sleep wakes up while the loop is busy"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append((time.perf_counter() - started - PROBE_INTERVAL) * 1000)
+
+
+async def on_threads(func, args):
+    await asyncio.to_thread(func, *args)
+
+
+async def on_cpu_workers(func, args):
+    await server.cpu_workers.run(func, *args)
+
+
+async def measure(label, runner, tasks):
+    samples = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(stop, samples))
+    await asyncio.sleep(PROBE_INTERVAL * 4)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(runner(func, args) for func, args in tasks))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<12} tasks={len(tasks)} wall={elapsed:.2f}s probes={len(samples)} "
+          f"lag_mean={statistics.mean(samples):.1f}ms lag_p99={p99:.1f}ms lag_max={samples[-1]:.1f}ms")
+
+
+async def main(args):
+    tasks = build_tasks(args)
+    print(f"{len(tasks)} tasks, {server.CPU_WORKERS} CPU workers, {os.cpu_count()} CPUs")
+    await measure("threads", on_threads, tasks)
+
+    # Workers are started and warmed at server startup, before requests arrive
+    await asyncio.gather(*map(asyncio.wrap_future, server.cpu_workers.start()))
+    await measure("cpu_workers", on_cpu_workers, tasks)
+    server.cpu_workers.shutdown()
+    server.db_executor.shutdown()
+    server.db_pool.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=8, help="journal PDFs, conversation segments and extractions each")
+    parser.add_argument("--paragraphs", type=int, default=400, help="paragraphs per journal entry")
+    parser.add_argument("--pages", type=int, default=40, help="pages in the PDF whose text is extracted")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,93 @@
+"""Measure event-loop lag while message searches run inline vs. on the database executor.
+
+Usage: python backend/benchmarks/event_loop_lag.py [--messages 200000] [--requests 32]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+from _support import use_throwaway_database
+
+use_throwaway_database()
+import server  # noqa: E402
+
+WORDS = ["pickup", "school", "weekend", "doctor", "homework", "holiday", "dinner",
+         "practice", "birthday", "schedule", "swap", "late", "tomorrow", "friday"]
+
+PROBE_INTERVAL = 0.005
+
+
+def seed_messages(count):
+    """Insert ``count`` synthetic messages into one conversation"""
+    rng = random.Random(42)
+    with server.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO conversations (title, date) VALUES (?, ?)", ("Benchmark", "2024-01-01"))
+        conversation_id = cursor.lastrowid
+        rows = []
+        for i in range(count):
+            text = " ".join(rng.choice(WORDS) for _ in range(12))
+            rows.append(("Parent", "parent@example.com", text, text, conversation_id,
+                         f"2024-01-01 00:{(i // 60) % 60:02d}:{i % 60:02d}", "father", "mother"))
+        cursor.executemany("""
+            INSERT INTO messages (user_name, user_email, original_message, rewritten_message,
+                                  conversation_id, timestamp, parental_role, recipient_role)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+
+async def probe_lag(stop, samples):
+    """Record how late each short sleep wakes up while the loop is busy"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append((time.perf_counter() - started - PROBE_INTERVAL) * 1000)
+
+
+async def run_inline(search):
+    """Old behaviour: the synchronous handler body runs on the event loop thread"""
+    server.search_messages.__wrapped__(search, server.Response(), None)
+
+
+async def run_offloaded(search):
+    """New behaviour: the handler runs on the database executor"""
+    await server.search_messages(search, server.Response(), None)
+
+
+async def measure(label, handler, requests):
+    samples = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(stop, samples))
+    await asyncio.sleep(PROBE_INTERVAL * 4)
+
+    started = time.perf_counter()
+    searches = [server.MessageSearch(query=random.choice(WORDS)) for _ in range(requests)]
+    await asyncio.gather(*(handler(search) for search in searches))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<10} requests={requests} wall={elapsed:.2f}s probes={len(samples)} "
+          f"lag_mean={statistics.mean(samples):.1f}ms lag_p99={p99:.1f}ms lag_max={samples[-1]:.1f}ms")
+
+
+async def main(args):
+    print(f"Seeding {args.messages} messages into {os.environ['SAFESPACE_DB_PATH']}")
+    seed_messages(args.messages)
+    await measure("inline", run_inline, args.requests)
+    await measure("offloaded", run_offloaded, args.requests)
+    server.db_executor.shutdown()
+    server.db_pool.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,141 @@
+"""Measure message search latency with FTS5 against the old LIKE '%q%' scan.
+
+Usage: python backend/benchmarks/message_search.py [--messages 1000000] [--queries 200]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+from _support import use_throwaway_database
+
+use_throwaway_database()
+import server  # noqa: E402
+
+COMMON = ["pickup", "school", "weekend", "doctor", "homework", "holiday", "dinner", "the", "at", "on",
+          "practice", "birthday", "schedule", "swap", "late", "tomorrow", "friday", "can", "you", "please"]
+SENDERS = ["Sarah Johnson", "John Smith", "Maria Garcia", "David Lee"]
+CONVERSATIONS = 200
+
+
+def make_vocabulary(rng, size=20_000):
+    """Common co-parenting words plus a long tail of rarer ones, drawn with a Zipf-like skew"""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    tail = {"".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)}
+    vocabulary = COMMON + sorted(tail)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return vocabulary, weights
+
+
+def seed_messages(count, rng, vocabulary, weights):
+    """Insert ``count`` messages spread over ``CONVERSATIONS`` conversations; triggers fill the FTS index"""
+    with server.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("INSERT INTO conversations (title, date) VALUES (?, ?)",
+                           [(f"Conversation {i}", "2024-01-01") for i in range(CONVERSATIONS)])
+        batch = []
+        for i in range(count):
+            text = " ".join(rng.choices(vocabulary, weights, k=rng.randint(8, 30)))
+            day = i * 365 // count
+            batch.append((rng.choice(SENDERS), "parent@example.com", text, text, rng.randint(1, CONVERSATIONS),
+                          f"2024-{day // 31 + 1:02d}-{day % 28 + 1:02d} 12:00:00", "father", "mother"))
+            if len(batch) == 50_000:
+                cursor.executemany("""
+                    INSERT INTO messages (user_name, user_email, original_message, rewritten_message,
+                                          conversation_id, timestamp, parental_role, recipient_role)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, batch)
+                conn.commit()
+                batch = []
+        if batch:
+            cursor.executemany("""
+                INSERT INTO messages (user_name, user_email, original_message, rewritten_message,
+                                      conversation_id, timestamp, parental_role, recipient_role)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, batch)
+            conn.commit()
+
+
+def make_searches(count, rng, vocabulary):
+    """(kind, search) pairs: rare words, typed-so-far prefixes, two-word queries and filtered common words"""
+    searches = []
+    for i in range(count):
+        word = rng.choice(vocabulary[len(COMMON):])
+        kind = ("word", "prefix", "two-word", "filtered")[i % 4]
+        if kind == "word":
+            search = server.MessageSearch(query=word)
+        elif kind == "prefix":
+            search = server.MessageSearch(query=word[:3])
+        elif kind == "two-word":
+            search = server.MessageSearch(query=f"{rng.choice(COMMON)} {word}")
+        else:
+            search = server.MessageSearch(query=rng.choice(COMMON), conversation_id=rng.randint(1, CONVERSATIONS),
+                                          sender=rng.choice(SENDERS).split()[0], date_from="2024-06-01")
+        searches.append((kind, search))
+    return searches
+
+
+def like_search(search):
+    """The previous implementation: leading-wildcard LIKE over messages joined to conversations"""
+    with server.get_db_connection() as conn:
+        cursor = conn.cursor()
+        query = """
+            SELECT m.*, c.title FROM messages m JOIN conversations c ON m.conversation_id = c.id
+            WHERE (m.rewritten_message LIKE ? OR m.user_name LIKE ?)
+        """
+        params = [f"%{search.query}%", f"%{search.query}%"]
+        if search.conversation_id:
+            query += " AND m.conversation_id = ?"
+            params.append(search.conversation_id)
+        if search.date_from:
+            query += " AND m.timestamp >= ?"
+            params.append(search.date_from)
+        if search.sender:
+            query += " AND m.user_name LIKE ?"
+            params.append(f"%{search.sender}%")
+        cursor.execute(query + " ORDER BY m.timestamp DESC LIMIT 100", params)
+        return cursor.fetchall()
+
+
+def report(label, timings):
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<15} queries={len(timings)} mean={statistics.mean(timings):.1f}ms "
+          f"p50={timings[len(timings) // 2]:.1f}ms p95={p95:.1f}ms max={timings[-1]:.1f}ms")
+
+
+def measure(label, handler, searches):
+    by_kind = {}
+    for kind, search in searches:
+        started = time.perf_counter()
+        handler(search)
+        by_kind.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+    report(label, [timing for timings in by_kind.values() for timing in timings])
+    if len(by_kind) > 1:
+        for kind, timings in by_kind.items():
+            report(f"  {kind}", timings)
+
+
+def main(args):
+    rng = random.Random(42)
+    vocabulary, weights = make_vocabulary(rng)
+    print(f"Seeding {args.messages} messages into {os.environ['SAFESPACE_DB_PATH']}")
+    started = time.perf_counter()
+    seed_messages(args.messages, rng, vocabulary, weights)
+    print(f"Seeded and indexed in {time.perf_counter() - started:.0f}s")
+
+    searches = make_searches(args.queries, rng, vocabulary)
+    measure("fts5", lambda search: server.search_messages.__wrapped__(search, server.Response(), None), searches)
+    measure("like", like_search, searches[:args.like_queries])
+    server.db_executor.shutdown()
+    server.db_pool.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--like-queries", type=int, default=10, help="the LIKE scan is slow; time only this many")
+    main(parser.parse_args())
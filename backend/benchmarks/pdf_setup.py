@@ -0,0 +1,76 @@
+"""Measure per-export ReportLab setup cost: a fresh style sheet and table styles per call vs. the shared registry.
+
+Also times each PDF generator end to end, to show what share of an export the setup was.
+Usage: python backend/benchmarks/pdf_setup.py [--repeat 200]
+"""
+
+import argparse
+import io
+import time
+
+from _support import use_throwaway_database
+
+use_throwaway_database()
+import server  # noqa: E402
+
+# Table styles each generator built per export; a conversation segment built one per message as well
+TABLES = {
+    'verification': ['information', 'verification', 'access'],
+    'journal': ['information', 'attachments'],
+    'conversation segment': ['information', 'verification'] + ['message'] * server.EXPORT_SEGMENT_MESSAGES,
+}
+
+
+def previous_setup(tables):
+    """What every export did before: build the sample style sheet and its table styles from scratch"""
+    styles = server.getSampleStyleSheet()
+    styles['Title'].textColor = server.colors.darkblue
+    return styles, [server.TableStyle(server.PDF_TABLE_STYLES[name].getCommands()) for name in tables]
+
+
+def registry_setup(tables):
+    """The same lookups against the shared, prebuilt registry"""
+    return server.PDF_STYLES, [server.PDF_TABLE_STYLES[name] for name in tables]
+
+
+def per_call_us(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1e6 / repeat
+
+
+def generators():
+    record = {'id': 1, 'title': 'Parenting plan', 'category': 'parenting_plans', 'original_file_name': 'plan.pdf',
+              'file_type': 'pdf', 'file_size': 120000, 'file_hash': 'ab' * 32, 'hash_algorithm': 'SHA-256',
+              'uploaded_by': 'parent@example.com', 'upload_date': '2024-01-01 10:00:00', 'is_verified': True}
+    journal = {'entry': ["Benchmark", "\n".join(f"Paragraph {i} about the weekend pickup." for i in range(20)),
+                         "calm", "2024-01-01 10:00", "parent@example.com", "2024-01-01 10:00"],
+               'files': [["receipt.pdf", "pdf", 120000]]}
+    messages = [(i, "Parent", f"Message {i}", f"Message {i}", "2024-01-01 10:00:00", "father", "mother")
+                for i in range(server.EXPORT_SEGMENT_MESSAGES)]
+    header = ((1, "Benchmark", "2024-01-01"), len(messages), "ab" * 32, server.ConversationExport(conversation_id=1))
+    return {
+        'verification': lambda: server.UnalterableRecordsManager().generate_verification_pdf(record, "parent@example.com"),
+        'journal': lambda: server.write_journal_entry_pdf(journal, io.BytesIO()),
+        'conversation segment': lambda: server.render_conversation_segment(messages, 1, header),
+    }
+
+
+def main(args):
+    renders = generators()
+    for name, tables in TABLES.items():
+        before = per_call_us(lambda: previous_setup(tables), args.repeat)
+        after = per_call_us(lambda: registry_setup(tables), args.repeat)
+        render_repeat = max(1, args.repeat // (50 if name == 'conversation segment' else 10))
+        render = per_call_us(renders[name], render_repeat)
+        print(f"{name:<21} setup_before={before:.1f}us setup_after={after:.1f}us "
+              f"render={render / 1000:.1f}ms setup_share_before={before / render * 100:.2f}%")
+    server.db_executor.shutdown()
+    server.db_pool.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,57 @@
+"""Compare time-to-first-token and input tokens for compliance prompts with and without prompt caching.
+
+Needs ANTHROPIC_API_KEY. Usage: python backend/benchmarks/prompt_cache.py [--calls 10] [--orders-file orders.txt]
+"""
+
+import argparse
+import asyncio
+from pathlib import Path
+
+from _support import use_throwaway_database
+
+use_throwaway_database()
+import server  # noqa: E402
+
+SAMPLE_ORDERS = "\n".join(
+    f"{i}. The parties must communicate respectfully about the children's schedule, schooling, health and "
+    f"activities, and must not use the children to pass messages or make demands of the other party."
+    for i in range(1, 41)
+)
+
+MESSAGES = ["Can you pick the kids up at 5 on Friday?", "You never listen, typical.",
+            "Reminder: dentist appointment Tuesday 3pm.", "If you're late again I'll make you regret it."]
+
+
+async def run(label, cached, calls, orders):
+    """Stream ``calls`` compliance checks and collect usage under ``label``"""
+    server.PROMPT_CACHE_ENABLED = cached
+    server.ChatbotModule.preamble_blocks.cache_clear()
+    chatbot = server.ChatbotModule()
+    token = server.llm_call_label.set(label)
+    try:
+        for i in range(calls):
+            prompt = chatbot.construct_compliance_prompt(MESSAGES[i % len(MESSAGES)], orders, "father", "mother")
+            async for _ in server.llm_gateway.stream_text(model=chatbot.model, max_tokens=10, temperature=0.3,
+                                                         system=prompt["system"], messages=prompt["messages"]):
+                pass
+    finally:
+        server.llm_call_label.reset(token)
+
+    stats = server.llm_gateway.stats()["by_label"][label]
+    print(f"{label:<10} calls={stats['requests']} ttft_avg={stats['avg_ttft_ms']}ms latency_avg={stats['avg_latency_ms']}ms "
+          f"input_tokens={stats['input_tokens']} cache_read={stats['cache_read_input_tokens']} "
+          f"cache_write={stats['cache_creation_input_tokens']}")
+
+
+async def main(args):
+    orders = Path(args.orders_file).read_text() if args.orders_file else SAMPLE_ORDERS
+    await run("uncached", False, args.calls, orders)
+    await run("cached", True, args.calls, orders)
+    await server.llm_gateway.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--orders-file")
+    asyncio.run(main(parser.parse_args()))
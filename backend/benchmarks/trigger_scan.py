@@ -0,0 +1,71 @@
+"""Measure trigger-word scan throughput with a large dictionary: Aho-Corasick vs. one regex alternation.
+
+Usage: python backend/benchmarks/trigger_scan.py [--words 10000] [--messages 20000]
+"""
+
+import argparse
+import random
+import re
+import string
+import time
+
+from _support import use_throwaway_database
+
+use_throwaway_database()
+import server  # noqa: E402
+
+FILLER = ["pickup", "school", "weekend", "doctor", "homework", "holiday", "dinner", "the", "at", "on",
+          "practice", "birthday", "schedule", "swap", "late", "tomorrow", "friday", "can", "you", "please"]
+
+
+def make_dictionary(count, rng):
+    """Random words and two-word phrases standing in for a family's trigger list"""
+    words = set()
+    while len(words) < count:
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+        words.add(word if rng.random() < 0.8 else f"{word} {rng.choice(FILLER)}")
+    return sorted(words)
+
+
+def make_messages(count, dictionary, rng, hit_rate=0.05):
+    messages = []
+    for _ in range(count):
+        tokens = [rng.choice(FILLER) for _ in range(rng.randint(8, 40))]
+        if rng.random() < hit_rate:
+            tokens.insert(rng.randrange(len(tokens)), rng.choice(dictionary))
+        messages.append(" ".join(tokens))
+    return messages
+
+
+def run(label, build, scan, messages):
+    started = time.perf_counter()
+    matcher = build()
+    build_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    hits = sum(1 for message in messages if scan(matcher, message))
+    elapsed = time.perf_counter() - started
+    chars = sum(len(message) for message in messages)
+    print(f"{label:<14} build={build_ms:.0f}ms messages={len(messages)} hits={hits} "
+          f"per_message={elapsed / len(messages) * 1e6:.1f}us throughput={chars / elapsed / 1e6:.2f}MB/s")
+
+
+def main(args):
+    rng = random.Random(42)
+    dictionary = make_dictionary(args.words, rng)
+    messages = make_messages(args.messages, dictionary, rng)
+    print(f"Dictionary of {len(dictionary)} trigger words, {len(messages)} messages")
+
+    run("aho-corasick", lambda: server.TriggerWordMatcher(dictionary),
+        lambda matcher, message: matcher.scan(message), messages)
+    run("regex", lambda: re.compile(r"(?<!\w)(?:" + "|".join(map(re.escape, dictionary)) + r")(?!\w)", re.IGNORECASE),
+        lambda pattern, message: pattern.findall(message), messages)
+    server.db_executor.shutdown()
+    server.db_pool.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=20_000)
+    main(parser.parse_args())
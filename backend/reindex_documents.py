@@ -0,0 +1,66 @@
+"""Extract the text of Info Library and Unalterable Records files into the document search index.
+
+Re-reads every entry's file from info_library_files/ or unalterable_records/ in the foreground, for a full
+rebuild after the extraction code changes or files are restored. The server indexes new uploads on its own.
+
+Usage: python backend/reindex_documents.py [--source info_library|unalterable_records] [--only-missing]
+"""
+
+import argparse
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import server  # noqa: E402
+
+
+def entries_to_index(sources, only_missing):
+    """Return (source, entry_id) for every file entry, optionally skipping those already indexed"""
+    entries = []
+    with server.get_db_connection() as conn:
+        for source in sources:
+            file_filter = " WHERE e.is_file" if source == 'info_library' else ""
+            sql = f"""
+                SELECT e.id FROM {source} e
+                LEFT JOIN document_index d ON d.source = ? AND d.entry_id = e.id
+                {file_filter}
+            """
+            if only_missing:
+                sql += (" AND" if file_filter else " WHERE") + " (d.status IS NULL OR d.status IN ('pending', 'failed'))"
+            entries.extend((source, entry_id) for (entry_id,) in conn.execute(sql + " ORDER BY e.id", (source,)))
+    return entries
+
+
+def main(args):
+    sources = [args.source] if args.source else list(server.DOCUMENT_SOURCES)
+    entries = entries_to_index(sources, args.only_missing)
+    print(f"Indexing {len(entries)} documents")
+
+    started = time.perf_counter()
+    statuses = Counter()
+    for done, (source, entry_id) in enumerate(entries, 1):
+        status = server.document_indexer.index(source, entry_id)
+        statuses[status or 'deleted'] += 1
+        if status == 'failed':
+            print(f"  {source} {entry_id}: extraction failed")
+        if done % 100 == 0:
+            print(f"  {done}/{len(entries)}")
+
+    with server.get_db_connection() as conn:
+        pages = conn.execute("SELECT COUNT(*) FROM document_pages").fetchone()[0]
+    summary = " ".join(f"{status}={count}" for status, count in sorted(statuses.items()))
+    print(f"Done in {time.perf_counter() - started:.1f}s: {summary or 'nothing to do'}; {pages} pages in the index")
+    server.document_indexer.shutdown()
+    server.cpu_workers.shutdown()
+    server.db_executor.shutdown()
+    server.db_pool.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", choices=sorted(server.DOCUMENT_SOURCES))
+    parser.add_argument("--only-missing", action="store_true", help="skip entries that are already indexed")
+    main(parser.parse_args())
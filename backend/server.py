@@ -4,28 +4,50 @@ import logging
 import os
 import sqlite3
 import hashlib
+import hmac
 import secrets
 import uuid
+import queue
+import threading
+import time
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import pickle
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from types import MappingProxyType
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Literal
 import uvicorn
 import base64
 import mimetypes
 import io
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Form, Depends, Header
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 import anthropic
+import httpx
 from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
 import docx
 import chardet
+import html
 import json
+import math
+import re
+import unicodedata
+import zlib
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib import colors
 from reportlab.lib.units import inch
@@ -45,7 +67,94 @@ JOURNAL_FILES_DIR = BASE_DIR / "journal_files"  # New directory for personal jou
 VAULT_STORAGE_DIR = BASE_DIR / "vault_storage"  # New directory for vault file storage
 SUPPORT_ATTACHMENTS_DIR = BASE_DIR / "support_attachments"  # New directory for support ticket attachments
 DATABASE_DIR = BASE_DIR / "Client_Databases"
-DB_PATH = DATABASE_DIR / "client_database.db"
+DB_PATH = Path(os.environ.get("SAFESPACE_DB_PATH", DATABASE_DIR / "client_database.db"))
+
+# SQLite connection pool settings (override through the environment when sizing the pool)
+DB_POOL_SIZE = int(os.environ.get("SAFESPACE_DB_POOL_SIZE", "8"))
+DB_POOL_MAX_OVERFLOW = int(os.environ.get("SAFESPACE_DB_POOL_MAX_OVERFLOW", "8"))
+DB_POOL_TIMEOUT = float(os.environ.get("SAFESPACE_DB_POOL_TIMEOUT", "10"))
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHE_SIZE_KB = 16 * 1024  # Page cache per connection
+DB_MMAP_SIZE = 256 * 1024 * 1024
+
+# Dedicated executor for blocking database work (one worker per pooled connection)
+DB_EXECUTOR_WORKERS = int(os.environ.get("SAFESPACE_DB_EXECUTOR_WORKERS", str(DB_POOL_SIZE)))
+DB_EXECUTOR_QUEUE_SIZE = int(os.environ.get("SAFESPACE_DB_EXECUTOR_QUEUE_SIZE", "256"))
+DB_EXECUTOR_QUEUE_TIMEOUT = float(os.environ.get("SAFESPACE_DB_EXECUTOR_QUEUE_TIMEOUT", "30"))
+
+# Worker processes for CPU-bound PDF rendering and document text extraction
+CPU_WORKERS = int(os.environ.get("SAFESPACE_CPU_WORKERS", "2"))
+# Workers are spawned, so each imports this module afresh. The server records its pid here before starting
+# them; a worker that finds its parent's pid skips the server's startup work (migrations, default users,
+# the LLM client)
+CPU_WORKER_PARENT_ENV = "SAFESPACE_CPU_WORKER_PARENT"
+cpu_worker_process = os.environ.get(CPU_WORKER_PARENT_ENV) == str(os.getppid())
+
+# Resolved-session cache and batched last_accessed writes
+SESSION_CACHE_SIZE = int(os.environ.get("SAFESPACE_SESSION_CACHE_SIZE", "10000"))
+SESSION_CACHE_TTL = float(os.environ.get("SAFESPACE_SESSION_CACHE_TTL", "60"))
+SESSION_ACTIVITY_FLUSH_INTERVAL = float(os.environ.get("SAFESPACE_SESSION_ACTIVITY_FLUSH_INTERVAL", "5"))
+SESSION_LIFETIME_DAYS = 30
+
+# Shared LLM gateway settings
+LLM_MAX_CONCURRENCY = int(os.environ.get("SAFESPACE_LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("SAFESPACE_LLM_MAX_CONNECTIONS", "64"))
+LLM_TIMEOUT = float(os.environ.get("SAFESPACE_LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.environ.get("SAFESPACE_LLM_MAX_RETRIES", "2"))
+# Start rewrites alongside the compliance check and discard them if the message passes
+SPECULATIVE_REWRITE = os.environ.get("SAFESPACE_SPECULATIVE_REWRITE", "").lower() in ("1", "true", "yes")
+# Message evaluation engine: "multi" (separate compliance/rewrite/translate prompts) or "structured" (one JSON call)
+EVALUATION_ENGINE = os.environ.get("SAFESPACE_EVALUATION_ENGINE", "multi").lower()
+# Mark the Family Violence Act and orders system blocks as cacheable prompt prefixes
+PROMPT_CACHE_ENABLED = os.environ.get("SAFESPACE_PROMPT_CACHE", "1").lower() not in ("0", "false", "no")
+
+# Evaluation/rewrite/translation result cache (memory LRU in front of a SQLite table)
+EVALUATION_CACHE_ENABLED = os.environ.get("SAFESPACE_EVALUATION_CACHE", "1").lower() not in ("0", "false", "no")
+EVALUATION_CACHE_SIZE = int(os.environ.get("SAFESPACE_EVALUATION_CACHE_SIZE", "5000"))
+EVALUATION_CACHE_TTL = float(os.environ.get("SAFESPACE_EVALUATION_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Optional HMAC-signed session tokens carrying user id, session id, generation and expiry
+SIGNED_TOKENS_ENABLED = os.environ.get("SAFESPACE_SIGNED_TOKENS", "").lower() in ("1", "true", "yes")
+TOKEN_SECRET = os.environ.get("SAFESPACE_TOKEN_SECRET", "")
+SIGNED_TOKEN_CACHE_TTL = float(os.environ.get("SAFESPACE_SIGNED_TOKEN_CACHE_TTL", "900"))
+
+# Local pre-screen in front of LLM evaluation: "off", "shadow" (score and log only) or "on" (skip the LLM when confidently benign)
+PRESCREEN_MODE = os.environ.get("SAFESPACE_PRESCREEN", "off").lower()
+PRESCREEN_THRESHOLD = float(os.environ.get("SAFESPACE_PRESCREEN_THRESHOLD", "0.05"))
+PRESCREEN_MODEL_PATH = Path(os.environ.get("SAFESPACE_PRESCREEN_MODEL", Path(__file__).parent / "prescreen_model.json"))
+
+# Conversation timeline page sizes
+MESSAGE_PAGE_SIZE = int(os.environ.get("SAFESPACE_MESSAGE_PAGE_SIZE", "50"))
+MESSAGE_PAGE_SIZE_MAX = 500
+
+# Message search: results per query, and how many of the newest matches are ranked by BM25
+SEARCH_RESULT_LIMIT = 100
+SEARCH_CANDIDATES = int(os.environ.get("SAFESPACE_SEARCH_CANDIDATES", "1000"))
+# Document search: characters per section for files without real pages, and pages shown per matching entry
+DOCUMENT_SECTION_CHARS = int(os.environ.get("SAFESPACE_DOCUMENT_SECTION_CHARS", "3000"))
+DOCUMENT_MATCHES_PER_ENTRY = 3
+
+# Conversation PDF export: messages rendered per segment
+EXPORT_SEGMENT_MESSAGES = int(os.environ.get("SAFESPACE_EXPORT_SEGMENT_MESSAGES", "250"))
+# Export jobs: where finished PDFs are cached, and days an unused PDF or finished job is kept
+EXPORT_CACHE_DIR = Path(os.environ.get("SAFESPACE_EXPORT_CACHE_DIR", BASE_DIR / "export_cache"))
+EXPORT_CACHE_DAYS = float(os.environ.get("SAFESPACE_EXPORT_CACHE_DAYS", "30"))
+EXPORT_LAYOUT_VERSION = 2  # part of every cache key; bump when the PDF layout changes so cached copies are re-rendered
+
+# Seconds between runs of periodic cleanup such as pruning the export cache
+MAINTENANCE_INTERVAL = float(os.environ.get("SAFESPACE_MAINTENANCE_INTERVAL", "3600"))
+
+# Delta sync: change_log rows returned per /api/sync call, and days they are kept
+SYNC_PAGE_SIZE = int(os.environ.get("SAFESPACE_SYNC_PAGE_SIZE", "1000"))
+SYNC_RETENTION_DAYS = float(os.environ.get("SAFESPACE_SYNC_RETENTION_DAYS", "30"))
+
+# WebSocket fan-out: per-connection send queue depth, and how long a send may block before the client is evicted
+WS_SEND_QUEUE_SIZE = int(os.environ.get("SAFESPACE_WS_SEND_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT = float(os.environ.get("SAFESPACE_WS_SEND_TIMEOUT", "5"))
+# Websocket event broker: "local" (single process) or "sqlite" (shared notify table polled by every worker)
+WS_BROKER = os.environ.get("SAFESPACE_WS_BROKER", "local").lower()
+WS_BROKER_POLL_INTERVAL = float(os.environ.get("SAFESPACE_WS_BROKER_POLL_INTERVAL", "0.1"))
+WS_BROKER_RETENTION = float(os.environ.get("SAFESPACE_WS_BROKER_RETENTION", "60"))
 
 # Ensure directories exist
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -56,6 +165,7 @@ JOURNAL_FILES_DIR.mkdir(exist_ok=True)
 VAULT_STORAGE_DIR.mkdir(exist_ok=True)
 SUPPORT_ATTACHMENTS_DIR.mkdir(exist_ok=True)
 DATABASE_DIR.mkdir(exist_ok=True)
+EXPORT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 # Constants
 ANTHROPIC_API_KEY = "sk-ant-REDACTED"
@@ -75,9 +185,161 @@ app.add_middleware(
 # Mount static files - point to the frontend directory
 app.mount("/static", StaticFiles(directory=BASE_DIR / "frontend"), name="static")
 
+# Label attached to LLM calls made in the current task, used to break usage down in metrics
+llm_call_label = contextvars.ContextVar("llm_call_label", default="other")
+
+class LLMGateway:
+    """Single AsyncAnthropic client shared by every LLM call site.
+
+    Requests reuse one pooled HTTP connection set, carry a per-call timeout, and at most
+    ``max_concurrency`` of them are in flight at once per event loop.
+    """
+
+    def __init__(self, api_key: str, max_concurrency: int, max_connections: int, timeout: float, max_retries: int):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._client = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            timeout=timeout,
+            max_retries=max_retries,
+            http_client=anthropic.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            )
+        )
+        self._slots = None
+        self._slots_loop = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._requests = 0
+        self._errors = 0
+        self._timeouts = 0
+        self._latency_seconds = 0.0
+        self._usage_by_label = {}
+
+    def _record_usage(self, response, elapsed, ttft=None):
+        usage = getattr(response, 'usage', None)
+        with self._lock:
+            label_stats = self._usage_by_label.setdefault(llm_call_label.get(), {
+                'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'cache_read_input_tokens': 0,
+                'cache_creation_input_tokens': 0, 'latency_seconds': 0.0, 'streams': 0, 'ttft_seconds': 0.0
+            })
+            label_stats['requests'] += 1
+            label_stats['latency_seconds'] += elapsed
+            if ttft is not None:
+                label_stats['streams'] += 1
+                label_stats['ttft_seconds'] += ttft
+            if usage is not None:
+                for field in ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens'):
+                    label_stats[field] += getattr(usage, field, 0) or 0
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._slots_loop = loop
+        return self._slots
+
+    async def create_message(self, timeout: Optional[float] = None, **kwargs):
+        """Send a Messages API request and return the response"""
+        async with self._get_slots():
+            started = time.monotonic()
+            with self._lock:
+                self._in_flight += 1
+                self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            try:
+                response = await self._client.messages.create(timeout=timeout or self.timeout, **kwargs)
+                self._record_usage(response, time.monotonic() - started)
+                return response
+            except anthropic.APITimeoutError:
+                with self._lock:
+                    self._timeouts += 1
+                raise
+            except Exception:
+                with self._lock:
+                    self._errors += 1
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._requests += 1
+                    self._latency_seconds += time.monotonic() - started
+
+    async def complete(self, timeout: Optional[float] = None, **kwargs) -> str:
+        """Send a Messages API request and return the concatenated text of the reply"""
+        response = await self.create_message(timeout=timeout, **kwargs)
+        return ' '.join([block.text for block in response.content])
+
+    async def stream_text(self, timeout: Optional[float] = None, **kwargs):
+        """Stream a Messages API request, yielding text deltas and recording time to first token"""
+        async with self._get_slots():
+            started = time.monotonic()
+            ttft = None
+            with self._lock:
+                self._in_flight += 1
+                self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            try:
+                async with self._client.messages.stream(timeout=timeout or self.timeout, **kwargs) as stream:
+                    async for text in stream.text_stream:
+                        if ttft is None:
+                            ttft = time.monotonic() - started
+                        yield text
+                    response = await stream.get_final_message()
+                self._record_usage(response, time.monotonic() - started, ttft)
+            except anthropic.APITimeoutError:
+                with self._lock:
+                    self._timeouts += 1
+                raise
+            except Exception:
+                with self._lock:
+                    self._errors += 1
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._requests += 1
+                    self._latency_seconds += time.monotonic() - started
+
+    async def close(self):
+        await self._client.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'timeout_seconds': self.timeout,
+                'in_flight': self._in_flight,
+                'peak_in_flight': self._peak_in_flight,
+                'requests': self._requests,
+                'errors': self._errors,
+                'timeouts': self._timeouts,
+                'avg_latency_ms': round(self._latency_seconds / self._requests * 1000, 1) if self._requests else 0.0,
+                'by_label': {
+                    label: {
+                        'requests': stats['requests'],
+                        'input_tokens': stats['input_tokens'],
+                        'output_tokens': stats['output_tokens'],
+                        'cache_read_input_tokens': stats['cache_read_input_tokens'],
+                        'cache_creation_input_tokens': stats['cache_creation_input_tokens'],
+                        'avg_latency_ms': round(stats['latency_seconds'] / stats['requests'] * 1000, 1),
+                        'avg_ttft_ms': round(stats['ttft_seconds'] / stats['streams'] * 1000, 1) if stats['streams'] else None
+                    }
+                    for label, stats in self._usage_by_label.items()
+                }
+            }
+
 # Initialize Anthropic API client
-client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-logger.info("Anthropic API initialized.")
+llm_gateway = None
+if not cpu_worker_process:
+    llm_gateway = LLMGateway(ANTHROPIC_API_KEY, LLM_MAX_CONCURRENCY, LLM_MAX_CONNECTIONS, LLM_TIMEOUT, LLM_MAX_RETRIES)
+    logger.info("Anthropic API initialized.")
+
+# Display names for the languages users can choose
+LANGUAGE_NAMES = {
+    'en': 'English', 'zh': 'Mandarin Chinese', 'hi': 'Hindi', 'es': 'Spanish',
+    'fr': 'French', 'ar': 'Arabic', 'bn': 'Bengali', 'pt': 'Portuguese', 
+    'ru': 'Russian', 'ja': 'Japanese'
+}
 
 # Pydantic models
 class MessageEvaluation(BaseModel):
@@ -144,6 +406,7 @@ class ProfileEntry(BaseModel):
     usual_address: str
     dob: str
     parental_role: str
+    relationship_id: Optional[int] = None
 
 class InfoLibraryEntry(BaseModel):
     title: str
@@ -283,6 +546,10 @@ class MessageUpdate(BaseModel):
     is_read: bool
     read_by: str
 
+class MessagesReadUpdate(BaseModel):
+    message_ids: List[int]
+    read_by: str
+
 class MessageReport(BaseModel):
     conversation_id: int
     message_id: Optional[int] = None
@@ -297,6 +564,7 @@ class MessageSearch(BaseModel):
     date_from: Optional[str] = None
     date_to: Optional[str] = None
     sender: Optional[str] = None
+    language: Optional[str] = None  # defaults to the caller's language setting
 
 class ConversationExport(BaseModel):
     conversation_id: int
@@ -305,6 +573,14 @@ class ConversationExport(BaseModel):
     format: str = "pdf"  # pdf, json
     include_attachments: bool = False
 
+class ExportJobRequest(BaseModel):
+    kind: Literal["conversation", "journal_entry", "unalterable_record"]
+    conversation_id: Optional[int] = None  # conversation
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    entry_id: Optional[int] = None  # journal_entry, unalterable_record
+    requested_by: Optional[str] = None  # journal owner or record downloader, as the direct export endpoints take it
+
 class NotificationSettings(BaseModel):
     email_notifications: bool = True
     push_notifications: bool = True
@@ -363,749 +639,1555 @@ class ParentSwitchRequest(BaseModel):
 class SubscriptionUpdate(BaseModel):
     subscription_type: str  # 'trial', 'basic', 'premium'
 
-# Database initialization
-def init_db():
-    if not DB_PATH.exists():
-        DATABASE_DIR.mkdir(exist_ok=True)
-    
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        
-        # Create messages table with enhanced features and relationship_id
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_name TEXT,
-                user_email TEXT,
-                original_message TEXT,
-                rewritten_message TEXT,
-                conversation_id INTEGER,
-                timestamp TEXT,
-                parental_role TEXT,
-                recipient_role TEXT,
-                is_read BOOLEAN DEFAULT FALSE,
-                read_at TEXT,
-                read_by TEXT,
-                message_hash TEXT,
-                has_attachments BOOLEAN DEFAULT FALSE,
-                attachment_count INTEGER DEFAULT 0,
-                relationship_id INTEGER,
-                FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Migrate existing messages table if needed
-        cursor.execute("PRAGMA table_info(messages)")
-        message_columns = [row[1] for row in cursor.fetchall()]
-        
-        if 'is_read' not in message_columns:
-            logger.info("Migrating messages table to add new columns...")
-            # Add new columns to existing table
-            new_message_columns = [
-                'is_read BOOLEAN DEFAULT FALSE',
-                'read_at TEXT',
-                'read_by TEXT',
-                'message_hash TEXT',
-                'has_attachments BOOLEAN DEFAULT FALSE',
-                'attachment_count INTEGER DEFAULT 0',
-                'sender_language TEXT DEFAULT "en"',
-                'recipient_language TEXT DEFAULT "en"',
-                'relationship_id INTEGER'
-            ]
-            
-            for column in new_message_columns:
+# SQLite connection pool
+class SQLiteConnectionPool:
+    """Thread-safe pool of tuned SQLite connections shared by every endpoint.
+
+    Connections run in WAL mode so readers no longer block on writers. When all
+    pooled connections are checked out, up to ``max_overflow`` temporary
+    connections are opened; beyond that callers wait up to ``timeout`` seconds.
+    """
+
+    def __init__(self, db_path: Path, pool_size: int, max_overflow: int, timeout: float):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._overflow = 0
+        self._checked_out = 0
+        self._peak_checked_out = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._timeouts = 0
+
+    def _create_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _acquire(self):
+        """Return (connection, is_overflow), opening or waiting for one as needed"""
+        try:
+            conn = self._idle.get_nowait()
+            is_overflow = False
+        except queue.Empty:
+            with self._lock:
+                if self._opened < self.pool_size:
+                    self._opened += 1
+                    action = 'open'
+                elif self._overflow < self.max_overflow:
+                    self._overflow += 1
+                    action = 'overflow'
+                else:
+                    self._waits += 1
+                    action = 'wait'
+
+            is_overflow = action == 'overflow'
+            if action == 'wait':
+                wait_started = time.monotonic()
                 try:
-                    cursor.execute(f"ALTER TABLE messages ADD COLUMN {column}")
-                    logger.info(f"Added column to messages: {column}")
-                except sqlite3.OperationalError as e:
-                    if "duplicate column name" not in str(e):
-                        logger.error(f"Error adding column {column} to messages: {e}")
-        
-        # Check if relationship_id already exists
-        if 'relationship_id' not in message_columns:
-            try:
-                cursor.execute("ALTER TABLE messages ADD COLUMN relationship_id INTEGER")
-                logger.info("Added relationship_id to messages table")
-            except sqlite3.OperationalError as e:
-                if "duplicate column name" not in str(e):
-                    logger.error(f"Error adding relationship_id to messages: {e}")
-        
-        # Create dual-language message translations table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS message_translations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                message_id INTEGER NOT NULL,
-                language_code TEXT NOT NULL,
-                original_text TEXT NOT NULL,
-                rewritten_text TEXT NOT NULL,
-                created_date TEXT NOT NULL,
-                FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE,
-                UNIQUE(message_id, language_code)
-            )
-        """)
-        
-        # Create message_attachments table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS message_attachments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                message_id INTEGER NOT NULL,
-                original_filename TEXT NOT NULL,
-                stored_filename TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                file_type TEXT,
-                file_size INTEGER,
-                uploaded_by TEXT NOT NULL,
-                upload_date TEXT NOT NULL,
-                file_hash TEXT,
-                FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create conversation_reports table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS conversation_reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                conversation_id INTEGER NOT NULL,
-                message_id INTEGER,
-                reported_by TEXT NOT NULL,
-                report_type TEXT NOT NULL,
-                reason TEXT NOT NULL,
-                description TEXT,
-                report_date TEXT NOT NULL,
-                status TEXT DEFAULT 'Open',
-                reviewed_by TEXT,
-                reviewed_date TEXT,
-                FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE,
-                FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE SET NULL
-            )
-        """)
-        
-        # Create message_notifications table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS message_notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                message_id INTEGER NOT NULL,
-                conversation_id INTEGER NOT NULL,
-                notification_type TEXT NOT NULL,
-                is_sent BOOLEAN DEFAULT FALSE,
-                sent_at TEXT,
-                email_sent BOOLEAN DEFAULT FALSE,
-                push_sent BOOLEAN DEFAULT FALSE,
-                created_date TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE,
-                FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS orders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                description TEXT,
-                date TEXT,
-                relationship_id INTEGER,
-                FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create conversations table with relationship support
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT,
-                date TEXT,
-                relationship_id INTEGER,
-                FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create calendar table with relationship support and soft delete
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS calendar (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                event_label TEXT,
-                event_time TEXT,
-                repeat_occurrence TEXT,
-                created_by TEXT,
-                created_date TEXT,
-                is_active BOOLEAN DEFAULT TRUE,
-                deleted_date TEXT,
-                deleted_by TEXT,
-                relationship_id INTEGER,
-                FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Enhanced financial table for Accountable Payments with relationship support
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS financial (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type TEXT,
-                category TEXT,
-                amount REAL,
-                description TEXT,
-                payment_method TEXT,
-                merchant TEXT,
-                payment_date TEXT,
-                notes TEXT,
-                receipt_filename TEXT,
-                receipt_ocr_data TEXT,
-                receipt_human_readable TEXT,
-                payment_type TEXT DEFAULT 'expense',
-                date TEXT,
-                created_by TEXT,
-                relationship_id INTEGER,
-                FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Migrate existing financial table if needed
-        cursor.execute("PRAGMA table_info(financial)")
-        columns = [row[1] for row in cursor.fetchall()]
-        
-        if 'category' not in columns:
-            logger.info("Migrating financial table to add new columns...")
-            # Add new columns to existing table
-            new_columns = [
-                'category TEXT',
-                'payment_method TEXT',
-                'merchant TEXT', 
-                'payment_date TEXT',
-                'notes TEXT',
-                'receipt_filename TEXT',
-                'receipt_ocr_data TEXT',
-                'receipt_human_readable TEXT',
-                'payment_type TEXT DEFAULT "expense"',
-                'relationship_id INTEGER'
-            ]
-            
-            for column in new_columns:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise sqlite3.OperationalError(
+                        f"Database connection pool exhausted after waiting {self.timeout}s"
+                    )
+                finally:
+                    with self._lock:
+                        self._wait_seconds += time.monotonic() - wait_started
+            else:
                 try:
-                    cursor.execute(f"ALTER TABLE financial ADD COLUMN {column}")
-                    logger.info(f"Added column: {column}")
-                except sqlite3.OperationalError as e:
-                    if "duplicate column name" not in str(e):
-                        logger.error(f"Error adding column {column}: {e}")
-        
-        # Check if relationship_id already exists in financial table
-        if 'relationship_id' not in columns:
+                    conn = self._create_connection()
+                except Exception:
+                    with self._lock:
+                        if is_overflow:
+                            self._overflow -= 1
+                        else:
+                            self._opened -= 1
+                    raise
+
+        with self._lock:
+            self._checked_out += 1
+            self._checkouts += 1
+            self._peak_checked_out = max(self._peak_checked_out, self._checked_out)
+        return conn, is_overflow
+
+    def _release(self, conn: sqlite3.Connection, is_overflow: bool, broken: bool = False):
+        with self._lock:
+            self._checked_out -= 1
+            if is_overflow:
+                self._overflow -= 1
+            elif broken:
+                self._opened -= 1
+        if is_overflow or broken:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; commits on success and rolls back on error like sqlite3's own context manager"""
+        conn, is_overflow = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except BaseException:
             try:
-                cursor.execute("ALTER TABLE financial ADD COLUMN relationship_id INTEGER")
-                logger.info("Added relationship_id to financial table")
-            except sqlite3.OperationalError as e:
-                if "duplicate column name" not in str(e):
-                    logger.error(f"Error adding relationship_id to financial: {e}")
-        
-        # Migrate other tables to add relationship_id
-        tables_to_migrate = ['calendar', 'conversations', 'orders', 'info_log', 'personal_journal']
-        for table_name in tables_to_migrate:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+            raise
+        else:
+            conn.commit()
+        finally:
+            self._release(conn, is_overflow, broken)
+
+    def close_all(self):
+        """Close every idle pooled connection (used on shutdown)"""
+        while True:
             try:
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                table_columns = [row[1] for row in cursor.fetchall()]
-                if 'relationship_id' not in table_columns:
-                    cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN relationship_id INTEGER")
-                    logger.info(f"Added relationship_id to {table_name} table")
-            except sqlite3.OperationalError as e:
-                if "duplicate column name" not in str(e):
-                    logger.error(f"Error adding relationship_id to {table_name}: {e}")
-        
-        # Migrate calendar table to add soft delete columns
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
+            conn.close()
+
+    def stats(self) -> dict:
+        """Pool saturation metrics for sizing DB_POOL_SIZE / DB_POOL_MAX_OVERFLOW"""
+        with self._lock:
+            capacity = self.pool_size + self.max_overflow
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'open_connections': self._opened + self._overflow,
+                'idle_connections': self._idle.qsize(),
+                'checked_out': self._checked_out,
+                'overflow_in_use': self._overflow,
+                'peak_checked_out': self._peak_checked_out,
+                'saturation': round(self._checked_out / capacity, 3) if capacity else 0.0,
+                'total_checkouts': self._checkouts,
+                'waits': self._waits,
+                'avg_wait_ms': round(self._wait_seconds * 1000 / self._waits, 2) if self._waits else 0.0,
+                'timeouts': self._timeouts
+            }
+
+db_pool = SQLiteConnectionPool(DB_PATH, DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_TIMEOUT)
+
+# Async data-access layer
+class DatabaseExecutor:
+    """Runs blocking sqlite work on a dedicated thread pool so the event loop never waits on the database.
+
+    At most ``max_workers + max_queue`` jobs are admitted at once; further callers wait for a
+    slot and receive a 503 if none frees up within ``queue_timeout`` seconds.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, queue_timeout: float):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="safespace-db")
+        self._slots = None
+        self._slots_loop = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._peak_pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._queue_wait_seconds = 0.0
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+            self._slots_loop = loop
+        return self._slots
+
+    def _run_job(self, func, args, kwargs, queued_at):
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+            self._queue_wait_seconds += time.monotonic() - queued_at
         try:
-            cursor.execute("PRAGMA table_info(calendar)")
-            calendar_columns = [row[1] for row in cursor.fetchall()]
-            if 'is_active' not in calendar_columns:
-                cursor.execute("ALTER TABLE calendar ADD COLUMN is_active BOOLEAN DEFAULT TRUE")
-                cursor.execute("ALTER TABLE calendar ADD COLUMN deleted_date TEXT")
-                cursor.execute("ALTER TABLE calendar ADD COLUMN deleted_by TEXT")
-                logger.info("Added soft delete columns to calendar table")
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" not in str(e):
-                logger.error(f"Error adding soft delete columns to calendar: {e}")
-        
-        # Create payment suggestions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS payment_suggestions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                payment_id INTEGER,
-                suggested_to TEXT,
-                suggested_amount REAL,
-                reason TEXT,
-                status TEXT DEFAULT 'pending',
-                proof_filename TEXT,
-                proof_ocr_data TEXT,
-                created_by TEXT,
-                created_date TEXT,
-                response_date TEXT,
-                FOREIGN KEY (payment_id) REFERENCES financial (id)
-            )
-        """)
-        
-        # Create info_log table with relationship support
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS info_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                child_name TEXT,
-                type TEXT,
-                description TEXT,
-                date TEXT,
-                created_by TEXT,
-                relationship_id INTEGER,
-                FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create profiles table (keeping global as it's user-specific)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS profiles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                trigger_words TEXT,
-                pronouns TEXT,
-                preferred_name_a TEXT,
-                preferred_name_b TEXT,
-                alternate_contact TEXT,
-                children_names TEXT,
-                emergency_contact TEXT,
-                postcode TEXT,
-                usual_address TEXT,
-                dob TEXT,
-                parental_role TEXT,
-                created_date TEXT
-            )
-        """)
-        
-        # Create info_library table with relationship support
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS info_library (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                category TEXT NOT NULL,
-                file_name TEXT,
-                file_path TEXT,
-                file_type TEXT,
-                file_size INTEGER,
-                is_file BOOLEAN DEFAULT FALSE,
-                uploaded_by TEXT NOT NULL,
-                upload_date TEXT NOT NULL,
-                downloads_log TEXT DEFAULT '',
-                metadata TEXT,
-                relationship_id INTEGER,
-                FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create unalterable_records table with relationship support
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS unalterable_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                category TEXT NOT NULL,
-                file_name TEXT,
-                file_path TEXT,
-                original_file_name TEXT,
-                file_type TEXT,
-                file_size INTEGER,
-                file_hash TEXT NOT NULL,
-                hash_algorithm TEXT DEFAULT 'SHA-256',
-                uploaded_by TEXT NOT NULL,
-                upload_date TEXT NOT NULL,
-                downloads_log TEXT DEFAULT '',
-                access_log TEXT DEFAULT '',
-                is_verified BOOLEAN DEFAULT TRUE,
-                metadata TEXT,
-                relationship_id INTEGER,
-                FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create personal_journal table with relationship support
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS personal_journal (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                mood TEXT,
-                entry_date TEXT NOT NULL,
-                created_by TEXT NOT NULL,
-                created_date TEXT NOT NULL,
-                last_modified TEXT,
-                tags TEXT,
-                relationship_id INTEGER,
-                FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create journal_files table for file attachments
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS journal_files (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                journal_entry_id INTEGER,
-                original_filename TEXT NOT NULL,
-                stored_filename TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                file_type TEXT,
-                file_size INTEGER,
-                uploaded_by TEXT NOT NULL,
-                upload_date TEXT NOT NULL,
-                FOREIGN KEY (journal_entry_id) REFERENCES personal_journal (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create vault_folders table for vault file organization
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS vault_folders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                parent_folder_id INTEGER,
-                created_by TEXT NOT NULL,
-                created_date TEXT NOT NULL,
-                is_shared BOOLEAN DEFAULT FALSE,
-                shared_with TEXT,
-                FOREIGN KEY (parent_folder_id) REFERENCES vault_folders (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create vault_files table for vault file storage
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS vault_files (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                original_filename TEXT NOT NULL,
-                stored_filename TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                file_type TEXT,
-                file_size INTEGER,
-                folder_id INTEGER,
-                uploaded_by TEXT NOT NULL,
-                upload_date TEXT NOT NULL,
-                is_shared BOOLEAN DEFAULT FALSE,
-                shared_with TEXT,
-                file_hash TEXT,
-                FOREIGN KEY (folder_id) REFERENCES vault_folders (id) ON DELETE SET NULL
-            )
-        """)
-        
-        # Create vault_access_logs table for tracking file access
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS vault_access_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                file_id INTEGER NOT NULL,
-                accessed_by TEXT NOT NULL,
-                access_type TEXT NOT NULL,
-                access_date TEXT NOT NULL,
-                ip_address TEXT,
-                user_agent TEXT,
-                FOREIGN KEY (file_id) REFERENCES vault_files (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create support_tickets table for Contact Us functionality
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS support_tickets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ticket_number TEXT UNIQUE NOT NULL,
-                subject TEXT NOT NULL,
-                category TEXT NOT NULL,
-                priority TEXT NOT NULL,
-                description TEXT NOT NULL,
-                status TEXT DEFAULT 'Open',
-                user_name TEXT NOT NULL,
-                user_email TEXT NOT NULL,
-                created_date TEXT NOT NULL,
-                last_updated TEXT NOT NULL,
-                admin_response TEXT,
-                resolved_date TEXT,
-                resolved_by TEXT
-            )
-        """)
-        
-        # Create support_ticket_attachments table for file uploads
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS support_ticket_attachments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ticket_id INTEGER NOT NULL,
-                original_filename TEXT NOT NULL,
-                stored_filename TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                file_type TEXT,
-                file_size INTEGER,
-                uploaded_by TEXT NOT NULL,
-                upload_date TEXT NOT NULL,
-                FOREIGN KEY (ticket_id) REFERENCES support_tickets (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create users table for authentication
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                full_name TEXT NOT NULL,
-                preferred_name TEXT,
-                role TEXT NOT NULL,
-                phone_number TEXT,
-                address TEXT,
-                postcode TEXT,
-                emergency_contact TEXT,
-                emergency_phone TEXT,
-                subscription_type TEXT DEFAULT 'basic',
-                payment_method TEXT,
-                card_last_four TEXT,
-                billing_address TEXT,
-                is_active BOOLEAN DEFAULT TRUE,
-                email_verified BOOLEAN DEFAULT FALSE,
-                created_date TEXT NOT NULL,
-                last_login TEXT,
-                profile_completed BOOLEAN DEFAULT FALSE
-            )
-        """)
-        
-        # Create user_relationships table to link parent accounts
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_relationships (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                other_parent_name TEXT NOT NULL,
-                other_parent_email TEXT NOT NULL,
-                other_parent_role TEXT NOT NULL,
-                other_parent_id INTEGER,
-                relationship_status TEXT DEFAULT 'pending',
-                invitation_sent_date TEXT,
-                invitation_accepted_date TEXT,
-                created_date TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                FOREIGN KEY (other_parent_id) REFERENCES users (id) ON DELETE SET NULL
-            )
-        """)
-        
-        # Create user_children table with relationship support
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_children (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                age INTEGER NOT NULL,
-                created_date TEXT NOT NULL,
-                relationship_id INTEGER,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create user_sessions table for authentication tokens
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                token TEXT UNIQUE NOT NULL,
-                expires_at TEXT NOT NULL,
-                created_date TEXT NOT NULL,
-                last_accessed TEXT,
-                is_active BOOLEAN DEFAULT TRUE,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create user_notifications table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                email_notifications BOOLEAN DEFAULT TRUE,
-                push_notifications BOOLEAN DEFAULT TRUE,
-                message_notifications BOOLEAN DEFAULT TRUE,
-                calendar_notifications BOOLEAN DEFAULT TRUE,
-                payment_notifications BOOLEAN DEFAULT TRUE,
-                created_date TEXT NOT NULL,
-                updated_date TEXT,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create scheduled_calls table for Accountable Calling
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS scheduled_calls (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                caller_id INTEGER NOT NULL,
-                caller_name TEXT NOT NULL,
-                caller_email TEXT NOT NULL,
-                recipient_name TEXT NOT NULL,
-                recipient_email TEXT NOT NULL,
-                scheduled_date TEXT NOT NULL,
-                scheduled_time TEXT NOT NULL,
-                duration_minutes INTEGER NOT NULL,
-                status TEXT DEFAULT 'pending',
-                created_date TEXT NOT NULL,
-                accepted_date TEXT,
-                rejected_date TEXT,
-                completed_date TEXT,
-                notes TEXT,
-                FOREIGN KEY (caller_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create call_sessions table for active calls
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS call_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                scheduled_call_id INTEGER NOT NULL,
-                session_token TEXT UNIQUE NOT NULL,
-                caller_joined_at TEXT,
-                recipient_joined_at TEXT,
-                call_started_at TEXT,
-                call_ended_at TEXT,
-                ended_by TEXT,
-                end_reason TEXT,
-                duration_seconds INTEGER,
-                recording_path TEXT,
-                status TEXT DEFAULT 'waiting',
-                FOREIGN KEY (scheduled_call_id) REFERENCES scheduled_calls (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create call_transcriptions table for real-time transcription
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS call_transcriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                call_session_id INTEGER NOT NULL,
-                speaker TEXT NOT NULL,
-                transcript_text TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                confidence_score REAL,
-                is_final BOOLEAN DEFAULT TRUE,
-                violation_detected BOOLEAN DEFAULT FALSE,
-                violation_type TEXT,
-                ai_analysis TEXT,
-                FOREIGN KEY (call_session_id) REFERENCES call_sessions (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create call_reports table for manual and automatic violations
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS call_reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                call_session_id INTEGER NOT NULL,
-                reported_by TEXT NOT NULL,
-                report_type TEXT NOT NULL,
-                reason TEXT NOT NULL,
-                description TEXT,
-                timestamp TEXT NOT NULL,
-                auto_generated BOOLEAN DEFAULT FALSE,
-                transcript_segment TEXT,
-                violation_category TEXT,
-                severity_level INTEGER DEFAULT 1,
-                FOREIGN KEY (call_session_id) REFERENCES call_sessions (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create call_notifications table for email/push notifications
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS call_notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                scheduled_call_id INTEGER NOT NULL,
-                recipient_email TEXT NOT NULL,
-                notification_type TEXT NOT NULL,
-                sent_at TEXT NOT NULL,
-                email_sent BOOLEAN DEFAULT FALSE,
-                push_sent BOOLEAN DEFAULT FALSE,
-                FOREIGN KEY (scheduled_call_id) REFERENCES scheduled_calls (id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create call_analyses table for post-call AI analysis
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS call_analyses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                call_session_id INTEGER NOT NULL,
-                violations_detected INTEGER DEFAULT 0,
-                violation_details TEXT,
-                call_summary TEXT NOT NULL,
-                content_analysis TEXT,
-                safety_score INTEGER DEFAULT 5,
-                recommendations TEXT,
-                analysis_date TEXT NOT NULL,
-                ai_model_version TEXT DEFAULT 'claude-3-5-sonnet-20241022',
-                FOREIGN KEY (call_session_id) REFERENCES call_sessions (id) ON DELETE CASCADE
-            )
-        """)
-        
-        conn.commit()
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    async def run(self, func, *args, **kwargs):
+        """Run ``func(*args, **kwargs)`` on a database worker thread and await its result"""
+        slots = self._get_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._rejected += 1
+            raise HTTPException(status_code=503, detail="Server is busy, please try again shortly")
 
-# Password hashing utility functions
-def hash_password(password: str) -> str:
-    """Hash a password using SHA-256 with salt"""
-    salt = secrets.token_hex(16)
-    password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-    return f"{salt}:{password_hash}"
+        try:
+            queued_at = time.monotonic()
+            with self._lock:
+                self._pending += 1
+                self._peak_pending = max(self._peak_pending, self._pending)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._run_job, func, args, kwargs, queued_at)
+        finally:
+            slots.release()
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        """Queue ``func(*args, **kwargs)`` from a background thread; not subject to the admission limit"""
+        queued_at = time.monotonic()
+        with self._lock:
+            self._pending += 1
+            self._peak_pending = max(self._peak_pending, self._pending)
+        return self._executor.submit(self._run_job, func, args, kwargs, queued_at)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'running': self._running,
+                'queued': self._pending,
+                'peak_queued': self._peak_pending,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avg_queue_wait_ms': round(self._queue_wait_seconds * 1000 / self._completed, 2) if self._completed else 0.0
+            }
 
-def verify_password(password: str, hashed: str) -> bool:
-    """Verify a password against its hash"""
-    try:
-        salt, password_hash = hashed.split(':')
-        return hashlib.sha256((password + salt).encode()).hexdigest() == password_hash
-    except ValueError:
-        return False
+db_executor = DatabaseExecutor(DB_EXECUTOR_WORKERS, DB_EXECUTOR_QUEUE_SIZE, DB_EXECUTOR_QUEUE_TIMEOUT)
 
-# Create default test users
-def create_default_users():
-    """Create default test users for development/testing"""
+def init_cpu_worker():
+    """Runs once in each new CPU worker: ReportLab loads fonts, and PyPDF2 its parser, on first use"""
+    warmup = io.BytesIO()
+    pdf_document(warmup).build([Paragraph("Safespace", PDF_STYLES['Normal'])])
+    PdfReader(warmup).pages[0].extract_text()
+
+class CPUTaskError(Exception):
+    """A CPU worker task failed with an exception that cannot be sent back to the server as is"""
+
+def run_cpu_task(func, args, kwargs):
+    """CPU worker entry point"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            
-            # Check if test users already exist
-            cursor.execute("SELECT COUNT(*) FROM users WHERE email IN (?, ?)", 
-                          ('mother.test@safespace.com', 'father.test@safespace.com'))
-            if cursor.fetchone()[0] > 0:
-                return  # Test users already exist
-            
-            # Create test mother account
-            mother_id = create_test_user(
-                cursor,
-                email='mother.test@safespace.com',
-                password='TestPassword123!',
-                full_name='Sarah Johnson',
-                preferred_name='Sarah',
-                role='Mother',
-                phone_number='+1 (555) 123-4567',
-                address='123 Main Street, Springfield, IL',
-                postcode='62701',
-                other_parent_name='Michael Johnson',
-                other_parent_email='father.test@safespace.com',
-                other_parent_role='Father'
-            )
-            
-            # Create test father account
-            father_id = create_test_user(
-                cursor,
-                email='father.test@safespace.com',
-                password='TestPassword123!',
-                full_name='Michael Johnson',
-                preferred_name='Mike',
-                role='Father',
-                phone_number='+1 (555) 987-6543',
-                address='456 Oak Avenue, Springfield, IL',
-                postcode='62702',
-                other_parent_name='Sarah Johnson',
-                other_parent_email='mother.test@safespace.com',
-                other_parent_role='Mother'
-            )
-            
-            # Link the accounts
-            cursor.execute("""
-                UPDATE user_relationships 
-                SET other_parent_id = ?, relationship_status = 'accepted', invitation_accepted_date = ?
-                WHERE user_id = ?
-            """, (father_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), mother_id))
-            
-            cursor.execute("""
-                UPDATE user_relationships 
-                SET other_parent_id = ?, relationship_status = 'accepted', invitation_accepted_date = ?
-                WHERE user_id = ?
-            """, (mother_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), father_id))
+        return func(*args, **kwargs)
+    except Exception as e:
+        # Callers get the original exception whenever it survives the trip; some, such as HTTPException,
+        # cannot be unpickled in the server, so those come back as a CPUTaskError naming the original type
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            raise CPUTaskError(f"{type(e).__name__}: {e}") from None
+        raise
+
+class CPUWorkers:
+    """Warm worker processes for CPU-bound pure-Python work: ReportLab layout and PyPDF2/docx text extraction.
+
+    That work holds the GIL however many threads it is spread over, stalling the event loop and every
+    websocket it serves; in separate processes it cannot. Workers are spawned by ``start`` and import this
+    module, ReportLab, PyPDF2 and python-docx once, so requests never wait for that. Functions and their
+    arguments must pickle. Calls made inside a worker run inline.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._restarts = 0
+        self._seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            os.environ[CPU_WORKER_PARENT_ENV] = str(os.getpid())
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_cpu_worker,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def start(self):
+        """Spawn every worker now rather than on first use; returns futures that finish as they come up"""
+        with self._lock:
+            executor = self._get_executor()
+            return [executor.submit(os.getpid) for _ in range(self.workers)]
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        """Run ``func(*args, **kwargs)`` in a worker process; returns a concurrent.futures Future"""
+        if cpu_worker_process:
+            future = Future()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        with self._lock:
+            try:
+                future = self._get_executor().submit(run_cpu_task, func, args, kwargs)
+            except BrokenProcessPool:
+                # A worker died (out of memory, killed), which breaks the whole pool; start a new one
+                self._executor.shutdown(wait=False)
+                self._executor = None
+                self._restarts += 1
+                future = self._get_executor().submit(run_cpu_task, func, args, kwargs)
+            self._running += 1
+        future.add_done_callback(functools.partial(self._task_done, time.monotonic()))
+        return future
+
+    def _task_done(self, started, future):
+        with self._lock:
+            self._running -= 1
+            if future.cancelled() or future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+                self._seconds += time.monotonic() - started
+
+    def call(self, func, *args, **kwargs):
+        """Run ``func`` in a worker and wait for its result, from a thread that may block"""
+        return self.submit(func, *args, **kwargs).result()
+
+    async def run(self, func, *args, **kwargs):
+        """Run ``func`` in a worker and await its result without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'running': self._running,
+                'completed': self._completed,
+                'failed': self._failed,
+                'restarts': self._restarts,
+                'avg_task_ms': round(self._seconds * 1000 / self._completed, 2) if self._completed else 0.0
+            }
+
+cpu_workers = CPUWorkers(CPU_WORKERS)
+
+@app.on_event("startup")
+async def start_cpu_workers():
+    cpu_workers.start()
+
+async def run_db(func, *args, **kwargs):
+    """Await blocking database work without stalling the event loop"""
+    return await db_executor.run(func, *args, **kwargs)
+
+def offload_db(func):
+    """Decorator turning a blocking, sqlite-bound route handler into an async one served by the database executor"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await db_executor.run(func, *args, **kwargs)
+    return wrapper
+
+maintenance_tasks = []  # periodic cleanup started at startup, cancelled at shutdown
+
+def schedule_maintenance(func, description):
+    """Run blocking ``func`` on the database executor every MAINTENANCE_INTERVAL seconds until shutdown"""
+    async def run_periodically():
+        while True:
+            await asyncio.sleep(MAINTENANCE_INTERVAL)
+            try:
+                await run_db(func)
+            except Exception as e:
+                logger.error(f"Error {description}: {str(e)}")
+    maintenance_tasks.append(asyncio.create_task(run_periodically()))
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    for task in maintenance_tasks:
+        task.cancel()
+    await event_broker.stop()
+    await llm_gateway.close()
+    session_activity.stop()
+    document_indexer.shutdown()
+    # Export jobs still waiting for a worker stay queued in export_jobs and are resumed on the next start
+    cpu_workers.shutdown()
+    db_executor.shutdown()
+    db_pool.close_all()
+
+def get_db_connection():
+    """Context manager that checks a pooled connection out for one unit of work"""
+    return db_pool.connection()
+
+def with_db_cursor(func, *args):
+    """Call ``func(cursor, *args)`` in one unit of work, for handlers that hand it to run_db"""
+    with get_db_connection() as conn:
+        return func(conn.cursor(), *args)
+
+def get_db():
+    """FastAPI dependency that checks a pooled connection out for the duration of a request"""
+    with db_pool.connection() as conn:
+        yield conn
+
+# Database initialization
+# Schema changes are applied as numbered migrations recorded in schema_version.
+# Append new migrations to SCHEMA_MIGRATIONS; never edit one that has shipped.
+def add_missing_columns(cursor, table_name, column_definitions):
+    """Add any columns from ``column_definitions`` that ``table_name`` does not have yet"""
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    existing_columns = {row[1] for row in cursor.fetchall()}
+    for definition in column_definitions:
+        if definition.split()[0] not in existing_columns:
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {definition}")
+            logger.info(f"Added column to {table_name}: {definition}")
+
+def migrate_baseline_schema(cursor):
+    """Create every application table"""
+    # Create messages table with enhanced features and relationship_id
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_name TEXT,
+            user_email TEXT,
+            original_message TEXT,
+            rewritten_message TEXT,
+            conversation_id INTEGER,
+            timestamp TEXT,
+            parental_role TEXT,
+            recipient_role TEXT,
+            is_read BOOLEAN DEFAULT FALSE,
+            read_at TEXT,
+            read_by TEXT,
+            message_hash TEXT,
+            has_attachments BOOLEAN DEFAULT FALSE,
+            attachment_count INTEGER DEFAULT 0,
+            sender_language TEXT DEFAULT 'en',
+            recipient_language TEXT DEFAULT 'en',
+            relationship_id INTEGER,
+            FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create dual-language message translations table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS message_translations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message_id INTEGER NOT NULL,
+            language_code TEXT NOT NULL,
+            original_text TEXT NOT NULL,
+            rewritten_text TEXT NOT NULL,
+            created_date TEXT NOT NULL,
+            FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE,
+            UNIQUE(message_id, language_code)
+        )
+    """)
+    
+    # Create message_attachments table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS message_attachments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message_id INTEGER NOT NULL,
+            original_filename TEXT NOT NULL,
+            stored_filename TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_type TEXT,
+            file_size INTEGER,
+            uploaded_by TEXT NOT NULL,
+            upload_date TEXT NOT NULL,
+            file_hash TEXT,
+            FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create conversation_reports table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conversation_id INTEGER NOT NULL,
+            message_id INTEGER,
+            reported_by TEXT NOT NULL,
+            report_type TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            description TEXT,
+            report_date TEXT NOT NULL,
+            status TEXT DEFAULT 'Open',
+            reviewed_by TEXT,
+            reviewed_date TEXT,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE,
+            FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE SET NULL
+        )
+    """)
+    
+    # Create message_notifications table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS message_notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            conversation_id INTEGER NOT NULL,
+            notification_type TEXT NOT NULL,
+            is_sent BOOLEAN DEFAULT FALSE,
+            sent_at TEXT,
+            email_sent BOOLEAN DEFAULT FALSE,
+            push_sent BOOLEAN DEFAULT FALSE,
+            created_date TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            description TEXT,
+            date TEXT,
+            relationship_id INTEGER,
+            FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create conversations table with relationship support
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            date TEXT,
+            relationship_id INTEGER,
+            FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create calendar table with relationship support and soft delete
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS calendar (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_label TEXT,
+            event_time TEXT,
+            repeat_occurrence TEXT,
+            created_by TEXT,
+            created_date TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            deleted_date TEXT,
+            deleted_by TEXT,
+            relationship_id INTEGER,
+            FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Enhanced financial table for Accountable Payments with relationship support
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS financial (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT,
+            category TEXT,
+            amount REAL,
+            description TEXT,
+            payment_method TEXT,
+            merchant TEXT,
+            payment_date TEXT,
+            notes TEXT,
+            receipt_filename TEXT,
+            receipt_ocr_data TEXT,
+            receipt_human_readable TEXT,
+            payment_type TEXT DEFAULT 'expense',
+            date TEXT,
+            created_by TEXT,
+            relationship_id INTEGER,
+            FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create payment suggestions table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS payment_suggestions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payment_id INTEGER,
+            suggested_to TEXT,
+            suggested_amount REAL,
+            reason TEXT,
+            status TEXT DEFAULT 'pending',
+            proof_filename TEXT,
+            proof_ocr_data TEXT,
+            created_by TEXT,
+            created_date TEXT,
+            response_date TEXT,
+            FOREIGN KEY (payment_id) REFERENCES financial (id)
+        )
+    """)
+    
+    # Create info_log table with relationship support
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS info_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            child_name TEXT,
+            type TEXT,
+            description TEXT,
+            date TEXT,
+            created_by TEXT,
+            relationship_id INTEGER,
+            FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create profiles table (keeping global as it's user-specific)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            trigger_words TEXT,
+            pronouns TEXT,
+            preferred_name_a TEXT,
+            preferred_name_b TEXT,
+            alternate_contact TEXT,
+            children_names TEXT,
+            emergency_contact TEXT,
+            postcode TEXT,
+            usual_address TEXT,
+            dob TEXT,
+            parental_role TEXT,
+            created_date TEXT
+        )
+    """)
+    
+    # Create info_library table with relationship support
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS info_library (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            category TEXT NOT NULL,
+            file_name TEXT,
+            file_path TEXT,
+            file_type TEXT,
+            file_size INTEGER,
+            is_file BOOLEAN DEFAULT FALSE,
+            uploaded_by TEXT NOT NULL,
+            upload_date TEXT NOT NULL,
+            downloads_log TEXT DEFAULT '',
+            metadata TEXT,
+            relationship_id INTEGER,
+            FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create unalterable_records table with relationship support
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS unalterable_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            category TEXT NOT NULL,
+            file_name TEXT,
+            file_path TEXT,
+            original_file_name TEXT,
+            file_type TEXT,
+            file_size INTEGER,
+            file_hash TEXT NOT NULL,
+            hash_algorithm TEXT DEFAULT 'SHA-256',
+            uploaded_by TEXT NOT NULL,
+            upload_date TEXT NOT NULL,
+            downloads_log TEXT DEFAULT '',
+            access_log TEXT DEFAULT '',
+            is_verified BOOLEAN DEFAULT TRUE,
+            metadata TEXT,
+            relationship_id INTEGER,
+            FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create personal_journal table with relationship support
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS personal_journal (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            mood TEXT,
+            entry_date TEXT NOT NULL,
+            created_by TEXT NOT NULL,
+            created_date TEXT NOT NULL,
+            last_modified TEXT,
+            tags TEXT,
+            relationship_id INTEGER,
+            FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create journal_files table for file attachments
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS journal_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            journal_entry_id INTEGER,
+            original_filename TEXT NOT NULL,
+            stored_filename TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_type TEXT,
+            file_size INTEGER,
+            uploaded_by TEXT NOT NULL,
+            upload_date TEXT NOT NULL,
+            FOREIGN KEY (journal_entry_id) REFERENCES personal_journal (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create vault_folders table for vault file organization
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vault_folders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            parent_folder_id INTEGER,
+            created_by TEXT NOT NULL,
+            created_date TEXT NOT NULL,
+            is_shared BOOLEAN DEFAULT FALSE,
+            shared_with TEXT,
+            FOREIGN KEY (parent_folder_id) REFERENCES vault_folders (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create vault_files table for vault file storage
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vault_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            original_filename TEXT NOT NULL,
+            stored_filename TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_type TEXT,
+            file_size INTEGER,
+            folder_id INTEGER,
+            uploaded_by TEXT NOT NULL,
+            upload_date TEXT NOT NULL,
+            is_shared BOOLEAN DEFAULT FALSE,
+            shared_with TEXT,
+            file_hash TEXT,
+            FOREIGN KEY (folder_id) REFERENCES vault_folders (id) ON DELETE SET NULL
+        )
+    """)
+    
+    # Create vault_access_logs table for tracking file access
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vault_access_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id INTEGER NOT NULL,
+            accessed_by TEXT NOT NULL,
+            access_type TEXT NOT NULL,
+            access_date TEXT NOT NULL,
+            ip_address TEXT,
+            user_agent TEXT,
+            FOREIGN KEY (file_id) REFERENCES vault_files (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create support_tickets table for Contact Us functionality
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS support_tickets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticket_number TEXT UNIQUE NOT NULL,
+            subject TEXT NOT NULL,
+            category TEXT NOT NULL,
+            priority TEXT NOT NULL,
+            description TEXT NOT NULL,
+            status TEXT DEFAULT 'Open',
+            user_name TEXT NOT NULL,
+            user_email TEXT NOT NULL,
+            created_date TEXT NOT NULL,
+            last_updated TEXT NOT NULL,
+            admin_response TEXT,
+            resolved_date TEXT,
+            resolved_by TEXT
+        )
+    """)
+    
+    # Create support_ticket_attachments table for file uploads
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS support_ticket_attachments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticket_id INTEGER NOT NULL,
+            original_filename TEXT NOT NULL,
+            stored_filename TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_type TEXT,
+            file_size INTEGER,
+            uploaded_by TEXT NOT NULL,
+            upload_date TEXT NOT NULL,
+            FOREIGN KEY (ticket_id) REFERENCES support_tickets (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create users table for authentication
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            full_name TEXT NOT NULL,
+            preferred_name TEXT,
+            role TEXT NOT NULL,
+            phone_number TEXT,
+            address TEXT,
+            postcode TEXT,
+            emergency_contact TEXT,
+            emergency_phone TEXT,
+            subscription_type TEXT DEFAULT 'basic',
+            payment_method TEXT,
+            card_last_four TEXT,
+            billing_address TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            email_verified BOOLEAN DEFAULT FALSE,
+            created_date TEXT NOT NULL,
+            last_login TEXT,
+            profile_completed BOOLEAN DEFAULT FALSE
+        )
+    """)
+    
+    # Create user_relationships table to link parent accounts
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_relationships (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            other_parent_name TEXT NOT NULL,
+            other_parent_email TEXT NOT NULL,
+            other_parent_role TEXT NOT NULL,
+            other_parent_id INTEGER,
+            relationship_status TEXT DEFAULT 'pending',
+            invitation_sent_date TEXT,
+            invitation_accepted_date TEXT,
+            created_date TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            FOREIGN KEY (other_parent_id) REFERENCES users (id) ON DELETE SET NULL
+        )
+    """)
+    
+    # Create user_children table with relationship support
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_children (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            created_date TEXT NOT NULL,
+            relationship_id INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            FOREIGN KEY (relationship_id) REFERENCES user_relationships (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create user_sessions table for authentication tokens
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            token TEXT UNIQUE NOT NULL,
+            expires_at TEXT NOT NULL,
+            created_date TEXT NOT NULL,
+            last_accessed TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create user_settings table for language preferences
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            language_code TEXT DEFAULT 'en',
+            ai_language_instruction TEXT,
+            created_date TEXT NOT NULL,
+            updated_date TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            UNIQUE(user_id)
+        )
+    """)
+    
+    # Create user_notifications table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            email_notifications BOOLEAN DEFAULT TRUE,
+            push_notifications BOOLEAN DEFAULT TRUE,
+            message_notifications BOOLEAN DEFAULT TRUE,
+            calendar_notifications BOOLEAN DEFAULT TRUE,
+            payment_notifications BOOLEAN DEFAULT TRUE,
+            created_date TEXT NOT NULL,
+            updated_date TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create scheduled_calls table for Accountable Calling
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scheduled_calls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            caller_id INTEGER NOT NULL,
+            caller_name TEXT NOT NULL,
+            caller_email TEXT NOT NULL,
+            recipient_name TEXT NOT NULL,
+            recipient_email TEXT NOT NULL,
+            scheduled_date TEXT NOT NULL,
+            scheduled_time TEXT NOT NULL,
+            duration_minutes INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_date TEXT NOT NULL,
+            accepted_date TEXT,
+            rejected_date TEXT,
+            completed_date TEXT,
+            notes TEXT,
+            FOREIGN KEY (caller_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create call_sessions table for active calls
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS call_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scheduled_call_id INTEGER NOT NULL,
+            session_token TEXT UNIQUE NOT NULL,
+            caller_joined_at TEXT,
+            recipient_joined_at TEXT,
+            call_started_at TEXT,
+            call_ended_at TEXT,
+            ended_by TEXT,
+            end_reason TEXT,
+            duration_seconds INTEGER,
+            recording_path TEXT,
+            status TEXT DEFAULT 'waiting',
+            FOREIGN KEY (scheduled_call_id) REFERENCES scheduled_calls (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create call_transcriptions table for real-time transcription
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS call_transcriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            call_session_id INTEGER NOT NULL,
+            speaker TEXT NOT NULL,
+            transcript_text TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            confidence_score REAL,
+            is_final BOOLEAN DEFAULT TRUE,
+            violation_detected BOOLEAN DEFAULT FALSE,
+            violation_type TEXT,
+            ai_analysis TEXT,
+            FOREIGN KEY (call_session_id) REFERENCES call_sessions (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create call_reports table for manual and automatic violations
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS call_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            call_session_id INTEGER NOT NULL,
+            reported_by TEXT NOT NULL,
+            report_type TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            description TEXT,
+            timestamp TEXT NOT NULL,
+            auto_generated BOOLEAN DEFAULT FALSE,
+            transcript_segment TEXT,
+            violation_category TEXT,
+            severity_level INTEGER DEFAULT 1,
+            FOREIGN KEY (call_session_id) REFERENCES call_sessions (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create call_notifications table for email/push notifications
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS call_notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scheduled_call_id INTEGER NOT NULL,
+            recipient_email TEXT NOT NULL,
+            notification_type TEXT NOT NULL,
+            sent_at TEXT NOT NULL,
+            email_sent BOOLEAN DEFAULT FALSE,
+            push_sent BOOLEAN DEFAULT FALSE,
+            FOREIGN KEY (scheduled_call_id) REFERENCES scheduled_calls (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create call_analyses table for post-call AI analysis
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS call_analyses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            call_session_id INTEGER NOT NULL,
+            violations_detected INTEGER DEFAULT 0,
+            violation_details TEXT,
+            call_summary TEXT NOT NULL,
+            content_analysis TEXT,
+            safety_score INTEGER DEFAULT 5,
+            recommendations TEXT,
+            analysis_date TEXT NOT NULL,
+            ai_model_version TEXT DEFAULT 'claude-3-5-sonnet-20241022',
+            FOREIGN KEY (call_session_id) REFERENCES call_sessions (id) ON DELETE CASCADE
+        )
+    """)
+
+def migrate_legacy_columns(cursor):
+    """Backfill columns missing from databases created before schema versioning"""
+    add_missing_columns(cursor, 'messages', [
+        'is_read BOOLEAN DEFAULT FALSE',
+        'read_at TEXT',
+        'read_by TEXT',
+        'message_hash TEXT',
+        'has_attachments BOOLEAN DEFAULT FALSE',
+        'attachment_count INTEGER DEFAULT 0',
+        "sender_language TEXT DEFAULT 'en'",
+        "recipient_language TEXT DEFAULT 'en'",
+        'relationship_id INTEGER'
+    ])
+    add_missing_columns(cursor, 'financial', [
+        'category TEXT',
+        'payment_method TEXT',
+        'merchant TEXT',
+        'payment_date TEXT',
+        'notes TEXT',
+        'receipt_filename TEXT',
+        'receipt_ocr_data TEXT',
+        'receipt_human_readable TEXT',
+        "payment_type TEXT DEFAULT 'expense'",
+        'relationship_id INTEGER'
+    ])
+    add_missing_columns(cursor, 'calendar', [
+        'is_active BOOLEAN DEFAULT TRUE',
+        'deleted_date TEXT',
+        'deleted_by TEXT',
+        'relationship_id INTEGER'
+    ])
+    for table_name in ['conversations', 'orders', 'info_log', 'personal_journal',
+                       'info_library', 'unalterable_records', 'user_children']:
+        add_missing_columns(cursor, table_name, ['relationship_id INTEGER'])
+
+def migrate_query_indexes(cursor):
+    """Index the columns used by hot WHERE and ORDER BY clauses"""
+    indexes = [
+        # Messaging
+        "CREATE INDEX IF NOT EXISTS idx_messages_conversation_timestamp ON messages (conversation_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_message_attachments_message ON message_attachments (message_id, upload_date)",
+        "CREATE INDEX IF NOT EXISTS idx_message_notifications_user ON message_notifications (user_id, created_date)",
+        "CREATE INDEX IF NOT EXISTS idx_conversation_reports_conversation ON conversation_reports (conversation_id)",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_relationship ON conversations (relationship_id, date)",
+        # Users and sessions
+        "CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions (user_id, is_active)",
+        "CREATE INDEX IF NOT EXISTS idx_user_relationships_user ON user_relationships (user_id, relationship_status)",
+        "CREATE INDEX IF NOT EXISTS idx_user_children_user ON user_children (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_children_relationship ON user_children (relationship_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_notifications_user ON user_notifications (user_id)",
+        # Calendar and payments
+        "CREATE INDEX IF NOT EXISTS idx_calendar_relationship ON calendar (relationship_id, is_active, event_time)",
+        "CREATE INDEX IF NOT EXISTS idx_financial_created_by ON financial (created_by, date)",
+        "CREATE INDEX IF NOT EXISTS idx_payment_suggestions_payment ON payment_suggestions (payment_id)",
+        # Libraries, journal and vault
+        "CREATE INDEX IF NOT EXISTS idx_info_library_category ON info_library (category, upload_date)",
+        "CREATE INDEX IF NOT EXISTS idx_personal_journal_created_by ON personal_journal (created_by, entry_date, created_date)",
+        "CREATE INDEX IF NOT EXISTS idx_journal_files_entry ON journal_files (journal_entry_id, uploaded_by)",
+        "CREATE INDEX IF NOT EXISTS idx_vault_folders_parent ON vault_folders (parent_folder_id)",
+        "CREATE INDEX IF NOT EXISTS idx_vault_files_folder ON vault_files (folder_id)",
+        "CREATE INDEX IF NOT EXISTS idx_vault_files_uploaded_by ON vault_files (uploaded_by, is_shared)",
+        "CREATE INDEX IF NOT EXISTS idx_vault_access_logs_file ON vault_access_logs (file_id, access_date)",
+        # Support
+        "CREATE INDEX IF NOT EXISTS idx_support_tickets_user ON support_tickets (user_email, created_date)",
+        "CREATE INDEX IF NOT EXISTS idx_support_ticket_attachments_ticket ON support_ticket_attachments (ticket_id)",
+        # Accountable calling
+        "CREATE INDEX IF NOT EXISTS idx_scheduled_calls_recipient ON scheduled_calls (recipient_email, status, scheduled_date, scheduled_time)",
+        "CREATE INDEX IF NOT EXISTS idx_scheduled_calls_caller ON scheduled_calls (caller_email, scheduled_date, scheduled_time)",
+        "CREATE INDEX IF NOT EXISTS idx_call_sessions_scheduled_call ON call_sessions (scheduled_call_id)",
+        "CREATE INDEX IF NOT EXISTS idx_call_transcriptions_session ON call_transcriptions (call_session_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_call_reports_session ON call_reports (call_session_id)",
+        "CREATE INDEX IF NOT EXISTS idx_call_analyses_session ON call_analyses (call_session_id)",
+        "CREATE INDEX IF NOT EXISTS idx_call_notifications_scheduled_call ON call_notifications (scheduled_call_id)",
+    ]
+    for statement in indexes:
+        cursor.execute(statement)
+    cursor.execute("ANALYZE")
+
+def migrate_session_generation(cursor):
+    """Track a per-user generation that signed session tokens must match"""
+    add_missing_columns(cursor, 'users', ['session_generation INTEGER DEFAULT 0'])
+
+def migrate_evaluation_cache(cursor):
+    """Persistent tier of the LLM evaluation cache"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS evaluation_cache (
+            cache_key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            result TEXT NOT NULL,
+            latency_ms REAL DEFAULT 0,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_evaluation_cache_expires ON evaluation_cache (expires_at)")
+
+def migrate_profile_relationships(cursor):
+    """Scope profiles (and their trigger words) to a relationship; NULL applies to every relationship"""
+    add_missing_columns(cursor, 'profiles', ['relationship_id INTEGER'])
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_profiles_relationship ON profiles (relationship_id)")
+
+def migrate_ws_events(cursor):
+    """Notify table the SQLite websocket broker uses to fan events out across worker processes"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ws_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            envelope TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ws_events_created ON ws_events (created_at)")
+
+def migrate_message_timeline_index(cursor):
+    """Keyset index for the paginated conversation timeline, and attachment counts it can trust"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation_timeline ON messages (conversation_id, timestamp, id)")
+    cursor.execute("DROP INDEX IF EXISTS idx_messages_conversation_timestamp")
+    cursor.execute("""
+        UPDATE messages
+        SET attachment_count = (SELECT COUNT(*) FROM message_attachments ma WHERE ma.message_id = messages.id),
+            has_attachments = EXISTS (SELECT 1 FROM message_attachments ma WHERE ma.message_id = messages.id)
+        WHERE attachment_count IS NOT (SELECT COUNT(*) FROM message_attachments ma WHERE ma.message_id = messages.id)
+    """)
+
+# Tables whose changes feed /api/sync, and child tables whose changes count as an update of their parent row
+CHANGE_LOG_TABLES = ('messages', 'calendar', 'financial', 'info_library', 'unalterable_records',
+                     'personal_journal', 'vault_files')
+CHANGE_LOG_CHILD_TABLES = (('message_translations', 'messages', 'message_id'),
+                           ('journal_files', 'personal_journal', 'journal_entry_id'))
+
+def migrate_change_log(cursor):
+    """Change-data-capture table filled by triggers on the synced tables"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            operation TEXT NOT NULL,
+            changed_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log (changed_at)")
+    now = "strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')"
+    # Baseline marker so the first sequence a client can sync from is never 0, which means "reload in full"
+    cursor.execute(f"INSERT INTO change_log (table_name, row_id, operation, changed_at) VALUES ('change_log', 0, 'baseline', {now})")
+    for table in CHANGE_LOG_TABLES:
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS change_log_{table}_{event.lower()} AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO change_log (table_name, row_id, operation, changed_at)
+                    VALUES ('{table}', {row}.id, '{event.lower()}', {now});
+                END
+            """)
+    for child, parent, column in CHANGE_LOG_CHILD_TABLES:
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS change_log_{child}_{event.lower()} AFTER {event} ON {child}
+                WHEN {row}.{column} IS NOT NULL
+                BEGIN
+                    INSERT INTO change_log (table_name, row_id, operation, changed_at)
+                    VALUES ('{parent}', {row}.{column}, 'update', {now});
+                END
+            """)
+
+# Who may see a hard delete from each synced table, read from the deleted row: (relationship, owner, shared with)
+CHANGE_LOG_DELETE_SCOPE = {
+    'messages': ("(SELECT relationship_id FROM conversations WHERE id = OLD.conversation_id)", "NULL", "NULL"),
+    'calendar': ("OLD.relationship_id", "NULL", "NULL"),
+    'financial': ("OLD.relationship_id", "NULL", "NULL"),
+    'info_library': ("OLD.relationship_id", "NULL", "NULL"),
+    'unalterable_records': ("OLD.relationship_id", "NULL", "NULL"),
+    'personal_journal': ("NULL", "OLD.created_by", "NULL"),
+    'vault_files': ("NULL", "OLD.uploaded_by", "CASE WHEN OLD.is_shared THEN '*' ELSE OLD.shared_with END"),
+}
+
+def migrate_change_log_scope(cursor):
+    """Record the scope of every hard delete so /api/sync only returns deleted ids the caller could see.
+
+    Delete rows logged earlier carry no scope, so the log restarts from a new baseline and clients reload in full.
+    """
+    add_missing_columns(cursor, 'change_log', ['relationship_id INTEGER', 'owner TEXT', 'shared_with TEXT'])
+    cursor.execute("DELETE FROM change_log")
+    now = "strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')"
+    cursor.execute(f"INSERT INTO change_log (table_name, row_id, operation, changed_at) VALUES ('change_log', 0, 'baseline', {now})")
+    for table in CHANGE_LOG_TABLES:
+        relationship, owner, shared_with = CHANGE_LOG_DELETE_SCOPE[table]
+        cursor.execute(f"DROP TRIGGER IF EXISTS change_log_{table}_delete")
+        cursor.execute(f"""
+            CREATE TRIGGER change_log_{table}_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, operation, changed_at, relationship_id, owner, shared_with)
+                VALUES ('{table}', OLD.id, 'delete', {now}, {relationship}, {owner}, {shared_with});
+            END
+        """)
+
+def migrate_message_search(cursor):
+    """FTS5 index over message text, translations and sender, kept in sync by triggers"""
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            body, translations, user_name, conversation,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    # Text of every translation that differs from the stored rewrite, for one message
+    translations = """(SELECT COALESCE(group_concat(t.rewritten_text, ' '), '') FROM message_translations t
+                       WHERE t.message_id = {id} AND t.rewritten_text IS NOT
+                             (SELECT rewritten_message FROM messages WHERE id = {id}))"""
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO messages_fts (rowid, body, translations, user_name, conversation)
+            VALUES (NEW.id, COALESCE(NEW.rewritten_message, ''), '', COALESCE(NEW.user_name, ''), 'c' || NEW.conversation_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF rewritten_message, user_name, conversation_id ON messages
+        BEGIN
+            UPDATE messages_fts SET body = COALESCE(NEW.rewritten_message, ''), user_name = COALESCE(NEW.user_name, ''),
+                                    conversation = 'c' || NEW.conversation_id
+            WHERE rowid = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages
+        BEGIN
+            DELETE FROM messages_fts WHERE rowid = OLD.id;
+        END
+    """)
+    for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_translation_{event.lower()} AFTER {event} ON message_translations
+            BEGIN
+                UPDATE messages_fts SET translations = {translations.format(id=f'{row}.message_id')}
+                WHERE rowid = {row}.message_id;
+            END
+        """)
+    cursor.execute(f"""
+        INSERT INTO messages_fts (rowid, body, translations, user_name, conversation)
+        SELECT m.id, COALESCE(m.rewritten_message, ''), {translations.format(id='m.id')},
+               COALESCE(m.user_name, ''), 'c' || m.conversation_id
+        FROM messages m
+    """)
+
+# Tables whose uploaded files are extracted into document_pages, and the directory their files live in
+DOCUMENT_SOURCES = {'info_library': INFO_LIBRARY_DIR, 'unalterable_records': UNALTERABLE_RECORDS_DIR}
+
+def migrate_document_search(cursor):
+    """Per-page text of uploaded documents behind an FTS5 index, and the extraction status of each file"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_pages (
+            id INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            entry_id INTEGER NOT NULL,
+            page INTEGER NOT NULL,
+            text TEXT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_pages_entry ON document_pages (source, entry_id, page)")
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS document_pages_fts USING fts5(
+            text, content = 'document_pages', content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS document_pages_fts_insert AFTER INSERT ON document_pages
+        BEGIN
+            INSERT INTO document_pages_fts (rowid, text) VALUES (NEW.id, NEW.text);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS document_pages_fts_delete AFTER DELETE ON document_pages
+        BEGIN
+            INSERT INTO document_pages_fts (document_pages_fts, rowid, text) VALUES ('delete', OLD.id, OLD.text);
+        END
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_index (
+            source TEXT NOT NULL,
+            entry_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            pages INTEGER NOT NULL DEFAULT 0,
+            indexed_at TEXT,
+            error TEXT,
+            PRIMARY KEY (source, entry_id)
+        )
+    """)
+    for table in DOCUMENT_SOURCES:
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS document_pages_{table}_delete AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM document_pages WHERE source = '{table}' AND entry_id = OLD.id;
+                DELETE FROM document_index WHERE source = '{table}' AND entry_id = OLD.id;
+            END
+        """)
+    # Files uploaded before this migration are extracted by the background indexer after startup
+    cursor.execute("INSERT OR IGNORE INTO document_index (source, entry_id, status) SELECT 'info_library', id, 'pending' FROM info_library WHERE is_file")
+    cursor.execute("INSERT OR IGNORE INTO document_index (source, entry_id, status) SELECT 'unalterable_records', id, 'pending' FROM unalterable_records")
+
+def migrate_translation_search(cursor):
+    """Per-language FTS5 index over every message translation, replacing the translations column of messages_fts.
+
+    Terms are produced by the search_terms() SQL function each pooled connection registers, so they use
+    the same analyzer as queries in that language.
+    """
+    # Pooled connections no longer register search_terms(), so the backfill below gets it here
+    cursor.connection.create_function("search_terms", 2, search_index_text, deterministic=True)
+    for event in ('insert', 'update', 'delete'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS messages_fts_translation_{event}")
+    cursor.execute("UPDATE messages_fts SET translations = '' WHERE translations != ''")
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS message_translations_fts USING fts5(
+            terms, language, conversation,
+            tokenize = 'unicode61 remove_diacritics 0', prefix = '2 3'
+        )
+    """)
+    conversation = "'c' || (SELECT conversation_id FROM messages WHERE id = NEW.message_id)"
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS message_translations_fts_insert AFTER INSERT ON message_translations
+        BEGIN
+            INSERT INTO message_translations_fts (rowid, terms, language, conversation)
+            VALUES (NEW.id, search_terms(NEW.rewritten_text, NEW.language_code), 'l' || NEW.language_code, {conversation});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS message_translations_fts_update AFTER UPDATE OF rewritten_text, language_code, message_id
+        ON message_translations
+        BEGIN
+            UPDATE message_translations_fts SET terms = search_terms(NEW.rewritten_text, NEW.language_code),
+                                                language = 'l' || NEW.language_code, conversation = {conversation}
+            WHERE rowid = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS message_translations_fts_delete AFTER DELETE ON message_translations
+        BEGIN
+            DELETE FROM message_translations_fts WHERE rowid = OLD.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS message_translations_fts_conversation AFTER UPDATE OF conversation_id ON messages
+        BEGIN
+            UPDATE message_translations_fts SET conversation = 'c' || NEW.conversation_id
+            WHERE rowid IN (SELECT id FROM message_translations WHERE message_id = NEW.id);
+        END
+    """)
+    cursor.execute("""
+        INSERT INTO message_translations_fts (rowid, terms, language, conversation)
+        SELECT t.id, search_terms(t.rewritten_text, t.language_code), 'l' || t.language_code, 'c' || m.conversation_id
+        FROM message_translations t
+        LEFT JOIN messages m ON m.id = t.message_id
+    """)
+
+def migrate_translation_terms(cursor):
+    """Drop the translation index triggers that called search_terms().
+
+    The function only exists in this server, so any other writer of message_translations failed with
+    "no such function". log_message_dual_language now indexes the translations it writes itself.
+    """
+    cursor.execute("DROP TRIGGER IF EXISTS message_translations_fts_insert")
+    cursor.execute("DROP TRIGGER IF EXISTS message_translations_fts_update")
+
+def migrate_message_search_columns(cursor):
+    """Rebuild messages_fts without its translations column, always empty since translations got their own index"""
+    for event in ('insert', 'update', 'delete'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS messages_fts_{event}")
+    cursor.execute("DROP TABLE IF EXISTS messages_fts")
+    cursor.execute("""
+        CREATE VIRTUAL TABLE messages_fts USING fts5(
+            body, user_name, conversation,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO messages_fts (rowid, body, user_name, conversation)
+            VALUES (NEW.id, COALESCE(NEW.rewritten_message, ''), COALESCE(NEW.user_name, ''), 'c' || NEW.conversation_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER messages_fts_update AFTER UPDATE OF rewritten_message, user_name, conversation_id ON messages
+        BEGIN
+            UPDATE messages_fts SET body = COALESCE(NEW.rewritten_message, ''), user_name = COALESCE(NEW.user_name, ''),
+                                    conversation = 'c' || NEW.conversation_id
+            WHERE rowid = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages
+        BEGIN
+            DELETE FROM messages_fts WHERE rowid = OLD.id;
+        END
+    """)
+    cursor.execute("""
+        INSERT INTO messages_fts (rowid, body, user_name, conversation)
+        SELECT id, COALESCE(rewritten_message, ''), COALESCE(user_name, ''), 'c' || conversation_id FROM messages
+    """)
+
+def migrate_export_jobs(cursor):
+    """Export jobs rendered in the background; finished PDFs live in EXPORT_CACHE_DIR, named by cache key"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            cache_key TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            render_args TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            user_id INTEGER,
+            requested_date TEXT NOT NULL,
+            finished_date TEXT,
+            error TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs (status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_export_jobs_requested_date ON export_jobs (requested_date)")
+
+SCHEMA_MIGRATIONS = [
+    (1, "Baseline schema", migrate_baseline_schema),
+    (2, "Backfill legacy columns", migrate_legacy_columns),
+    (3, "Indexes for hot query paths", migrate_query_indexes),
+    (4, "Session generation for signed tokens", migrate_session_generation),
+    (5, "Evaluation result cache", migrate_evaluation_cache),
+    (6, "Relationship scope for profiles", migrate_profile_relationships),
+    (7, "Websocket event notify table", migrate_ws_events),
+    (8, "Conversation timeline keyset index", migrate_message_timeline_index),
+    (9, "Change log for delta sync", migrate_change_log),
+    (10, "Full-text message search", migrate_message_search),
+    (11, "Full-text document search", migrate_document_search),
+    (12, "Per-language translation search", migrate_translation_search),
+    (13, "Background export jobs", migrate_export_jobs),
+    (14, "Translation terms indexed by the server", migrate_translation_terms),
+    (15, "Scope of deletes in the change log", migrate_change_log_scope),
+    (16, "Message search index without the translations column", migrate_message_search_columns),
+]
+
+def get_schema_version(cursor):
+    """Return the highest applied migration version"""
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    return cursor.fetchone()[0] or 0
+
+def init_db():
+    """Apply any pending schema migrations"""
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_date TEXT NOT NULL
+            )
+        """)
+        
+        latest_version = SCHEMA_MIGRATIONS[-1][0]
+        if get_schema_version(cursor) >= latest_version:
+            return
+        
+        for version, description, migrate in SCHEMA_MIGRATIONS:
+            # Each migration runs in its own write transaction so concurrent
+            # workers starting up together apply it exactly once
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                if get_schema_version(cursor) >= version:
+                    conn.rollback()
+                    continue
+                logger.info(f"Applying schema migration {version}: {description}")
+                migrate(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description, applied_date) VALUES (?, ?, ?)",
+                    (version, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.error(f"Schema migration {version} failed")
+                raise
+
+# Password hashing utility functions
+def hash_password(password: str) -> str:
+    """Hash a password using SHA-256 with salt"""
+    salt = secrets.token_hex(16)
+    password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
+    return f"{salt}:{password_hash}"
+
+def verify_password(password: str, hashed: str) -> bool:
+    """Verify a password against its hash"""
+    try:
+        salt, password_hash = hashed.split(':')
+        return hashlib.sha256((password + salt).encode()).hexdigest() == password_hash
+    except ValueError:
+        return False
+
+# Create default test users
+def create_default_users():
+    """Create default test users for development/testing"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Check if test users already exist
+            cursor.execute("SELECT COUNT(*) FROM users WHERE email IN (?, ?)", 
+                          ('mother.test@safespace.com', 'father.test@safespace.com'))
+            if cursor.fetchone()[0] > 0:
+                return  # Test users already exist
+            
+            # Create test mother account
+            mother_id = create_test_user(
+                cursor,
+                email='mother.test@safespace.com',
+                password='TestPassword123!',
+                full_name='Sarah Johnson',
+                preferred_name='Sarah',
+                role='Mother',
+                phone_number='+1 (555) 123-4567',
+                address='123 Main Street, Springfield, IL',
+                postcode='62701',
+                other_parent_name='Michael Johnson',
+                other_parent_email='father.test@safespace.com',
+                other_parent_role='Father'
+            )
+            
+            # Create test father account
+            father_id = create_test_user(
+                cursor,
+                email='father.test@safespace.com',
+                password='TestPassword123!',
+                full_name='Michael Johnson',
+                preferred_name='Mike',
+                role='Father',
+                phone_number='+1 (555) 987-6543',
+                address='456 Oak Avenue, Springfield, IL',
+                postcode='62702',
+                other_parent_name='Sarah Johnson',
+                other_parent_email='mother.test@safespace.com',
+                other_parent_role='Mother'
+            )
+            
+            # Link the accounts
+            cursor.execute("""
+                UPDATE user_relationships 
+                SET other_parent_id = ?, relationship_status = 'accepted', invitation_accepted_date = ?
+                WHERE user_id = ?
+            """, (father_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), mother_id))
+            
+            cursor.execute("""
+                UPDATE user_relationships 
+                SET other_parent_id = ?, relationship_status = 'accepted', invitation_accepted_date = ?
+                WHERE user_id = ?
+            """, (mother_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), father_id))
             
             conn.commit()
             logger.info("Created default test users successfully")
@@ -1158,15 +2240,12 @@ def create_test_user(cursor, email, password, full_name, preferred_name, role, p
     
     return user_id
 
-init_db()
-create_default_users()
-
 # OCR Processing Module using Claude Vision
 class OCRProcessor:
     def __init__(self):
         self.model = "claude-3-5-sonnet-20241022"
         
-    def process_receipt_image(self, image_path: Path, image_data: bytes = None):
+    async def process_receipt_image(self, image_path: Path, image_data: bytes = None):
         """Process receipt image using Claude Vision API for OCR"""
         try:
             if image_data is None:
@@ -1182,7 +2261,7 @@ class OCRProcessor:
             image_base64 = base64.b64encode(image_data).decode()
             
             # Create the message for Claude Vision
-            message = client.messages.create(
+            response_text = await llm_gateway.complete(
                 model=self.model,
                 max_tokens=2000,
                 temperature=0.1,
@@ -1223,8 +2302,6 @@ Return ONLY valid JSON format. If you cannot read certain information, use null
                 ]
             )
             
-            response_text = ' '.join([block.text for block in message.content])
-            
             # Try to parse JSON
             try:
                 ocr_data = json.loads(response_text)
@@ -1299,6 +2376,107 @@ Return ONLY valid JSON format. If you cannot read certain information, use null
             logger.error(f"Error generating human readable summary: {str(e)}")
             return "Receipt processed but summary generation failed."
 
+# PDF styles and flowables shared by every generator
+# Built once at import. The styles are frozen: a generator needing a variant derives one with clone()
+# instead of changing a style every other export also uses.
+class FrozenParagraphStyle(ParagraphStyle):
+    """ParagraphStyle that refuses changes once built"""
+
+    def __init__(self, name, parent=None, **kw):
+        super().__init__(name, parent, **kw)
+        self.__dict__['_frozen'] = True
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get('_frozen'):
+            raise AttributeError(f"PDF style '{self.name}' is shared; clone() it instead of changing it")
+        super().__setattr__(name, value)
+
+    def clone(self, name, parent=None, **kwds):
+        """A changeable ParagraphStyle with this style's attributes and ``kwds``"""
+        attributes = {key: value for key, value in self.__dict__.items() if key not in ('name', 'parent', '_frozen')}
+        return ParagraphStyle(name, **{**attributes, **kwds})
+
+class FrozenTableStyle(TableStyle):
+    """TableStyle whose commands cannot be added to once built"""
+
+    def __init__(self, cmds=None, parent=None, **kw):
+        super().__init__(cmds, parent, **kw)
+        self._cmds = tuple(self._cmds)
+
+    def add(self, *cmd):
+        raise TypeError("Shared PDF table styles cannot be changed; build a TableStyle with this one as parent")
+
+    def getCommands(self):
+        return list(self._cmds)
+
+def build_pdf_styles():
+    """Every sample ParagraphStyle, frozen, plus the dark blue title of certificates"""
+    def frozen(name, style, **overrides):
+        attributes = {key: value for key, value in style.__dict__.items() if key not in ('name', 'parent')}
+        return FrozenParagraphStyle(name, **{**attributes, **overrides})
+    
+    sample = getSampleStyleSheet()
+    styles = {name: frozen(name, style) for name, style in sample.byName.items() if isinstance(style, ParagraphStyle)}
+    styles['CertificateTitle'] = frozen('CertificateTitle', sample['Title'], textColor=colors.darkblue)
+    return MappingProxyType(styles)
+
+def certificate_table_style(header_color, body_color):
+    """A coloured title row over shaded, gridded label/value rows"""
+    return FrozenTableStyle([
+        ('BACKGROUND', (0, 0), (1, 0), header_color),
+        ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), body_color),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+
+PDF_STYLES = build_pdf_styles()
+PDF_TABLE_STYLES = MappingProxyType({
+    'information': certificate_table_style(colors.lightblue, colors.beige),
+    'verification': certificate_table_style(colors.darkgreen, colors.lightgrey),
+    'access': certificate_table_style(colors.orange, colors.lightyellow),
+    'attachments': FrozenTableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]),
+    'message': FrozenTableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BACKGROUND', (0, 0), (-1, -1), colors.lightyellow),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]),
+})
+
+def pdf_document(output):
+    """Letter-sized document template writing to a path or binary file"""
+    return SimpleDocTemplate(output, pagesize=letter)
+
+def certificate_header(titles, statement=None):
+    """Dark blue title lines and the statement under them, opening a certificate"""
+    content = [Paragraph(title, PDF_STYLES['CertificateTitle']) for title in titles]
+    content.append(Spacer(1, 0.3*inch))
+    if statement:
+        content.append(Paragraph(statement, PDF_STYLES['Normal']))
+        content.append(Spacer(1, 0.2*inch))
+    return content
+
+def certificate_table(title, rows, style, space_after=0.2*inch):
+    """Label/value table under a coloured title row; ``style`` names one of PDF_TABLE_STYLES"""
+    return [Table([[title, '']] + rows, colWidths=[2*inch, 4*inch], style=PDF_TABLE_STYLES[style]),
+            Spacer(1, space_after)]
+
+def legal_footer(text):
+    """The closing legal or privacy statement of a certificate"""
+    return Paragraph(text, PDF_STYLES['Normal'])
+
 # Unalterable Records Module for Legal Document Management
 class UnalterableRecordsManager:
     def __init__(self):
@@ -1322,34 +2500,20 @@ class UnalterableRecordsManager:
     def generate_verification_pdf(self, record_data: dict, downloaded_by: str) -> bytes:
         """Generate PDF with verification header for court use"""
         buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        
-        # Document content
-        content = []
-        
-        # Title
-        title_style = styles['Title']
-        title_style.textColor = colors.darkblue
-        content.append(Paragraph("SAFESPACE UNALTERABLE RECORDS", title_style))
-        content.append(Paragraph("DOCUMENT VERIFICATION CERTIFICATE", title_style))
-        content.append(Spacer(1, 0.3*inch))
+        doc = pdf_document(buffer)
         
-        # Verification Statement
-        verification_text = """
+        # Title and verification statement
+        content = certificate_header(["SAFESPACE UNALTERABLE RECORDS", "DOCUMENT VERIFICATION CERTIFICATE"], """
         <b>CERTIFICATION OF DOCUMENT INTEGRITY</b><br/>
         <br/>
         This document has been retrieved from the Safespace Unalterable Records system, 
         a secure platform designed for family communication and legal document preservation. 
         The integrity and authenticity of this document are verified through cryptographic 
         hash validation as detailed below.
-        """
-        content.append(Paragraph(verification_text, styles['Normal']))
-        content.append(Spacer(1, 0.2*inch))
+        """)
         
         # Document Information Table
-        doc_info_data = [
-            ['Document Information', ''],
+        content.extend(certificate_table('Document Information', [
             ['Title:', record_data.get('title', 'N/A')],
             ['Category:', record_data.get('category', 'N/A').replace('_', ' ').title()],
             ['Original Filename:', record_data.get('original_file_name', 'N/A')],
@@ -1357,73 +2521,26 @@ class UnalterableRecordsManager:
             ['File Size:', f"{record_data.get('file_size', 0):,} bytes"],
             ['Uploaded By:', record_data.get('uploaded_by', 'N/A')],
             ['Upload Date:', record_data.get('upload_date', 'N/A')],
-        ]
-        
-        doc_info_table = Table(doc_info_data, colWidths=[2*inch, 4*inch])
-        doc_info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (1, 0), colors.lightblue),
-            ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        content.append(doc_info_table)
-        content.append(Spacer(1, 0.2*inch))
+        ], 'information'))
         
         # Cryptographic Verification Table
-        crypto_data = [
-            ['Cryptographic Verification', ''],
+        content.extend(certificate_table('Cryptographic Verification', [
             ['Hash Algorithm:', record_data.get('hash_algorithm', 'SHA-256')],
             ['Document Hash:', record_data.get('file_hash', 'N/A')],
             ['Verification Status:', 'VERIFIED ✓' if record_data.get('is_verified') else 'FAILED ✗'],
             ['Hash Verification Date:', datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")],
-        ]
-        
-        crypto_table = Table(crypto_data, colWidths=[2*inch, 4*inch])
-        crypto_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (1, 0), colors.darkgreen),
-            ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        content.append(crypto_table)
-        content.append(Spacer(1, 0.2*inch))
+        ], 'verification'))
         
         # Access Information
-        access_data = [
-            ['Access Information', ''],
+        content.extend(certificate_table('Access Information', [
             ['Downloaded By:', downloaded_by],
             ['Download Date:', datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")],
             ['System Version:', 'Safespace v1.0'],
             ['Record ID:', str(record_data.get('id', 'N/A'))],
-        ]
-        
-        access_table = Table(access_data, colWidths=[2*inch, 4*inch])
-        access_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (1, 0), colors.orange),
-            ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.lightyellow),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        content.append(access_table)
-        content.append(Spacer(1, 0.3*inch))
+        ], 'access', space_after=0.3*inch))
         
         # Legal Statement
-        legal_text = """
+        content.append(legal_footer("""
         <b>LEGAL CERTIFICATION:</b><br/>
         <br/>
         This document was stored in the Safespace Unalterable Records system where it cannot 
@@ -1438,112 +2555,538 @@ class UnalterableRecordsManager:
         <br/>
         This verification certificate was generated automatically by the Safespace system on the 
         date and time indicated above.
-        """
-        content.append(Paragraph(legal_text, styles['Normal']))
+        """))
         
         # Build PDF
         doc.build(content)
         buffer.seek(0)
         return buffer.getvalue()
 
+# Evaluation Result Cache
+class EvaluationCache:
+    """Content-addressed cache of LLM results: an in-memory LRU in front of the evaluation_cache table.
+
+    Keys hash the message, with only its whitespace collapsed, together with everything else that shapes
+    the answer (orders text, roles, languages), so any change to those inputs is a natural miss. Case is
+    kept: the results are text derived from the message, and another user's capitalisation must never
+    come back as this user's rewrite. Concurrent misses for the same key share one LLM call.
+    """
+
+    PURGE_EVERY = 500  # stores between sweeps of expired rows
+    KEY_VERSION = 2  # part of every key; bump when the key material changes so rows stored under old keys never match
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (result, latency_ms, expires_at)
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._db_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._coalesced = 0
+        self._saved_latency_ms = 0.0
+        self._inflight = {}  # key -> task computing it, touched only on the event loop
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(str(text).split())
+
+    def make_key(self, kind, message, *context):
+        material = json.dumps([self.KEY_VERSION, kind, self.normalize(message), *context], ensure_ascii=False)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _remember(self, key, result, latency_ms, expires_at):
+        with self._lock:
+            self._entries[key] = (result, latency_ms, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, key):
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT result, latency_ms, expires_at FROM evaluation_cache 
+                WHERE cache_key = ? AND expires_at > ?
+            """, (key, time.time()))
+            return cursor.fetchone()
+
+    def _store(self, key, kind, result, latency_ms, expires_at):
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR REPLACE INTO evaluation_cache (cache_key, kind, result, latency_ms, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, kind, result, latency_ms, time.time(), expires_at))
+            if self._stores % self.PURGE_EVERY == 0:
+                cursor.execute("DELETE FROM evaluation_cache WHERE expires_at <= ?", (time.time(),))
+            conn.commit()
+
+    async def get_or_compute(self, kind, key, compute):
+        """Return the cached result for ``key`` or await ``compute()`` and cache what it returns"""
+        if not EVALUATION_CACHE_ENABLED:
+            return await compute()
+        
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[2] > now:
+                self._entries.move_to_end(key)
+                self._memory_hits += 1
+                self._saved_latency_ms += entry[1]
+                return entry[0]
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load_or_compute(kind, key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._settle, key))
+        else:
+            with self._lock:
+                self._coalesced += 1
+        # Shielded so a caller that goes away does not cancel the call other callers are waiting on
+        return await asyncio.shield(task)
+
+    def _settle(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # every waiter already sees the failure; don't report it again as never retrieved
+
+    async def _load_or_compute(self, kind, key, compute):
+        try:
+            row = await run_db(self._load, key)
+        except Exception as e:
+            logger.error(f"Error reading evaluation cache: {str(e)}")
+            row = None
+        if row:
+            result, latency_ms, expires_at = row
+            self._remember(key, result, latency_ms, expires_at)
+            with self._lock:
+                self._db_hits += 1
+                self._saved_latency_ms += latency_ms or 0
+            return result
+        
+        with self._lock:
+            self._misses += 1
+        started = time.monotonic()
+        result = await compute()
+        latency_ms = (time.monotonic() - started) * 1000
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, result, latency_ms, expires_at)
+        with self._lock:
+            self._stores += 1
+        try:
+            await run_db(self._store, key, kind, result, latency_ms, expires_at)
+        except Exception as e:
+            logger.error(f"Error writing evaluation cache: {str(e)}")
+        return result
+
+    def stats(self):
+        with self._lock:
+            hits = self._memory_hits + self._db_hits
+            lookups = hits + self._misses
+            return {
+                'enabled': EVALUATION_CACHE_ENABLED,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'memory_hits': self._memory_hits,
+                'db_hits': self._db_hits,
+                'misses': self._misses,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'llm_calls_saved': hits,
+                'llm_latency_saved_ms': round(self._saved_latency_ms, 1),
+                'coalesced': self._coalesced,
+                'in_flight': len(self._inflight)
+            }
+
+evaluation_cache = EvaluationCache(EVALUATION_CACHE_SIZE, EVALUATION_CACHE_TTL)
+
+class EvaluationEngineStats:
+    """End-to-end latency and fallback counts per evaluation engine, for comparing engine modes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = {}
+
+    def record(self, engine, seconds, fell_back=False):
+        with self._lock:
+            stats = self._engines.setdefault(engine, {'evaluations': 0, 'fallbacks': 0, 'latency_seconds': 0.0})
+            stats['evaluations'] += 1
+            stats['latency_seconds'] += seconds
+            if fell_back:
+                stats['fallbacks'] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active_engine': EVALUATION_ENGINE,
+                'engines': {
+                    engine: {
+                        'evaluations': stats['evaluations'],
+                        'fallbacks': stats['fallbacks'],
+                        'avg_latency_ms': round(stats['latency_seconds'] / stats['evaluations'] * 1000, 1)
+                    }
+                    for engine, stats in self._engines.items()
+                }
+            }
+
+evaluation_engine_stats = EvaluationEngineStats()
+
+class MessagePrescreen:
+    """In-process risk scorer run before the LLM: a compiled lexicon plus a hashed n-gram logistic regression.
+
+    A message is confidently benign only when no lexicon pattern matches and the classifier's probability
+    that it needs a rewrite is at or below ``threshold``. Without a trained model nothing is ever benign.
+    """
+
+    RISK_PATTERNS = [
+        (r"\b(kill|hurt|harm|beat|punch|slap|choke|strangle|shoot|stab|burn)\w*\b", 3.0),
+        (r"\b(threat\w*|or else|you'?ll regret|watch your back|make you pay|be sorry|last warning)\b", 3.0),
+        (r"\b(gun|knife|weapon)s?\b", 3.0),
+        (r"\b(suicide|kill myself|end it all|self[- ]harm)\b", 3.0),
+        (r"\b(never see (the|your|my) (kids|children|son|daughter)|take the (kids|children)|keep the (kids|children))\b", 2.5),
+        (r"\b(stupid|idiot|moron|loser|pathetic|useless|worthless|bitch|bastard|crazy|psycho|liar|disgusting)\b", 2.0),
+        (r"\b(fuck\w*|shit\w*|damn\w*|crap|hell|piss\w*|ass(hole)?)\b", 2.0),
+        (r"\b(lawyer|court|police|cops|custody|report you|sue)\b", 1.0),
+        (r"\b(watching you|following you|i know where|tracking|your phone|your password)\b", 2.0),
+        (r"\b(always|never)\b.*\b(you|your)\b", 0.5),
+        (r"!{2,}|\?{2,}", 0.5),
+        (r"(?-i:\b[A-Z]{4,}\b)", 0.5),
+    ]
+
+    def __init__(self, mode: str, threshold: float, model_path: Path):
+        self.mode = mode
+        self.threshold = threshold
+        self.model_path = model_path
+        self._patterns = [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in self.RISK_PATTERNS]
+        self._buckets = 0
+        self._bias = 0.0
+        self._weights = {}
+        self._lock = threading.Lock()
+        self._screened = 0
+        self._benign = 0
+        self._bypassed = 0
+        self._shadow_compared = 0
+        self._shadow_false_negatives = 0
+        self.load_model()
+
+    def load_model(self):
+        """Load weights written by train_prescreen.py; a missing model leaves the pre-screen inert"""
+        if not self.model_path.exists():
+            if self.mode != 'off':
+                logger.warning(f"Pre-screen model not found at {self.model_path}; all messages go to the LLM")
+            return
+        with open(self.model_path) as f:
+            model = json.load(f)
+        self._buckets = int(model['buckets'])
+        self._bias = float(model['bias'])
+        self._weights = {int(index): float(weight) for index, weight in model['weights'].items()}
+        logger.info(f"Loaded pre-screen model from {self.model_path} ({len(self._weights)} weights)")
+
+    @staticmethod
+    def features(text, buckets):
+        """Hashed word unigram and bigram indices present in ``text``"""
+        tokens = re.findall(r"\w+", text.lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return {zlib.crc32(gram.encode()) % buckets for gram in grams}
+
+    def lexicon_risk(self, text):
+        return sum(weight for pattern, weight in self._patterns if pattern.search(text))
+
+    def probability(self, text):
+        """Classifier probability that the message needs a rewrite, or None without a model"""
+        if not self._buckets:
+            return None
+        z = self._bias + sum(self._weights.get(index, 0.0) for index in self.features(text, self._buckets))
+        return 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+
+    def screen(self, text):
+        """Score a message; ``benign`` is True only when it may safely skip the LLM"""
+        risk = self.lexicon_risk(text)
+        probability = self.probability(text)
+        benign = risk == 0 and probability is not None and probability <= self.threshold
+        with self._lock:
+            self._screened += 1
+            if benign:
+                self._benign += 1
+        return {'benign': benign, 'lexicon_risk': risk, 'probability': probability}
+
+    def record_bypass(self):
+        with self._lock:
+            self._bypassed += 1
+
+    def record_shadow(self, text, screen, needs_rewrite):
+        """Compare a shadow-mode prediction with the LLM verdict and log false negatives"""
+        with self._lock:
+            self._shadow_compared += 1
+            false_negative = screen['benign'] and needs_rewrite
+            if false_negative:
+                self._shadow_false_negatives += 1
+        if false_negative:
+            logger.warning(f"Pre-screen false negative (p={screen['probability']:.3f}): '{text[:80]}'")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'threshold': self.threshold,
+                'model_loaded': bool(self._buckets),
+                'screened': self._screened,
+                'predicted_benign': self._benign,
+                'bypassed': self._bypassed,
+                'shadow_compared': self._shadow_compared,
+                'shadow_false_negatives': self._shadow_false_negatives,
+                'shadow_false_negative_rate': round(self._shadow_false_negatives / self._benign, 4)
+                                              if self.mode == 'shadow' and self._benign else None
+            }
+
+message_prescreen = MessagePrescreen(PRESCREEN_MODE, PRESCREEN_THRESHOLD, PRESCREEN_MODEL_PATH)
+
+class TriggerWordMatcher:
+    """Aho-Corasick automaton over a family's trigger words and phrases.
+
+    Matching is case-insensitive and only whole words count, so "ass" does not fire inside "class".
+    """
+
+    def __init__(self, words):
+        self.words = sorted({" ".join(word.casefold().split()) for word in words if word and word.strip()})
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for word in self.words:
+            state = 0
+            for char in word:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] = (word,)
+        
+        # Breadth-first pass to link each state to its longest proper suffix state
+        pending = list(self._goto[0].values())
+        for state in pending:
+            for char, next_state in self._goto[state].items():
+                pending.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    @staticmethod
+    def parse(trigger_words):
+        """Split a profile's trigger_words text (comma, semicolon or newline separated)"""
+        return [word for word in re.split(r"[,;\n]+", trigger_words or "") if word.strip()]
+
+    def scan(self, text):
+        """Return the distinct trigger words found in ``text``, in order of appearance"""
+        if not self.words:
+            return []
+        text = " ".join(text.casefold().split())
+        goto, fail, output = self._goto, self._fail, self._output
+        found = []
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for word in output[state]:
+                start = end - len(word)
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+                    if word not in found:
+                        found.append(word)
+        return found
+
+class TriggerWordScanners:
+    """Per-relationship trigger-word matchers, built lazily from profiles and dropped when a profile changes"""
+
+    MAX_CONVERSATIONS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matchers = {}  # relationship_id -> TriggerWordMatcher
+        self._conversations = {}  # conversation_id -> relationship_id
+        self._builds = 0
+        self._scans = 0
+        self._hits = 0
+        self._scan_seconds = 0.0
+
+    def _relationship_for(self, cursor, conversation_id):
+        with self._lock:
+            if conversation_id in self._conversations:
+                return self._conversations[conversation_id]
+        cursor.execute("SELECT relationship_id FROM conversations WHERE id = ?", (conversation_id,))
+        row = cursor.fetchone()
+        if row is None:
+            # Not remembered: the conversation may be created after this lookup
+            return None
+        with self._lock:
+            if len(self._conversations) >= self.MAX_CONVERSATIONS:
+                self._conversations.clear()
+            self._conversations[conversation_id] = row[0]
+        return row[0]
+
+    def cached(self, conversation_id=None):
+        """The conversation's matcher if its relationship and matcher are both cached, else None"""
+        with self._lock:
+            if conversation_id and conversation_id not in self._conversations:
+                return None
+            return self._matchers.get(self._conversations.get(conversation_id) if conversation_id else None)
+
+    def matcher_for_conversation(self, conversation_id=None):
+        """Return the matcher for a conversation's relationship, building it on first use (blocking)"""
+        matcher = self.cached(conversation_id)
+        if matcher is not None:
+            return matcher
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            relationship_id = self._relationship_for(cursor, conversation_id) if conversation_id else None
+            with self._lock:
+                matcher = self._matchers.get(relationship_id)
+            if matcher is not None:
+                return matcher
+            
+            # Profiles without a relationship apply everywhere
+            if relationship_id is None:
+                cursor.execute("SELECT trigger_words FROM profiles WHERE relationship_id IS NULL")
+            else:
+                cursor.execute("SELECT trigger_words FROM profiles WHERE relationship_id IS NULL OR relationship_id = ?",
+                               (relationship_id,))
+            words = [word for (trigger_words,) in cursor.fetchall() for word in TriggerWordMatcher.parse(trigger_words)]
+        
+        matcher = TriggerWordMatcher(words)
+        with self._lock:
+            self._matchers[relationship_id] = matcher
+            self._builds += 1
+        return matcher
+
+    async def matcher(self, conversation_id=None):
+        """Awaitable matcher_for_conversation; only goes through the database executor on a cache miss"""
+        matcher = self.cached(conversation_id)
+        if matcher is None:
+            matcher = await run_db(self.matcher_for_conversation, conversation_id)
+        return matcher
+
+    def scan(self, matcher, text):
+        started = time.perf_counter()
+        found = matcher.scan(text)
+        with self._lock:
+            self._scans += 1
+            self._scan_seconds += time.perf_counter() - started
+            if found:
+                self._hits += 1
+        return found
+
+    def invalidate(self, relationship_id=None):
+        """Drop matchers affected by a profile change; relationship-less profiles affect all of them"""
+        with self._lock:
+            if relationship_id is None:
+                self._matchers.clear()
+            else:
+                self._matchers.pop(relationship_id, None)
+
+    def forget_conversation(self, conversation_id):
+        """Drop a conversation's remembered relationship after it is moved to another one"""
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'matchers': len(self._matchers),
+                'builds': self._builds,
+                'scans': self._scans,
+                'hits': self._hits,
+                'avg_scan_us': round(self._scan_seconds / self._scans * 1_000_000, 1) if self._scans else 0.0
+            }
+
+trigger_word_scanners = TriggerWordScanners()
+
+# Definition of family violence included in every evaluation and rewrite prompt
+FAMILY_VIOLENCE_ACT = """
+Family Violence includes behaviors such as:
+1. Physical, sexual, emotional, psychological, or economic abuse.
+2. Threats to kill or harm the individual, children, other family members, friends, or pets.
+3. Coercive behavior including:
+    - Isolation or control over the individual's activities.
+    - Coercing relinquishment of control over assets and income.
+    - Removing or keeping family member's property.
+    - Preventing access to joint financial assets.
+    - Preventing employment or coercing into signing contracts or legal documents.
+4. Emotional or psychological abuse such as:
+    - Repeated derogatory taunts, including, but not limited to, racial or sexual orientation-related.
+    - Threatening to disclose sensitive personal information, including intimate images or videos.
+    - Preventing connections with family, friends, or culture.
+    - Threats of suicide or self-harm.
+5. Stalking, surveillance, or following.
+6. Behavior that controls or dominates, instilling fear for safety.
+7. Using or threatening violence with weapons.
+8. Sexual abuse or sexually coercive behaviors.
+9. Intentionally damaging property or threats to do so.
+10. Deprivation of or threats to a family member's liberty.
+11. Actions or threats relating to choking.
+12. Subtle or indirect communication that may include humor or sarcasm to veil threats or coercive statements.
+13. Use of digital surveillance or control over digital activities and communications.
+14. Legal intimidation or threats involving the misuse of legal processes.
+15. Indications of escalation or seriousness in tone or content that could suggest an underlying threat or control, detectable even in a single message.
+16. Any other behaviors or patterns that could reasonably be interpreted as potential family violence, including those not explicitly listed, based on the severity, context, or cumulative impact of the communications.
+
+Note: These behaviors may constitute family violence even if they do not qualify as a criminal offense.
+"""
+
 # Chatbot Module (keeping existing functionality)
 class ChatbotModule:
     def __init__(self):
         logger.info("Chatbot module initialized.")
         self.model = "claude-3-5-sonnet-20241022"
 
-    def construct_compliance_prompt(self, message, orders, parental_role, recipient_role, user_language='en'):
-        family_violence_act = """
-        Family Violence includes behaviors such as:
-        1. Physical, sexual, emotional, psychological, or economic abuse.
-        2. Threats to kill or harm the individual, children, other family members, friends, or pets.
-        3. Coercive behavior including:
-            - Isolation or control over the individual's activities.
-            - Coercing relinquishment of control over assets and income.
-            - Removing or keeping family member's property.
-            - Preventing access to joint financial assets.
-            - Preventing employment or coercing into signing contracts or legal documents.
-        4. Emotional or psychological abuse such as:
-            - Repeated derogatory taunts, including, but not limited to, racial or sexual orientation-related.
-            - Threatening to disclose sensitive personal information, including intimate images or videos.
-            - Preventing connections with family, friends, or culture.
-            - Threats of suicide or self-harm.
-        5. Stalking, surveillance, or following.
-        6. Behavior that controls or dominates, instilling fear for safety.
-        7. Using or threatening violence with weapons.
-        8. Sexual abuse or sexually coercive behaviors.
-        9. Intentionally damaging property or threats to do so.
-        10. Deprivation of or threats to a family member's liberty.
-        11. Actions or threats relating to choking.
-        12. Subtle or indirect communication that may include humor or sarcasm to veil threats or coercive statements.
-        13. Use of digital surveillance or control over digital activities and communications.
-        14. Legal intimidation or threats involving the misuse of legal processes.
-        15. Indications of escalation or seriousness in tone or content that could suggest an underlying threat or control, detectable even in a single message.
-        16. Any other behaviors or patterns that could reasonably be interpreted as potential family violence, including those not explicitly listed, based on the severity, context, or cumulative impact of the communications.
-
-        Note: These behaviors may constitute family violence even if they do not qualify as a criminal offense.
+    @staticmethod
+    @functools.lru_cache(maxsize=16)
+    def preamble_blocks(orders):
+        """System blocks shared by every evaluation prompt: the Act, then the current orders.
+
+        One cache breakpoint after the orders covers both blocks. The Act alone is below the provider's
+        minimum cacheable length, so a breakpoint after it would never be used. The prefix stays warm
+        until a new version of the orders is uploaded.
         """
-        
+        cache_control = {"cache_control": {"type": "ephemeral"}} if PROMPT_CACHE_ENABLED else {}
+        return (
+            {"type": "text", "text": f"[FAMILY VIOLENCE ACT]{FAMILY_VIOLENCE_ACT}"},
+            {"type": "text", "text": f"[ORDERS]\n{orders}", **cache_control},
+        )
+
+    def construct_system_prompt(self, orders, instructions):
+        return [*self.preamble_blocks(orders), {"type": "text", "text": instructions}]
+
+    def construct_compliance_prompt(self, message, orders, parental_role, recipient_role, user_language='en'):
         # Get language instruction
-        language_names = {
-            'en': 'English', 'zh': 'Mandarin Chinese', 'hi': 'Hindi', 'es': 'Spanish',
-            'fr': 'French', 'ar': 'Arabic', 'bn': 'Bengali', 'pt': 'Portuguese', 
-            'ru': 'Russian', 'ja': 'Japanese'
-        }
-        
         language_instruction = ""
         if user_language != 'en':
-            language_name = language_names.get(user_language, 'English')
+            language_name = LANGUAGE_NAMES.get(user_language, 'English')
             language_instruction = f" Respond ONLY in {language_name} language."
     
         prompt = {
-            "system": f"You are an AI assistant tasked with evaluating whether a given message abides by the provided orders and the comprehensive definition of family violence included. Assess if the message is polite, respectful, and constructive, and provide your evaluation as 'yes' or 'no'.{language_instruction}",
+            "system": self.construct_system_prompt(
+                orders,
+                f"You are an AI assistant tasked with evaluating whether a given message abides by the provided orders and the comprehensive definition of family violence included. Assess if the message is polite, respectful, and constructive, and provide your evaluation as 'yes' or 'no'.{language_instruction}"
+            ),
             "messages": [
-                {"role": "user", "content": f"[ORDERS] {orders}\n[FAMILY VIOLENCE ACT] {family_violence_act}\n[FROM] {parental_role}\n[TO] {recipient_role}\n[MESSAGE] {message}\n[EVALUATION]"}
+                {"role": "user", "content": f"[FROM] {parental_role}\n[TO] {recipient_role}\n[MESSAGE] {message}\n[EVALUATION]"}
             ]
         }
         return prompt
 
     def construct_rewrite_prompt(self, message, orders, parental_role, recipient_role, user_language='en'):
-        family_violence_act = """
-        Family Violence includes behaviors such as:
-        1. Physical, sexual, emotional, psychological, or economic abuse.
-        2. Threats to kill or harm the individual, children, other family members, friends, or pets.
-        3. Coercive behavior including:
-            - Isolation or control over the individual's activities.
-            - Coercing relinquishment of control over assets and income.
-            - Removing or keeping family member's property.
-            - Preventing access to joint financial assets.
-            - Preventing employment or coercing into signing contracts or legal documents.
-        4. Emotional or psychological abuse such as:
-            - Repeated derogatory taunts, including, but not limited to, racial or sexual orientation-related.
-            - Threatening to disclose sensitive personal information, including intimfat images or videos.
-            - Preventing connections with family, friends, or culture.
-            - Threats of suicide or self-harm.
-        5. Stalking, surveillance, or following.
-        6. Behavior that controls or dominates, instilling fear for safety.
-        7. Using or threatening violence with weapons.
-        8. Sexual abuse or sexually coercive behaviors.
-        9. Intentionally damaging property or threats to do so.
-        10. Deprivation of or threats to a family member's liberty.
-        11. Actions or threats relating to choking.
-        12. Subtle or indirect communication that may include humor or sarcasm to veil threats or coercive statements.
-        13. Use of digital surveillance or control over digital activities and communications.
-        14. Legal intimidation or threats involving the misuse of legal processes.
-        15. Indications of escalation or seriousness in tone or content that could suggest an underlying threat or control, detectable even in a single message.
-        16. Any other behaviors or patterns that could reasonably be interpreted as potential family violence, including those not explicitly listed, based on the severity, context, or cumulative impact of the communications.
-        """
-
         # Get language instruction
-        language_names = {
-            'en': 'English', 'zh': 'Mandarin Chinese', 'hi': 'Hindi', 'es': 'Spanish',
-            'fr': 'French', 'ar': 'Arabic', 'bn': 'Bengali', 'pt': 'Portuguese', 
-            'ru': 'Russian', 'ja': 'Japanese'
-        }
-        
         language_instruction = ""
         if user_language != 'en':
-            language_name = language_names.get(user_language, 'English')
+            language_name = LANGUAGE_NAMES.get(user_language, 'English')
             language_instruction = f" Return the rewritten message ONLY in {language_name} language."
 
         system_message = (
@@ -1554,20 +3097,192 @@ class ChatbotModule:
             f"prelude or additional text.{language_instruction}"
         )
         return {
-            "system": system_message,
+            "system": self.construct_system_prompt(orders, system_message),
+            "messages": [
+                {"role": "user", "content": f"[FROM] {parental_role}\n[TO] {recipient_role}\n[ORIGINAL MESSAGE] {message}\n[REWRITTEN MESSAGE]"}
+            ]
+        }
+
+    def construct_structured_prompt(self, message, orders, parental_role, recipient_role, sender_language='en', recipient_language='en'):
+        sender_language_name = LANGUAGE_NAMES.get(sender_language, 'English')
+        recipient_language_name = LANGUAGE_NAMES.get(recipient_language, 'English')
+        
+        system_message = (
+            f"You are an AI assistant tasked with evaluating whether a given message abides by the provided orders and the "
+            f"comprehensive definition of family violence included, and rewriting it when it does not. A compliant message is "
+            f"polite, respectful, and constructive. Respond with ONLY a JSON object with exactly these keys: "
+            f"\"verdict\": \"yes\" if the message complies, otherwise \"no\"; "
+            f"\"sender_version\": in {sender_language_name}, the original message if it complies, otherwise a rewrite that is "
+            f"polite, respectful, and constructive, free from hostility, abuse, threats, or inappropriate demands; "
+            f"\"recipient_version\": the sender_version rendered in natural {recipient_language_name} with the same meaning and tone. "
+            f"Do not add any text outside the JSON object."
+        )
+        return {
+            "system": self.construct_system_prompt(orders, system_message),
             "messages": [
-                {"role": "user", "content": f"[ORDERS] {orders}\n[FAMILY VIOLENCE ACT] {family_violence_act}\n[FROM] {parental_role}\n[TO] {recipient_role}\n[ORIGINAL MESSAGE] {message}\n[REWRITTEN MESSAGE]"}
+                {"role": "user", "content": f"[FROM] {parental_role}\n[TO] {recipient_role}\n[MESSAGE] {message}\n[RESULT JSON]"}
             ]
         }
 
-    def evaluate_message_dual_language(self, message, orders, parental_role, recipient_role, sender_language='en', recipient_language='en'):
-        """Evaluate and rewrite message in both sender and recipient languages"""
-        logger.info(f"Evaluating dual-language message: sender_lang={sender_language}, recipient_lang={recipient_language}")
+    def parse_structured_evaluation(self, raw_response):
+        """Strictly parse a structured evaluation; raises ValueError if the reply is not exactly the expected JSON"""
+        text = raw_response.strip()
+        fenced = re.fullmatch(r"```(?:json)?\s*(.*?)\s*```", text, re.DOTALL)
+        if fenced:
+            text = fenced.group(1)
+        
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Structured evaluation is not valid JSON: {e}")
+        
+        if not isinstance(data, dict) or set(data) != {'verdict', 'sender_version', 'recipient_version'}:
+            raise ValueError("Structured evaluation has unexpected keys")
+        verdict = str(data['verdict']).strip().lower()
+        if verdict not in ('yes', 'no'):
+            raise ValueError(f"Structured evaluation has invalid verdict: {data['verdict']!r}")
+        for field in ('sender_version', 'recipient_version'):
+            if not isinstance(data[field], str) or not data[field].strip():
+                raise ValueError(f"Structured evaluation is missing {field}")
+        
+        return {
+            'verdict': verdict,
+            'sender_version': data['sender_version'].strip(),
+            'recipient_version': data['recipient_version'].strip()
+        }
+
+    async def evaluate_message_structured(self, message, orders, parental_role, recipient_role, sender_language='en', recipient_language='en'):
+        """Evaluate, rewrite and translate a message with a single LLM call"""
+        async def evaluate():
+            prompt = self.construct_structured_prompt(message, orders, parental_role, recipient_role, sender_language, recipient_language)
+            response = await llm_gateway.complete(
+                model=self.model,
+                max_tokens=2000,
+                temperature=0.3,
+                system=prompt["system"],
+                messages=prompt["messages"]
+            )
+            return json.dumps(self.parse_structured_evaluation(response))
+        
+        key = evaluation_cache.make_key('structured', message, orders, parental_role, recipient_role,
+                                        sender_language, recipient_language)
+        parsed = json.loads(await evaluation_cache.get_or_compute('structured', key, evaluate))
+        
+        needs_rewrite = parsed['verdict'] != 'yes'
+        sender_version = parsed['sender_version'] if needs_rewrite else message
+        if sender_language == recipient_language:
+            recipient_version = sender_version
+        else:
+            recipient_version = parsed['recipient_version']
+        
+        return {
+            'sender_language': sender_language,
+            'recipient_language': recipient_language,
+            'needs_rewrite': needs_rewrite,
+            'sender_version': sender_version,
+            'recipient_version': recipient_version
+        }
+
+    async def evaluate_message_dual_language(self, message, orders, parental_role, recipient_role, sender_language='en', recipient_language='en',
+                                             trigger_matcher=None, on_rewrite_delta=None):
+        """Evaluate and rewrite message in both sender and recipient languages.
+
+        ``on_rewrite_delta`` is awaited with each text delta of the sender-language rewrite when one is generated.
+        """
+        logger.info(f"Evaluating dual-language message: sender_lang={sender_language}, recipient_lang={recipient_language}, engine={EVALUATION_ENGINE}")
+        if trigger_matcher is not None:
+            trigger_words = trigger_word_scanners.scan(trigger_matcher, message)
+            if trigger_words:
+                logger.info(f"Message hit {len(trigger_words)} trigger word(s); rewriting without a compliance check")
+                return await self.rewrite_for_trigger_words(message, orders, parental_role, recipient_role,
+                                                            sender_language, recipient_language, trigger_words,
+                                                            on_rewrite_delta)
+        
+        screen = None
+        if message_prescreen.mode in ('on', 'shadow'):
+            screen = message_prescreen.screen(message)
+            if screen['benign'] and message_prescreen.mode == 'on':
+                message_prescreen.record_bypass()
+                return await self.prescreened_result(message, sender_language, recipient_language)
+        
+        started = time.monotonic()
+        fell_back = False
+        label = llm_call_label.set(f"evaluation:{EVALUATION_ENGINE}")
+        try:
+            if EVALUATION_ENGINE == 'structured':
+                try:
+                    results = await self.evaluate_message_structured(message, orders, parental_role, recipient_role,
+                                                                     sender_language, recipient_language)
+                except ValueError as e:
+                    logger.warning(f"Structured evaluation failed, falling back to multi-call: {str(e)}")
+                    fell_back = True
+                    results = await self.evaluate_message_multi_call(message, orders, parental_role, recipient_role,
+                                                                     sender_language, recipient_language, on_rewrite_delta)
+            else:
+                results = await self.evaluate_message_multi_call(message, orders, parental_role, recipient_role,
+                                                                 sender_language, recipient_language, on_rewrite_delta)
+        finally:
+            llm_call_label.reset(label)
+        
+        evaluation_engine_stats.record(EVALUATION_ENGINE, time.monotonic() - started, fell_back)
+        if screen is not None and message_prescreen.mode == 'shadow':
+            message_prescreen.record_shadow(message, screen, results['needs_rewrite'])
+        logger.info(f"Dual-language result: sender='{results['sender_version'][:50]}...', recipient='{results['recipient_version'][:50]}...'")
+        return results
+
+    async def rewrite_for_trigger_words(self, message, orders, parental_role, recipient_role, sender_language, recipient_language, trigger_words,
+                                        on_rewrite_delta=None):
+        """Rewrite a message containing the family's trigger words, skipping the compliance round trip"""
+        label = llm_call_label.set("evaluation:trigger_words")
+        try:
+            rewrites = [self.rewrite_message(message, orders, parental_role, recipient_role, sender_language, on_rewrite_delta)]
+            if sender_language != recipient_language:
+                rewrites.append(self.rewrite_message(message, orders, parental_role, recipient_role, recipient_language))
+            rewritten = await asyncio.gather(*rewrites)
+        finally:
+            llm_call_label.reset(label)
+        
+        return {
+            'sender_language': sender_language,
+            'recipient_language': recipient_language,
+            'needs_rewrite': True,
+            'sender_version': rewritten[0],
+            'recipient_version': rewritten[-1],
+            'trigger_words': trigger_words
+        }
+
+    async def prescreened_result(self, message, sender_language, recipient_language):
+        """Result for a message the local pre-screen cleared; only a translation may still be needed"""
+        recipient_version = message
+        if sender_language != recipient_language:
+            recipient_version = await self.translate_message_direct(message, recipient_language)
+        return {
+            'sender_language': sender_language,
+            'recipient_language': recipient_language,
+            'needs_rewrite': False,
+            'sender_version': message,
+            'recipient_version': recipient_version
+        }
+
+    async def evaluate_message_multi_call(self, message, orders, parental_role, recipient_role, sender_language='en', recipient_language='en',
+                                          on_rewrite_delta=None):
+        """Evaluate with separate compliance, rewrite and translation calls"""
+        def start_rewrites(on_delta=None):
+            # Sender and recipient rewrites are independent, so they run side by side
+            tasks = [asyncio.ensure_future(self.rewrite_message(message, orders, parental_role, recipient_role, sender_language, on_delta))]
+            if sender_language != recipient_language:
+                tasks.append(asyncio.ensure_future(self.rewrite_message(message, orders, parental_role, recipient_role, recipient_language)))
+            return tasks
         
-        # Evaluate in sender's language first
-        sender_prompt = self.construct_compliance_prompt(message, orders, parental_role, recipient_role, sender_language)
-        sender_raw_response = self.generate_response(sender_prompt)
-        sender_evaluation = self.extract_evaluation(sender_raw_response)
+        # In speculative mode the rewrites start before we know whether they are needed, so they are never streamed
+        rewrite_tasks = start_rewrites() if SPECULATIVE_REWRITE else None
+        
+        try:
+            # Evaluate in sender's language first
+            sender_evaluation = await self.check_compliance(message, orders, parental_role, recipient_role, sender_language)
+        except BaseException:
+            self.discard_tasks(rewrite_tasks or [])
+            raise
         
         results = {
             'sender_language': sender_language,
@@ -1576,67 +3291,108 @@ class ChatbotModule:
         }
         
         if sender_evaluation == "yes":
+            if rewrite_tasks:
+                self.discard_tasks(rewrite_tasks)
+                logger.info("Message passed compliance check; cancelled speculative rewrites")
+            
             # Message is appropriate, but we still need both language versions
             results['sender_version'] = message
             if sender_language == recipient_language:
                 results['recipient_version'] = message
             else:
                 # Translate original message to recipient's language
-                results['recipient_version'] = self.translate_message_direct(message, recipient_language)
+                results['recipient_version'] = await self.translate_message_direct(message, recipient_language)
         else:
             # Message needs rewriting in both languages
-            results['sender_version'] = self.rewrite_message(message, orders, parental_role, recipient_role, sender_language)
-            if sender_language == recipient_language:
-                results['recipient_version'] = results['sender_version']
-            else:
-                results['recipient_version'] = self.rewrite_message(message, orders, parental_role, recipient_role, recipient_language)
+            rewritten = await asyncio.gather(*(rewrite_tasks or start_rewrites(on_rewrite_delta)))
+            results['sender_version'] = rewritten[0]
+            results['recipient_version'] = rewritten[-1]
         
-        logger.info(f"Dual-language result: sender='{results['sender_version'][:50]}...', recipient='{results['recipient_version'][:50]}...'")
         return results
 
-    def translate_message_direct(self, message_content, target_language):
+    @staticmethod
+    def discard_tasks(tasks):
+        """Cancel tasks whose results are no longer needed without leaking unretrieved errors"""
+        for task in tasks:
+            task.cancel()
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def translate_message_direct(self, message_content, target_language):
         """Translate message content directly to target language"""
         try:
-            language_names = {
-                'en': 'English', 'zh': 'Mandarin Chinese', 'hi': 'Hindi', 'es': 'Spanish',
-                'fr': 'French', 'ar': 'Arabic', 'bn': 'Bengali', 'pt': 'Portuguese', 
-                'ru': 'Russian', 'ja': 'Japanese'
-            }
-            
-            target_language_name = language_names.get(target_language, 'English')
-            
-            # Use Claude to translate the message
-            response = client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=1000,
-                temperature=0.1,
-                system=f"You are a professional translator for family communication. Translate the text to natural, conversational {target_language_name} while preserving the exact meaning, tone, and intent. Return ONLY the translated text.",
-                messages=[
-                    {
-                        "role": "user", 
-                        "content": f"Translate to {target_language_name}: {message_content}"
-                    }
-                ]
-            )
+            target_language_name = LANGUAGE_NAMES.get(target_language, 'English')
+            
+            async def translate():
+                # Use Claude to translate the message
+                translated_text = await llm_gateway.complete(
+                    model="claude-3-5-sonnet-20241022",
+                    max_tokens=1000,
+                    temperature=0.1,
+                    system=f"You are a professional translator for family communication. Translate the text to natural, conversational {target_language_name} while preserving the exact meaning, tone, and intent. Return ONLY the translated text.",
+                    messages=[
+                        {
+                            "role": "user", 
+                            "content": f"Translate to {target_language_name}: {message_content}"
+                        }
+                    ]
+                )
+                
+                return translated_text.strip()
             
-            translated_text = ' '.join([block.text for block in response.content]).strip()
-            return translated_text
+            key = evaluation_cache.make_key('translation', message_content, target_language)
+            return await evaluation_cache.get_or_compute('translation', key, translate)
             
         except Exception as e:
             logger.error(f"Error translating message: {str(e)}")
             return message_content
 
-    def rewrite_message(self, message, orders, parental_role, recipient_role, user_language='en'):
-        logger.info(f"Rewriting message: {message} in language: {user_language}")
-        prompt = self.construct_rewrite_prompt(message, orders, parental_role, recipient_role, user_language)
-        raw_response = self.generate_response(prompt)
-        rewritten_message = self.extract_rewritten_message(raw_response)
-        logger.info(f"Rewritten message: {rewritten_message}")
-        return rewritten_message
-
-    def generate_response(self, prompt):
+    async def check_compliance(self, message, orders, parental_role, recipient_role, user_language='en'):
+        """Return 'yes' if the message complies with the orders, otherwise 'no'"""
+        async def evaluate():
+            prompt = self.construct_compliance_prompt(message, orders, parental_role, recipient_role, user_language)
+            return self.extract_evaluation(await self.generate_response(prompt))
+        
+        key = evaluation_cache.make_key('evaluation', message, orders, parental_role, recipient_role, user_language)
+        return await evaluation_cache.get_or_compute('evaluation', key, evaluate)
+
+    async def evaluate_message(self, message, orders, parental_role, recipient_role, user_language='en'):
+        """Return the message unchanged if it complies, otherwise its rewritten version"""
+        evaluation = await self.check_compliance(message, orders, parental_role, recipient_role, user_language)
+        if evaluation == "yes":
+            return message
+        return await self.rewrite_message(message, orders, parental_role, recipient_role, user_language)
+
+    async def rewrite_message(self, message, orders, parental_role, recipient_role, user_language='en', on_delta=None):
+        async def rewrite():
+            logger.info(f"Rewriting message: {message} in language: {user_language}")
+            prompt = self.construct_rewrite_prompt(message, orders, parental_role, recipient_role, user_language)
+            raw_response = await self.generate_response(prompt, on_delta)
+            rewritten_message = self.extract_rewritten_message(raw_response)
+            logger.info(f"Rewritten message: {rewritten_message}")
+            return rewritten_message
+        
+        key = evaluation_cache.make_key('rewrite', message, orders, parental_role, recipient_role, user_language)
+        return await evaluation_cache.get_or_compute('rewrite', key, rewrite)
+
+    async def generate_response(self, prompt, on_delta=None):
         logger.info(f"Generating response for messages: {prompt['messages']}")
-        response = client.messages.create(
+        if on_delta is not None:
+            # Stream the reply, handing each text delta to the caller as it arrives
+            chunks = []
+            async for text in llm_gateway.stream_text(
+                model=self.model,
+                max_tokens=1000,
+                temperature=0.3,
+                system=prompt["system"],
+                messages=prompt["messages"]
+            ):
+                chunks.append(text)
+                await on_delta(text)
+            raw_response = ''.join(chunks)
+            logger.info(f"Generated raw response: {raw_response}")
+            return raw_response
+        
+        response = await llm_gateway.create_message(
             model=self.model,
             max_tokens=1000,
             temperature=0.3,
@@ -1671,7 +3427,7 @@ def log_message_dual_language(user_name, user_email, original_message, sender_ve
     message_data = f"{user_name}:{original_message}:{timestamp}"
     message_hash = hashlib.sha256(message_data.encode()).hexdigest()
     
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_db_connection() as conn:
         cursor = conn.cursor()
         
         # Insert main message record (using sender's version as primary)
@@ -1692,6 +3448,7 @@ def log_message_dual_language(user_name, user_email, original_message, sender_ve
             INSERT OR REPLACE INTO message_translations (message_id, language_code, original_text, rewritten_text, created_date)
             VALUES (?, ?, ?, ?, ?)
         """, (message_id, sender_language, original_message, sender_version, timestamp))
+        index_message_translation(cursor, cursor.lastrowid, sender_version, sender_language, conversation_id)
         
         # Store recipient language version (if different)
         if sender_language != recipient_language:
@@ -1699,12 +3456,19 @@ def log_message_dual_language(user_name, user_email, original_message, sender_ve
                 INSERT OR REPLACE INTO message_translations (message_id, language_code, original_text, rewritten_text, created_date)
                 VALUES (?, ?, ?, ?, ?)
             """, (message_id, recipient_language, original_message, recipient_version, timestamp))
+            index_message_translation(cursor, cursor.lastrowid, recipient_version, recipient_language, conversation_id)
         
         conn.commit()
         logger.info(f"Logged dual-language message: ID={message_id}, sender_lang={sender_language}, recipient_lang={recipient_language}")
         
         return message_id
 
+def index_message_translation(cursor, translation_id, text, language, conversation_id):
+    """Add a translation to message_translations_fts, split by its language's analyzer"""
+    cursor.execute("""
+        INSERT INTO message_translations_fts (rowid, terms, language, conversation) VALUES (?, ?, ?, ?)
+    """, (translation_id, search_index_text(text, language), f"l{language}", f"c{conversation_id}"))
+
 def log_message(user_name, user_email, original_message, rewritten_message, conversation_id, parental_role, recipient_role):
     """Backward compatibility wrapper for log_message_dual_language"""
     return log_message_dual_language(
@@ -1712,26 +3476,488 @@ def log_message(user_name, user_email, original_message, rewritten_message, conv
         conversation_id, parental_role, recipient_role, 'en', 'en'
     )
 
+def get_language_preferences(user_email):
+    """Return (sender_language, recipient_language) for a sender and the other parent"""
+    sender_language = 'en'
+    recipient_language = 'en'
+    
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Get sender's language
+        cursor.execute("""
+            SELECT us.language_code 
+            FROM user_settings us
+            JOIN users u ON us.user_id = u.id
+            WHERE u.email = ?
+        """, (user_email,))
+        sender_result = cursor.fetchone()
+        if sender_result:
+            sender_language = sender_result[0]
+        
+        # Get recipient's language (other parent)
+        cursor.execute("""
+            SELECT DISTINCT us.language_code 
+            FROM user_settings us
+            JOIN users u ON us.user_id = u.id
+            WHERE u.email != ?
+            LIMIT 1
+        """, (user_email,))
+        recipient_result = cursor.fetchone()
+        if recipient_result:
+            recipient_language = recipient_result[0]
+    
+    return sender_language, recipient_language
+
+def fetch_current_orders(cursor):
+    """Return the most recently uploaded orders text; each upload is a new version"""
+    cursor.execute("SELECT description FROM orders ORDER BY id DESC LIMIT 1")
+    orders = cursor.fetchone()
+    return orders[0] if orders and orders[0] else ""
+
+def get_orders_text():
+    """Return the uploaded orders text used when evaluating messages"""
+    with get_db_connection() as conn:
+        return fetch_current_orders(conn.cursor())
+
+def fetch_conversation_participants(cursor, conversation_id):
+    """Return (user_id, email) for both parents of the relationship a conversation belongs to"""
+    cursor.execute("""
+        SELECT u.id, u.email FROM conversations c
+        JOIN user_relationships r ON r.id = c.relationship_id
+        JOIN users u ON u.id IN (r.user_id, r.other_parent_id)
+        WHERE c.id = ?
+    """, (conversation_id,))
+    return cursor.fetchall()
+
+def get_conversation_participants(conversation_id):
+    with get_db_connection() as conn:
+        return fetch_conversation_participants(conn.cursor(), conversation_id)
+
+def message_sender_rejection(current_user, conversation_id):
+    """Return (status, reason) if ``current_user`` may not post to the conversation, else None.
+
+    New messages are pushed live to the other parent, so the sender must be signed in and, in a conversation
+    that belongs to a relationship, be one of its two parents. Conversations without a relationship have no
+    parents to push to and accept any signed-in sender.
+    """
+    if not current_user:
+        return 401, "Authentication required"
+    participants = get_conversation_participants(conversation_id)
+    if participants and not any(user_id == current_user['id'] for user_id, _ in participants):
+        return 403, "Not a participant in this conversation"
+    return None
+
+def fetch_user_ids(cursor, emails):
+    """Map email addresses to user ids, skipping unknown addresses"""
+    emails = [email for email in emails if email]
+    if not emails:
+        return []
+    cursor.execute(f"SELECT id FROM users WHERE email IN ({','.join('?' * len(emails))})", emails)
+    return [row[0] for row in cursor.fetchall()]
+
+# Typed events pushed over /ws
+class MessageCreatedEvent(BaseModel):
+    type: Literal["message_created"] = "message_created"
+    conversation_id: int
+    message_id: int
+    user_name: str
+    user_email: str
+    parental_role: str
+    message: str
+    timestamp: str
+
+class MessageReadEvent(BaseModel):
+    type: Literal["message_read"] = "message_read"
+    conversation_id: Optional[int] = None
+    message_ids: List[int]
+    is_read: bool
+    read_by: str
+    read_at: str
+
+class NotificationEvent(BaseModel):
+    type: Literal["notification"] = "notification"
+    notification_type: str
+    message_id: Optional[int] = None
+    conversation_id: Optional[int] = None
+    created_date: str
+
+class CallStateEvent(BaseModel):
+    type: Literal["call_state"] = "call_state"
+    call_id: Optional[int] = None
+    session_id: Optional[int] = None
+    state: str
+    changed_by: str
+    timestamp: str
+
+class ExportJobEvent(BaseModel):
+    type: Literal["export_job"] = "export_job"
+    job_id: str
+    kind: str
+    status: str
+    file_name: str
+    error: Optional[str] = None
+
 # WebSocket connection manager
+class ClientConnection:
+    """A websocket with its own bounded send queue, drained by a dedicated writer task"""
+
+    def __init__(self, websocket: WebSocket, user_id: Optional[int], queue_size: int):
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.user_id = user_id
+        self.conversations = set()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.writer = None
+        self.closed = False
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+    """Websocket registry indexed by user and conversation.
+
+    Sends never touch the socket directly: messages go onto each connection's bounded queue, so one
+    slow client cannot hold up the others. A client whose queue stays full, or whose socket send
+    stalls, for longer than ``send_timeout`` is evicted.
+
+    ``publish`` routes through the event broker so sockets held by other worker processes are reached too;
+    the ``send_*`` methods only reach sockets in this process.
+    """
+
+    def __init__(self, queue_size: int, send_timeout: float):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.broker = None
+        self.loop = None  # server event loop, so executor threads can publish
+        self._connections = {}  # websocket -> ClientConnection
+        self._by_user = defaultdict(set)
+        self._by_conversation = defaultdict(set)
+        self._delivered = 0
+        self._evictions = 0
+        self._peak_connections = 0
+
+    async def connect(self, websocket: WebSocket, user_id: Optional[int] = None):
+        await websocket.accept()
+        connection = ClientConnection(websocket, user_id, self.queue_size)
+        connection.writer = asyncio.create_task(self._write_loop(connection))
+        self._connections[websocket] = connection
+        if user_id is not None:
+            self._by_user[user_id].add(connection)
+        self._peak_connections = max(self._peak_connections, len(self._connections))
+        return connection
+
+    def disconnect(self, websocket: WebSocket):
+        connection = self._connections.pop(websocket, None)
+        if connection is None:
+            return
+        connection.closed = True
+        if connection.user_id is not None:
+            self._discard(self._by_user, connection.user_id, connection)
+        for conversation_id in connection.conversations:
+            self._discard(self._by_conversation, conversation_id, connection)
+        if connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    @staticmethod
+    def _discard(index, key, connection):
+        connections = index.get(key)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del index[key]
+
+    def subscribe(self, websocket: WebSocket, conversation_id: int):
+        connection = self._connections.get(websocket)
+        if connection is not None:
+            connection.conversations.add(conversation_id)
+            self._by_conversation[conversation_id].add(connection)
+
+    def unsubscribe(self, websocket: WebSocket, conversation_id: int):
+        connection = self._connections.get(websocket)
+        if connection is not None:
+            connection.conversations.discard(conversation_id)
+            self._discard(self._by_conversation, conversation_id, connection)
+
+    async def _write_loop(self, connection: ClientConnection):
+        try:
+            while True:
+                message = await connection.queue.get()
+                await asyncio.wait_for(connection.websocket.send_text(message), self.send_timeout)
+                self._delivered += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._evict(connection, f"send failed: {type(e).__name__}")
+
+    async def _enqueue(self, connection: ClientConnection, message: str):
+        if connection.closed:
+            return False
+        try:
+            connection.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+        try:
+            await asyncio.wait_for(connection.queue.put(message), self.send_timeout)
+            return True
+        except asyncio.TimeoutError:
+            await self._evict(connection, "send queue full")
+            return False
+
+    async def _evict(self, connection: ClientConnection, reason: str):
+        if connection.closed:
+            return
+        logger.warning(f"Evicting slow websocket client (user={connection.user_id}): {reason}")
+        self._evictions += 1
+        self.disconnect(connection.websocket)
+        try:
+            # 1013: try again later
+            await asyncio.wait_for(connection.websocket.close(code=1013), self.send_timeout)
+        except Exception:
+            pass
+
+    async def deliver(self, connections, message: str):
+        """Queue a message on every connection concurrently; returns how many accepted it"""
+        results = await asyncio.gather(*(self._enqueue(connection, message) for connection in connections))
+        return sum(results)
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        connection = self._connections.get(websocket)
+        if connection is not None:
+            await self._enqueue(connection, message)
+
+    async def send_to_users(self, user_ids, message: str, exclude: Optional[WebSocket] = None):
+        targets = {connection for user_id in user_ids for connection in self._by_user.get(user_id, ())}
+        return await self.deliver([c for c in targets if c.websocket is not exclude], message)
+
+    async def send_to_conversation(self, conversation_id: int, message: str, user_ids=(), exclude: Optional[WebSocket] = None):
+        """Send to sockets subscribed to a conversation plus every socket of the given users"""
+        targets = set(self._by_conversation.get(conversation_id, ()))
+        for user_id in user_ids:
+            targets.update(self._by_user.get(user_id, ()))
+        return await self.deliver([c for c in targets if c.websocket is not exclude], message)
+
+    async def broadcast(self, message: str):
+        return await self.deliver(list(self._connections.values()), message)
+
+    async def publish(self, message: str, conversation_id: Optional[int] = None, user_ids=(),
+                      exclude: Optional[WebSocket] = None, broadcast: bool = False):
+        """Deliver to matching sockets in every worker process"""
+        excluded = self._connections.get(exclude) if exclude is not None else None
+        envelope = {
+            'message': message,
+            'conversation_id': conversation_id,
+            'user_ids': list(user_ids),
+            'broadcast': broadcast,
+            'exclude': excluded.id if excluded else None
+        }
+        await self.broker.publish(envelope)
+
+    async def dispatch(self, envelope):
+        """Deliver a published envelope to the matching sockets of this process"""
+        if envelope.get('broadcast'):
+            targets = set(self._connections.values())
+        else:
+            targets = set(self._by_conversation.get(envelope.get('conversation_id'), ()))
+            for user_id in envelope.get('user_ids', ()):
+                targets.update(self._by_user.get(user_id, ()))
+        exclude = envelope.get('exclude')
+        return await self.deliver([c for c in targets if c.id != exclude], envelope['message'])
+
+    def stats(self):
+        return {
+            'connections': len(self._connections),
+            'peak_connections': self._peak_connections,
+            'users': len(self._by_user),
+            'conversations': len(self._by_conversation),
+            'queued': sum(connection.queue.qsize() for connection in self._connections.values()),
+            'delivered': self._delivered,
+            'evictions': self._evictions
+        }
+
+class InProcessBroker:
+    """Event broker for a single worker: published envelopes go straight to the local manager"""
+
+    def __init__(self, deliver):
+        self._deliver = deliver
+        self._published = 0
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, envelope):
+        self._published += 1
+        await self._deliver(envelope)
+
+    def stats(self):
+        return {'backend': 'local', 'published': self._published}
+
+class SQLiteNotifyBroker:
+    """Cross-process event broker needing no external service.
+
+    Envelopes are delivered locally at once and appended to the ``ws_events`` table; every worker polls
+    the table for rows written by other workers and delivers them to its own sockets. Rows older than
+    ``retention`` seconds are purged.
+    """
+
+    PURGE_EVERY = 100  # polls between sweeps of expired rows
+
+    def __init__(self, deliver, poll_interval: float, retention: float):
+        self._deliver = deliver
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = uuid.uuid4().hex
+        self._last_id = 0
+        self._poller = None
+        self._published = 0
+        self._received = 0
+        self._polls = 0
+
+    def _latest_id(self):
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM ws_events")
+            return cursor.fetchone()[0]
+
+    def _append(self, envelope):
+        with get_db_connection() as conn:
+            conn.execute("INSERT INTO ws_events (origin, envelope, created_at) VALUES (?, ?, ?)",
+                         (self.origin, json.dumps(envelope), time.time()))
+            conn.commit()
+
+    def _fetch(self, after_id, purge):
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if purge:
+                cursor.execute("DELETE FROM ws_events WHERE created_at < ?", (time.time() - self.retention,))
+                conn.commit()
+            cursor.execute("SELECT id, origin, envelope FROM ws_events WHERE id > ? ORDER BY id LIMIT 500", (after_id,))
+            return cursor.fetchall()
+
+    async def start(self):
+        if self._poller is None:
+            self._last_id = await run_db(self._latest_id)
+            self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    async def publish(self, envelope):
+        self._published += 1
+        await self._deliver(envelope)
+        await run_db(self._append, envelope)
+
+    async def _poll(self):
+        while True:
+            try:
+                self._polls += 1
+                rows = await run_db(self._fetch, self._last_id, self._polls % self.PURGE_EVERY == 0)
+                for event_id, origin, envelope in rows:
+                    self._last_id = event_id
+                    if origin != self.origin:
+                        self._received += 1
+                        await self._deliver(json.loads(envelope))
+                if len(rows) == 500:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error polling websocket events: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+    def stats(self):
+        return {
+            'backend': 'sqlite',
+            'origin': self.origin,
+            'published': self._published,
+            'received': self._received,
+            'last_event_id': self._last_id
+        }
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+async def dispatch_envelope(envelope):
+    """Broker callback: session revocations, profile changes and conversation moves update this worker's caches,
+    anything else goes to sockets"""
+    if 'session_revocation' in envelope:
+        apply_session_revocation(envelope['session_revocation'])
+        return
+    if 'trigger_words_changed' in envelope:
+        trigger_word_scanners.invalidate(envelope['trigger_words_changed']['relationship_id'])
+        return
+    if 'conversation_relationship_changed' in envelope:
+        trigger_word_scanners.forget_conversation(envelope['conversation_relationship_changed']['conversation_id'])
+        return
+    await manager.dispatch(envelope)
+
+def conversation_relationship_changed(conversation_id):
+    """Call after moving a conversation to another relationship, so every worker re-reads which trigger words apply"""
+    trigger_word_scanners.forget_conversation(conversation_id)
+    submit_publish(event_broker.publish, {'conversation_relationship_changed': {'conversation_id': conversation_id}})
+
+manager = ConnectionManager(WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT)
+if WS_BROKER == 'sqlite':
+    event_broker = SQLiteNotifyBroker(dispatch_envelope, WS_BROKER_POLL_INTERVAL, WS_BROKER_RETENTION)
+else:
+    event_broker = InProcessBroker(dispatch_envelope)
+manager.broker = event_broker
+
+@app.on_event("startup")
+async def start_event_broker():
+    manager.loop = asyncio.get_running_loop()
+    await event_broker.start()
+
+async def notify_message_created(conversation_id, message_id, sender_email, user_name, parental_role,
+                                 sender_version, recipient_version, exclude: Optional[WebSocket] = None):
+    """Push a newly logged message to the conversation's participants"""
+    try:
+        participants = await run_db(get_conversation_participants, conversation_id)
+    except Exception as e:
+        logger.error(f"Error loading conversation participants: {str(e)}")
+        participants = []
+    sender_ids = [user_id for user_id, email in participants if email == sender_email]
+    recipient_ids = [user_id for user_id, email in participants if email != sender_email]
+    event = MessageCreatedEvent(
+        conversation_id=conversation_id,
+        message_id=message_id,
+        user_name=user_name,
+        user_email=sender_email,
+        parental_role=parental_role,
+        message=recipient_version,
+        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    )
+    # The other parent sees their language version; the sender's other sockets see the sender's version.
+    # Only participants may subscribe, so addressing both by user reaches every subscriber exactly once.
+    await asyncio.gather(
+        manager.publish(event.model_dump_json(), user_ids=recipient_ids, exclude=exclude),
+        manager.publish(event.model_copy(update={'message': sender_version}).model_dump_json(),
+                        user_ids=sender_ids, exclude=exclude)
+    )
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+def emit_event(event: BaseModel, conversation_id: Optional[int] = None, user_ids=()):
+    """Publish a typed event without waiting for delivery; callable from the event loop or executor threads"""
+    submit_publish(manager.publish, event.model_dump_json(), conversation_id=conversation_id, user_ids=user_ids)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+def submit_publish(publish, *args, **kwargs):
+    """Schedule ``publish(*args, **kwargs)`` on the server's event loop from the loop itself or any thread"""
+    loop = manager.loop
+    if loop is None or loop.is_closed():
+        return
+    coroutine = publish(*args, **kwargs)
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        future = loop.create_task(coroutine)
+    else:
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+    future.add_done_callback(log_publish_failure)
 
-manager = ConnectionManager()
+def log_publish_failure(future):
+    if not future.cancelled() and future.exception():
+        logger.error(f"Error publishing event: {future.exception()}")
 
 # Routes
 @app.get("/", response_class=HTMLResponse)
@@ -1740,12 +3966,34 @@ async def get_homepage():
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # Browsers cannot set headers on websockets, so the session token comes as a query parameter
+    token = websocket.query_params.get("token")
+    current_user = await get_current_user_async(f"Bearer {token}") if token else None
+    await manager.connect(websocket, current_user['id'] if current_user else None)
     try:
         while True:
             data = await websocket.receive_text()
             message_data = json.loads(data)
             
+            if message_data.get("type") in ("subscribe", "unsubscribe"):
+                conversation_id = message_data.get("conversation_id")
+                if not conversation_id:
+                    continue
+                if message_data["type"] == "unsubscribe":
+                    manager.unsubscribe(websocket, conversation_id)
+                    continue
+                
+                # Subscribers receive every message in full, so only the conversation's two parents may subscribe
+                participants = await run_db(get_conversation_participants, conversation_id) if current_user else []
+                if any(user_id == current_user['id'] for user_id, _ in participants):
+                    manager.subscribe(websocket, conversation_id)
+                else:
+                    await manager.send_personal_message(json.dumps({
+                        "type": "error",
+                        "message": "Not a participant in this conversation"
+                    }), websocket)
+                continue
+            
             if message_data.get("type") == "message_evaluation":
                 # Process message evaluation through WebSocket
                 if not message_data.get("conversation_id"):
@@ -1755,63 +4003,57 @@ async def websocket_endpoint(websocket: WebSocket):
                     }), websocket)
                     continue
                 
+                # The sender is the socket's user, never whoever the payload names
+                rejection = await run_db(message_sender_rejection, current_user, message_data["conversation_id"])
+                if rejection:
+                    await manager.send_personal_message(json.dumps({
+                        "type": "error",
+                        "message": rejection[1]
+                    }), websocket)
+                    continue
+                sender_email = current_user['email']
+                sender_name = current_user['fullName'] or sender_email
+                
                 # Get sender and recipient language preferences
                 sender_language = 'en'
                 recipient_language = 'en'
                 
-                if message_data.get("user_email"):
-                    try:
-                        with sqlite3.connect(DB_PATH) as conn:
-                            cursor = conn.cursor()
-                            
-                            # Get sender's language
-                            cursor.execute("""
-                                SELECT us.language_code 
-                                FROM user_settings us
-                                JOIN users u ON us.user_id = u.id
-                                WHERE u.email = ?
-                            """, (message_data["user_email"],))
-                            sender_result = cursor.fetchone()
-                            if sender_result:
-                                sender_language = sender_result[0]
-                            
-                            # Get recipient's language (other parent)
-                            cursor.execute("""
-                                SELECT DISTINCT us.language_code 
-                                FROM user_settings us
-                                JOIN users u ON us.user_id = u.id
-                                WHERE u.email != ?
-                                LIMIT 1
-                            """, (message_data["user_email"],))
-                            recipient_result = cursor.fetchone()
-                            if recipient_result:
-                                recipient_language = recipient_result[0]
-                                
-                    except Exception as e:
-                        logger.error(f"Error getting language preferences: {str(e)}")
+                try:
+                    sender_language, recipient_language = await run_db(get_language_preferences, sender_email)
+                except Exception as e:
+                    logger.error(f"Error getting language preferences: {str(e)}")
                     
                 chatbot = ChatbotModule()
                 
-                with sqlite3.connect(DB_PATH) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT description FROM orders")
-                    orders = cursor.fetchone()
-                    orders_text = orders[0] if orders else ""
+                orders_text = await run_db(get_orders_text)
+                trigger_matcher = await trigger_word_scanners.matcher(message_data["conversation_id"])
+                
+                # Streaming clients see the rewrite as it is generated; the final result still follows
+                async def send_rewrite_delta(delta, conversation_id=message_data["conversation_id"]):
+                    await manager.send_personal_message(json.dumps({
+                        "type": "rewrite_delta",
+                        "conversation_id": conversation_id,
+                        "delta": delta
+                    }), websocket)
+                on_rewrite_delta = send_rewrite_delta if message_data.get("stream") else None
 
                 # Use dual-language evaluation
-                evaluation_result = chatbot.evaluate_message_dual_language(
+                evaluation_result = await chatbot.evaluate_message_dual_language(
                     message_data["message"], 
                     orders_text, 
                     message_data["parental_role"], 
                     message_data["recipient_role"],
                     sender_language,
-                    recipient_language
+                    recipient_language,
+                    trigger_matcher,
+                    on_rewrite_delta
                 )
                 
                 # Log message with both language versions
-                message_id = log_message_dual_language(
-                    message_data["user_name"], 
-                    message_data["user_email"], 
+                message_id = await run_db(
+                    log_message_dual_language,
+                    sender_name, 
+                    sender_email, 
                     message_data["message"], 
                     evaluation_result['sender_version'],
                     evaluation_result['recipient_version'],
@@ -1831,12 +4073,21 @@ async def websocket_endpoint(websocket: WebSocket):
                     "recipient_role": message_data["recipient_role"],
                     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                     "sender_language": sender_language,
-                    "recipient_language": recipient_language
+                    "recipient_language": recipient_language,
+                    "trigger_words": evaluation_result.get('trigger_words', [])
                 }
                 
                 await manager.send_personal_message(json.dumps(response), websocket)
+                await notify_message_created(
+                    message_data["conversation_id"], message_id, sender_email, sender_name,
+                    message_data["parental_role"], evaluation_result['sender_version'],
+                    evaluation_result['recipient_version'], exclude=websocket
+                )
     
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Also reached on malformed input or a failed evaluation, so no socket stays indexed with its writer running
         manager.disconnect(websocket)
 
 @app.get("/api/health")
@@ -1858,11 +4109,279 @@ async def health_check():
         }
     }
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Runtime metrics used for capacity planning"""
+    return {
+        "db_pool": db_pool.stats(),
+        "db_executor": db_executor.stats(),
+        "cpu_workers": cpu_workers.stats(),
+        "session_cache": session_cache.stats(),
+        "session_activity": session_activity.stats(),
+        "session_revocations": session_revocations.stats(),
+        "llm_gateway": llm_gateway.stats(),
+        "evaluation_cache": evaluation_cache.stats(),
+        "evaluation_engine": evaluation_engine_stats.stats(),
+        "prescreen": message_prescreen.stats(),
+        "trigger_words": trigger_word_scanners.stats(),
+        "websockets": manager.stats(),
+        "ws_broker": event_broker.stats(),
+        "document_indexer": document_indexer.stats(),
+        "export_jobs": export_jobs.stats()
+    }
+
 # Authentication utility functions
 def generate_auth_token():
     """Generate a secure authentication token"""
     return secrets.token_urlsafe(32)
 
+class SessionCache:
+    """TTL/LRU cache of resolved sessions keyed by a hash of the bearer token"""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # token hash -> (user, cached_until)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def token_key(token):
+        """Cache key for a bearer token; safe to share with other workers, unlike the token itself"""
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        """Return a copy of the cached user for ``token``, or None"""
+        key = self.token_key(token)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return dict(entry[0])
+
+    def put(self, token, user, expires_at, ttl_seconds=None):
+        """Cache ``user`` until the TTL elapses or the session expires, whichever is first"""
+        remaining = (expires_at - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return
+        cached_until = time.monotonic() + min(ttl_seconds or self.ttl_seconds, remaining)
+        key = self.token_key(token)
+        with self._lock:
+            self._entries[key] = (dict(user), cached_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate_token(self, token):
+        self.invalidate_key(self.token_key(token))
+
+    def invalidate_key(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        """Drop every cached session belonging to ``user_id``"""
+        with self._lock:
+            stale = [key for key, (user, _) in self._entries.items() if user['id'] == user_id]
+            for key in stale:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0,
+                'evictions': self._evictions
+            }
+
+class SessionActivityRecorder:
+    """Coalesces user_sessions.last_accessed updates and writes them in periodic batches"""
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._pending = {}  # token -> last accessed timestamp
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._flushes = 0
+        self._rows_written = 0
+
+    def touch(self, token):
+        with self._lock:
+            self._pending[token] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="safespace-session-activity", daemon=True)
+                self._thread.start()
+
+    def discard(self, token):
+        with self._lock:
+            self._pending.pop(token, None)
+
+    def flush(self):
+        """Write all pending last_accessed timestamps in one transaction"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            with get_db_connection() as conn:
+                conn.executemany(
+                    "UPDATE user_sessions SET last_accessed = ? WHERE token = ?",
+                    [(accessed, token) for token, accessed in pending.items()]
+                )
+            self._flushes += 1
+            self._rows_written += len(pending)
+        except Exception as e:
+            logger.error(f"Error flushing session activity: {str(e)}")
+            # Keep the timestamps for the next flush unless newer ones arrived meanwhile
+            with self._lock:
+                for token, accessed in pending.items():
+                    self._pending.setdefault(token, accessed)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'flush_interval_seconds': self.flush_interval,
+                'flushes': self._flushes,
+                'rows_written': self._rows_written
+            }
+
+class SessionRevocations:
+    """In-memory generation and deny list consulted before trusting a signed token"""
+
+    def __init__(self):
+        self._generations = {}  # user id -> current session generation
+        self._denied = {}  # session id -> token expiry (unix time)
+        self._lock = threading.Lock()
+
+    def is_revoked(self, claims):
+        with self._lock:
+            if claims['sid'] in self._denied:
+                return True
+            return claims['gen'] < self._generations.get(claims['uid'], 0)
+
+    def note_generation(self, user_id, generation):
+        """Remember the generation read from the database on a cache miss"""
+        with self._lock:
+            if generation > self._generations.get(user_id, 0):
+                self._generations[user_id] = generation
+
+    def revoke_session(self, claims):
+        with self._lock:
+            self._denied[claims['sid']] = claims['exp']
+            # Denied entries are only needed until the token would have expired anyway
+            now = time.time()
+            for session_id in [sid for sid, exp in self._denied.items() if exp <= now]:
+                del self._denied[session_id]
+
+    def stats(self):
+        with self._lock:
+            return {'tracked_users': len(self._generations), 'denied_sessions': len(self._denied)}
+
+session_cache = SessionCache(SESSION_CACHE_SIZE, SESSION_CACHE_TTL)
+session_activity = SessionActivityRecorder(SESSION_ACTIVITY_FLUSH_INTERVAL)
+session_revocations = SessionRevocations()
+
+SIGNED_TOKEN_PREFIX = "ss1."
+
+if SIGNED_TOKENS_ENABLED and not TOKEN_SECRET:
+    # A secret made up by each process would reject tokens issued by other workers or before a restart
+    raise RuntimeError("SAFESPACE_SIGNED_TOKENS requires SAFESPACE_TOKEN_SECRET to be set")
+
+def apply_session_revocation(revocation):
+    """Apply a signout ({token_key}, plus {sid, exp} for signed tokens) or a generation bump ({uid, gen})
+    made by this or another worker"""
+    if 'token_key' in revocation:
+        session_cache.invalidate_key(revocation['token_key'])
+    if 'sid' in revocation:
+        session_revocations.revoke_session(revocation)
+    elif 'uid' in revocation:
+        session_revocations.note_generation(revocation['uid'], revocation['gen'])
+        session_cache.invalidate_user(revocation['uid'])
+
+def revoke_sessions(revocation):
+    """Apply a revocation here, then publish it so every other worker stops trusting its cached sessions too"""
+    apply_session_revocation(revocation)
+    submit_publish(event_broker.publish, {'session_revocation': revocation})
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _token_signature(payload: str) -> str:
+    return _b64encode(hmac.new(TOKEN_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+def is_signed_token(token: str) -> bool:
+    return token.startswith(SIGNED_TOKEN_PREFIX)
+
+def sign_session_token(user_id, session_id, generation, expires_at):
+    """Build a signed token for a session row"""
+    claims = {'uid': user_id, 'sid': session_id, 'gen': generation, 'exp': int(expires_at.timestamp())}
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return f"{SIGNED_TOKEN_PREFIX}{payload}.{_token_signature(payload)}"
+
+def verify_session_token(token: str):
+    """Return the claims of a signed token, or None if it is forged, malformed or expired"""
+    if not TOKEN_SECRET:
+        return None
+    try:
+        payload, signature = token[len(SIGNED_TOKEN_PREFIX):].split('.')
+        if not hmac.compare_digest(signature, _token_signature(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if claims.get('exp', 0) <= time.time():
+        return None
+    return claims
+
+def issue_session_token(cursor, user_id):
+    """Create a user_sessions row and return its token (signed when enabled)"""
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    expires = datetime.now().replace(microsecond=0) + timedelta(days=SESSION_LIFETIME_DAYS)
+    token = generate_auth_token()
+    
+    cursor.execute("""
+        INSERT INTO user_sessions (user_id, token, expires_at, created_date)
+        VALUES (?, ?, ?, ?)
+    """, (user_id, token, expires.strftime("%Y-%m-%d %H:%M:%S"), current_time))
+    
+    if SIGNED_TOKENS_ENABLED:
+        session_id = cursor.lastrowid
+        cursor.execute("SELECT session_generation FROM users WHERE id = ?", (user_id,))
+        generation = cursor.fetchone()[0] or 0
+        token = sign_session_token(user_id, session_id, generation, expires)
+        cursor.execute("UPDATE user_sessions SET token = ? WHERE id = ?", (token, session_id))
+    
+    return token
+
 def get_current_user(authorization: Optional[str] = Header(None)):
     """Get current user from authentication token"""
     if not authorization or not authorization.startswith('Bearer '):
@@ -1870,14 +4389,27 @@ def get_current_user(authorization: Optional[str] = Header(None)):
     
     token = authorization.split(' ')[1]
     
+    # Signed tokens are checked for forgery, expiry and revocation without touching the database
+    claims = None
+    if is_signed_token(token):
+        claims = verify_session_token(token)
+        if not claims or session_revocations.is_revoked(claims):
+            return None
+    
+    cached_user = session_cache.get(token)
+    if cached_user:
+        session_activity.touch(token)
+        return cached_user
+    
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT u.id, u.email, u.password_hash, u.full_name, u.preferred_name, u.role, u.phone_number,
                        u.address, u.postcode, u.emergency_contact, u.emergency_phone, u.subscription_type,
                        u.payment_method, u.card_last_four, u.billing_address, u.is_active, u.email_verified,
-                       u.created_date, u.last_login, u.profile_completed, s.expires_at 
+                       u.created_date, u.last_login, u.profile_completed, s.expires_at,
+                       u.session_generation
                 FROM users u 
                 JOIN user_sessions s ON u.id = s.user_id 
                 WHERE s.token = ? AND s.is_active = TRUE
@@ -1895,13 +4427,13 @@ def get_current_user(authorization: Optional[str] = Header(None)):
                 conn.commit()
                 return None
             
-            # Update last accessed
-            cursor.execute("""
-                UPDATE user_sessions SET last_accessed = ? WHERE token = ?
-            """, (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), token))
-            conn.commit()
+            if claims:
+                generation = result[21] or 0
+                session_revocations.note_generation(result[0], generation)
+                if claims['gen'] != generation:
+                    return None
             
-            return {
+            user = {
                 'id': result[0],
                 'email': result[1],
                 'fullName': result[3],  # full_name
@@ -1917,16 +4449,27 @@ def get_current_user(authorization: Optional[str] = Header(None)):
                 'cardLastFour': result[13],  # card_last_four
                 'profileCompleted': result[19]  # profile_completed
             }
+        
+        # Record last accessed in the next batched write instead of per request.
+        # Signed tokens can stay cached longer because revocation is checked in memory.
+        session_cache.put(token, user, expires_at, SIGNED_TOKEN_CACHE_TTL if claims else None)
+        session_activity.touch(token)
+        return dict(user)
     except Exception as e:
         logger.error(f"Error getting current user: {str(e)}")
         return None
 
+async def get_current_user_async(authorization: Optional[str] = Header(None)):
+    """FastAPI dependency resolving the current user on the database executor"""
+    return await run_db(get_current_user, authorization)
+
 # Authentication endpoints
 @app.post("/api/auth/signup")
-async def signup(user_data: UserSignUp):
+@offload_db
+def signup(user_data: UserSignUp):
     """Create a new user account"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Check if user already exists
@@ -1977,13 +4520,7 @@ async def signup(user_data: UserSignUp):
             """, (user_id, current_time))
             
             # Create authentication token
-            token = generate_auth_token()
-            expires_at = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
-            
-            cursor.execute("""
-                INSERT INTO user_sessions (user_id, token, expires_at, created_date)
-                VALUES (?, ?, ?, ?)
-            """, (user_id, token, expires_at, current_time))
+            token = issue_session_token(cursor, user_id)
             
             conn.commit()
             
@@ -2016,10 +4553,11 @@ async def signup(user_data: UserSignUp):
         raise HTTPException(status_code=500, detail="Failed to create account")
 
 @app.post("/api/auth/signin")
-async def signin(user_data: UserSignIn):
+@offload_db
+def signin(user_data: UserSignIn):
     """Sign in user and return authentication token"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get user by email
@@ -2035,14 +4573,8 @@ async def signin(user_data: UserSignIn):
                 raise HTTPException(status_code=401, detail="Invalid email or password")
             
             # Create authentication token
-            token = generate_auth_token()
+            token = issue_session_token(cursor, user[0])
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            expires_at = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
-            
-            cursor.execute("""
-                INSERT INTO user_sessions (user_id, token, expires_at, created_date)
-                VALUES (?, ?, ?, ?)
-            """, (user[0], token, expires_at, current_time))
             
             # Update last login
             cursor.execute("UPDATE users SET last_login = ? WHERE id = ?", (current_time, user[0]))
@@ -2090,14 +4622,43 @@ async def signin(user_data: UserSignIn):
         logger.error(f"Error signing in user: {str(e)}")
         raise HTTPException(status_code=500, detail="Sign in failed")
 
+@app.post("/api/auth/signout")
+@offload_db
+def signout(authorization: Optional[str] = Header(None)):
+    """Sign out by deactivating the current authentication token"""
+    if not authorization or not authorization.startswith('Bearer '):
+        raise HTTPException(status_code=401, detail="Authentication token required")
+    
+    token = authorization.split(' ')[1]
+    
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE user_sessions SET is_active = FALSE WHERE token = ?", (token,))
+            conn.commit()
+        
+        session_activity.discard(token)
+        # Other workers may hold the session in their cache: drop it everywhere, and deny signed tokens by session id
+        revocation = {'token_key': SessionCache.token_key(token)}
+        claims = verify_session_token(token) if is_signed_token(token) else None
+        if claims:
+            revocation.update(sid=claims['sid'], exp=claims['exp'])
+        revoke_sessions(revocation)
+        return {"success": True, "message": "Signed out successfully"}
+        
+    except Exception as e:
+        logger.error(f"Error signing out user: {str(e)}")
+        raise HTTPException(status_code=500, detail="Sign out failed")
+
 @app.get("/api/user/profile")
-async def get_user_profile(current_user=Depends(get_current_user)):
+@offload_db
+def get_user_profile(current_user=Depends(get_current_user_async)):
     """Get current user profile"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get relationship data
@@ -2139,13 +4700,14 @@ async def get_user_profile(current_user=Depends(get_current_user)):
         raise HTTPException(status_code=500, detail="Failed to get profile")
 
 @app.put("/api/user/profile")
-async def update_user_profile(profile_data: UserProfileUpdate, current_user=Depends(get_current_user)):
+@offload_db
+def update_user_profile(profile_data: UserProfileUpdate, current_user=Depends(get_current_user_async)):
     """Update user profile"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Build update query dynamically
@@ -2173,6 +4735,7 @@ async def update_user_profile(profile_data: UserProfileUpdate, current_user=Depe
                 update_values.append(current_user['id'])
                 cursor.execute(query, update_values)
                 conn.commit()
+                session_cache.invalidate_user(current_user['id'])
             
             return {"success": True, "message": "Profile updated successfully"}
             
@@ -2181,13 +4744,15 @@ async def update_user_profile(profile_data: UserProfileUpdate, current_user=Depe
         raise HTTPException(status_code=500, detail="Failed to update profile")
 
 @app.put("/api/user/change-password")
-async def change_password(password_data: PasswordChange, current_user=Depends(get_current_user)):
+@offload_db
+def change_password(password_data: PasswordChange, authorization: Optional[str] = Header(None),
+                    current_user=Depends(get_current_user_async)):
     """Change user password"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get current password hash
@@ -2199,12 +4764,32 @@ async def change_password(password_data: PasswordChange, current_user=Depends(ge
             
             # Update password
             new_password_hash = hash_password(password_data.newPassword)
-            cursor.execute("UPDATE users SET password_hash = ? WHERE id = ?", 
-                          (new_password_hash, current_user['id']))
+            cursor.execute("""
+                UPDATE users SET password_hash = ?, session_generation = COALESCE(session_generation, 0) + 1 
+                WHERE id = ?
+            """, (new_password_hash, current_user['id']))
+            
+            # Sign out every other session; the one making this request stays valid
+            current_token = authorization.split(' ')[1]
+            cursor.execute("""
+                UPDATE user_sessions SET is_active = FALSE 
+                WHERE user_id = ? AND token != ?
+            """, (current_user['id'], current_token))
+            
+            response = {"success": True, "message": "Password changed successfully"}
+            
+            # A signed token embeds the old generation, so replace it with a fresh one
+            if is_signed_token(current_token):
+                cursor.execute("UPDATE user_sessions SET is_active = FALSE WHERE token = ?", (current_token,))
+                response['token'] = issue_session_token(cursor, current_user['id'])
+            
+            cursor.execute("SELECT session_generation FROM users WHERE id = ?", (current_user['id'],))
+            generation = cursor.fetchone()[0]
             conn.commit()
+            revoke_sessions({'uid': current_user['id'], 'gen': generation})
             
             logger.info(f"Password changed for user: {current_user['email']}")
-            return {"success": True, "message": "Password changed successfully"}
+            return response
             
     except HTTPException:
         raise
@@ -2213,13 +4798,14 @@ async def change_password(password_data: PasswordChange, current_user=Depends(ge
         raise HTTPException(status_code=500, detail="Failed to change password")
 
 @app.put("/api/user/children")
-async def update_children(children_data: ChildrenUpdate, current_user=Depends(get_current_user)):
+@offload_db
+def update_children(children_data: ChildrenUpdate, current_user=Depends(get_current_user_async)):
     """Update user's children information"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Delete existing children
@@ -2241,13 +4827,14 @@ async def update_children(children_data: ChildrenUpdate, current_user=Depends(ge
         raise HTTPException(status_code=500, detail="Failed to update children information")
 
 @app.put("/api/user/notifications")
-async def update_notifications(notification_data: NotificationPreferences, current_user=Depends(get_current_user)):
+@offload_db
+def update_notifications(notification_data: NotificationPreferences, current_user=Depends(get_current_user_async)):
     """Update user notification preferences"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
@@ -2271,66 +4858,76 @@ async def update_notifications(notification_data: NotificationPreferences, curre
         logger.error(f"Error updating notifications: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to update notification preferences")
 
+def get_evaluation_context(current_user, user_email):
+    """Return the sender language, recipient language and orders text for an evaluation"""
+    sender_language = 'en'  # Default to English
+    recipient_language = 'en'  # Default to English
+    
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Get sender's language preference
+        if current_user:
+            cursor.execute("SELECT language_code FROM user_settings WHERE user_id = ?", (current_user.get('id'),))
+            lang_result = cursor.fetchone()
+            if lang_result:
+                sender_language = lang_result[0]
+        
+        # Get recipient's language preference (find other parent)
+        # In production, you'd have a proper conversation participants table
+        cursor.execute("""
+            SELECT DISTINCT u.id, us.language_code 
+            FROM users u 
+            JOIN user_settings us ON u.id = us.user_id 
+            WHERE u.email != ? 
+            LIMIT 1
+        """, (user_email,))
+        other_user = cursor.fetchone()
+        if other_user and other_user[1]:
+            recipient_language = other_user[1]
+        
+        # Get orders for AI evaluation
+        orders_text = fetch_current_orders(cursor)
+    
+    return sender_language, recipient_language, orders_text
+
 @app.post("/api/evaluate_message")
 async def evaluate_message(message_eval: MessageEvaluation, authorization: Optional[str] = Header(None)):
     try:
         chatbot = ChatbotModule()
         
-        # Get sender and recipient language preferences
-        sender_language = 'en'  # Default to English
-        recipient_language = 'en'  # Default to English
-        
-        # Get sender's language preference
-        current_user = get_current_user(authorization)
-        if current_user:
-            user_id = current_user.get('id')
-            with sqlite3.connect(DB_PATH) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT language_code FROM user_settings WHERE user_id = ?", (user_id,))
-                lang_result = cursor.fetchone()
-                if lang_result:
-                    sender_language = lang_result[0]
+        current_user = await get_current_user_async(authorization)
+        if not message_eval.conversation_id:
+            raise HTTPException(status_code=400, detail='Conversation ID is required')
         
-        # Get recipient's language preference (find other parent)
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            # Find the other parent in this conversation - simplified approach
-            # In production, you'd have a proper conversation participants table
-            cursor.execute("""
-                SELECT DISTINCT u.id, us.language_code 
-                FROM users u 
-                JOIN user_settings us ON u.id = us.user_id 
-                WHERE u.email != ? 
-                LIMIT 1
-            """, (message_eval.user_email,))
-            other_user = cursor.fetchone()
-            if other_user and other_user[1]:
-                recipient_language = other_user[1]
+        # The sender is the session's user, never whoever the payload names
+        rejection = await run_db(message_sender_rejection, current_user, message_eval.conversation_id)
+        if rejection:
+            raise HTTPException(status_code=rejection[0], detail=rejection[1])
+        sender_email = current_user['email']
+        sender_name = current_user['fullName'] or sender_email
 
-        # Get orders for AI evaluation
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT description FROM orders")
-            orders = cursor.fetchone()
-            orders_text = orders[0] if orders else ""
+        sender_language, recipient_language, orders_text = await run_db(
+            get_evaluation_context, current_user, sender_email
+        )
+        trigger_matcher = await trigger_word_scanners.matcher(message_eval.conversation_id)
 
         # Use dual-language evaluation
-        evaluation_result = chatbot.evaluate_message_dual_language(
+        evaluation_result = await chatbot.evaluate_message_dual_language(
             message_eval.message, 
             orders_text, 
             message_eval.parental_role, 
             message_eval.recipient_role,
             sender_language,
-            recipient_language
+            recipient_language,
+            trigger_matcher
         )
-        
-        if not message_eval.conversation_id:
-            raise HTTPException(status_code=400, detail='Conversation ID is required')
 
         # Log message with both language versions
-        message_id = log_message_dual_language(
-            message_eval.user_name, 
-            message_eval.user_email, 
+        message_id = await run_db(
+            log_message_dual_language,
+            sender_name, 
+            sender_email, 
             message_eval.message, 
             evaluation_result['sender_version'],
             evaluation_result['recipient_version'],
@@ -2340,6 +4937,10 @@ async def evaluate_message(message_eval: MessageEvaluation, authorization: Optio
             sender_language,
             recipient_language
         )
+        await notify_message_created(
+            message_eval.conversation_id, message_id, sender_email, sender_name,
+            message_eval.parental_role, evaluation_result['sender_version'], evaluation_result['recipient_version']
+        )
 
         return {
             'evaluation': 'no' if evaluation_result['needs_rewrite'] else 'yes',
@@ -2348,14 +4949,18 @@ async def evaluate_message(message_eval: MessageEvaluation, authorization: Optio
             'parental_role': message_eval.parental_role,
             'recipient_role': message_eval.recipient_role,
             'sender_language': sender_language,
-            'recipient_language': recipient_language
+            'recipient_language': recipient_language,
+            'trigger_words': evaluation_result.get('trigger_words', [])
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error evaluating message: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while evaluating message')
 
 @app.post("/api/upload_orders")
-async def upload_orders(file: UploadFile = File(...)):
+@offload_db
+def upload_orders(file: UploadFile = File(...)):
     try:
         if not file.filename:
             raise HTTPException(status_code=400, detail='No selected file')
@@ -2364,10 +4969,10 @@ async def upload_orders(file: UploadFile = File(...)):
         
         # Save uploaded file
         with open(file_path, "wb") as buffer:
-            content = await file.read()
+            content = file.file.read()
             buffer.write(content)
 
-        text_content = extract_text_from_file(file_path)
+        text_content = cpu_workers.call(extract_text_from_file, file_path)
         if text_content:
             process_text_content(text_content)
             file_path.unlink()  # Remove file after processing
@@ -2416,9 +5021,156 @@ def extract_text_from_txt(file_path: Path):
         logger.error(f"Error extracting text from TXT: {str(e)}")
         return None
 
+# Document text indexing for Info Library and Unalterable Records search
+def split_sections(lines, size=DOCUMENT_SECTION_CHARS):
+    """Group lines into sections of roughly ``size`` characters, standing in for pages"""
+    sections, current, length = [], [], 0
+    for line in lines:
+        if current and length + len(line) > size:
+            sections.append('\n'.join(current))
+            current, length = [], 0
+        current.append(line)
+        length += len(line) + 1
+    if current:
+        sections.append('\n'.join(current))
+    return sections
+
+def extract_document_pages(file_path: Path):
+    """Text of each page of a document: real pages for PDFs, form-feed or fixed-size sections otherwise.
+
+    Returns None for file types without extractable text; extraction errors are raised to the caller.
+    """
+    extension = file_path.suffix.lower()
+    if extension == '.pdf':
+        return [page.extract_text() or '' for page in PdfReader(file_path).pages]
+    elif extension == '.docx':
+        return split_sections([para.text for para in docx.Document(file_path).paragraphs])
+    elif extension == '.txt':
+        raw_data = file_path.read_bytes()
+        text = raw_data.decode(chardet.detect(raw_data)['encoding'] or 'utf-8', errors='replace')
+        return text.split('\f') if '\f' in text else split_sections(text.splitlines())
+    else:
+        return None
+
+def resolve_document_path(source, file_path, file_name):
+    """Stored path of an uploaded file, falling back to its directory when the tree has moved"""
+    path = Path(file_path) if file_path else None
+    if path is None or not path.exists():
+        path = DOCUMENT_SOURCES[source] / (file_name or '')
+    return path
+
+def queue_document_index(cursor, source, entry_id):
+    """Mark an entry for extraction in the caller's transaction; submit it to document_indexer after commit"""
+    cursor.execute("""
+        INSERT INTO document_index (source, entry_id, status) VALUES (?, ?, 'pending')
+        ON CONFLICT (source, entry_id) DO UPDATE SET status = 'pending', error = NULL
+    """, (source, entry_id))
+
+class DocumentIndexer:
+    """Extracts uploaded documents into document_pages on one background thread, off the request path.
+
+    The text itself is read on a CPU worker, so large PDFs do not hold the server's GIL. document_index
+    records each entry's status (pending, indexed, unsupported or failed), so work queued when the server
+    stopped is picked up again by ``resume``.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="safespace-documents")
+        self._lock = threading.Lock()
+        self._queued = set()
+        self._indexed = 0
+        self._failed = 0
+        self._pages = 0
+        self._seconds = 0.0
+
+    def submit(self, source, entry_id):
+        with self._lock:
+            if (source, entry_id) in self._queued:
+                return
+            self._queued.add((source, entry_id))
+        self._executor.submit(self._run, source, entry_id)
+
+    def _run(self, source, entry_id):
+        with self._lock:
+            self._queued.discard((source, entry_id))
+        try:
+            self.index(source, entry_id)
+        except Exception as e:
+            logger.error(f"Error indexing {source} entry {entry_id}: {str(e)}")
+
+    def index(self, source, entry_id):
+        """Extract one entry's file and replace its pages; returns the resulting status"""
+        started = time.monotonic()
+        with get_db_connection() as conn:
+            row = conn.execute(f"SELECT file_path, file_name FROM {source} WHERE id = ?", (entry_id,)).fetchone()
+        if row is None:
+            return None
+
+        pages, error = [], None
+        try:
+            extracted = cpu_workers.call(extract_document_pages, resolve_document_path(source, *row))
+            status = 'unsupported' if extracted is None else 'indexed'
+            pages = [(number, text) for number, text in enumerate(extracted or [], 1) if text.strip()]
+        except Exception as e:
+            status, error = 'failed', str(e)
+
+        with get_db_connection() as conn:
+            # The entry may have been deleted while its file was being read
+            if conn.execute(f"SELECT 1 FROM {source} WHERE id = ?", (entry_id,)).fetchone() is None:
+                return None
+            conn.execute("DELETE FROM document_pages WHERE source = ? AND entry_id = ?", (source, entry_id))
+            conn.executemany("INSERT INTO document_pages (source, entry_id, page, text) VALUES (?, ?, ?, ?)",
+                             [(source, entry_id, number, text) for number, text in pages])
+            conn.execute("""
+                INSERT INTO document_index (source, entry_id, status, pages, indexed_at, error)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (source, entry_id) DO UPDATE SET status = excluded.status, pages = excluded.pages,
+                    indexed_at = excluded.indexed_at, error = excluded.error
+            """, (source, entry_id, status, len(pages), datetime.now().strftime("%Y-%m-%d %H:%M:%S"), error))
+
+        with self._lock:
+            if status == 'failed':
+                self._failed += 1
+            else:
+                self._indexed += 1
+            self._pages += len(pages)
+            self._seconds += time.monotonic() - started
+        return status
+
+    def resume(self):
+        """Queue every entry still marked pending"""
+        with get_db_connection() as conn:
+            pending = conn.execute("SELECT source, entry_id FROM document_index WHERE status = 'pending'").fetchall()
+        for source, entry_id in pending:
+            self.submit(source, entry_id)
+        return len(pending)
+
+    def shutdown(self):
+        # Entries still queued stay pending in document_index and are resumed on the next start
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            processed = self._indexed + self._failed
+            return {
+                'queued': len(self._queued),
+                'indexed': self._indexed,
+                'failed': self._failed,
+                'pages': self._pages,
+                'avg_index_ms': round(self._seconds * 1000 / processed, 2) if processed else 0.0
+            }
+
+document_indexer = DocumentIndexer()
+
+@app.on_event("startup")
+async def resume_document_indexing():
+    queued = await run_db(document_indexer.resume)
+    if queued:
+        logger.info(f"Queued {queued} documents for text extraction")
+
 def process_text_content(text_content):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("INSERT INTO orders (description, date) VALUES (?, ?)",
                            (text_content, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
@@ -2429,9 +5181,10 @@ def process_text_content(text_content):
 
 # Calendar endpoints (keeping existing functionality)
 @app.get("/api/calendar")
-async def get_calendar():
+@offload_db
+def get_calendar():
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM calendar")
             calendar_data = cursor.fetchall()
@@ -2441,9 +5194,10 @@ async def get_calendar():
         raise HTTPException(status_code=500, detail='An error occurred while retrieving calendar data')
 
 @app.post("/api/calendar")
-async def create_calendar_event(event: CalendarEvent):
+@offload_db
+def create_calendar_event(event: CalendarEvent):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO calendar (event_label, event_time, repeat_occurrence, created_by, created_date, relationship_id) 
@@ -2458,9 +5212,10 @@ async def create_calendar_event(event: CalendarEvent):
         raise HTTPException(status_code=500, detail='An error occurred while creating calendar event')
 
 @app.put("/api/calendar/{event_id}")
-async def update_calendar_event(event_id: int, event: CalendarEvent):
+@offload_db
+def update_calendar_event(event_id: int, event: CalendarEvent):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             # Check if event exists and user has permission to edit
             cursor.execute("SELECT created_by FROM calendar WHERE id = ?", (event_id,))
@@ -2482,9 +5237,10 @@ async def update_calendar_event(event_id: int, event: CalendarEvent):
         raise HTTPException(status_code=500, detail='An error occurred while updating calendar event')
 
 @app.delete("/api/calendar/{event_id}")
-async def delete_calendar_event(event_id: int, created_by: str):
+@offload_db
+def delete_calendar_event(event_id: int, created_by: str):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             # Check if event exists and user has permission to delete
             cursor.execute("SELECT created_by FROM calendar WHERE id = ?", (event_id,))
@@ -2506,47 +5262,51 @@ async def delete_calendar_event(event_id: int, created_by: str):
         raise HTTPException(status_code=500, detail='An error occurred while deleting calendar event')
 
 # Enhanced Financial/Payments endpoints
+PAYMENT_COLUMNS = """id, type, category, amount, description, payment_method, merchant, 
+                       payment_date, notes, receipt_filename, receipt_human_readable, 
+                       payment_type, date, created_by"""
+
+def payment_to_dict(row):
+    return {
+        'id': row[0],
+        'type': row[1],
+        'category': row[2],
+        'amount': row[3],
+        'description': row[4],
+        'payment_method': row[5],
+        'merchant': row[6],
+        'payment_date': row[7],
+        'notes': row[8],
+        'receipt_filename': row[9],
+        'receipt_summary': row[10],
+        'payment_type': row[11],
+        'date': row[12],
+        'created_by': row[13]
+    }
+
 @app.get("/api/payments")
-async def get_payments():
+@offload_db
+def get_payments():
     """Get all payment entries with OCR data"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, type, category, amount, description, payment_method, merchant, 
-                       payment_date, notes, receipt_filename, receipt_human_readable, 
-                       payment_type, date, created_by 
+            cursor.execute(f"""
+                SELECT {PAYMENT_COLUMNS}
                 FROM financial 
                 ORDER BY date DESC
             """)
-            payments = []
-            for row in cursor.fetchall():
-                payments.append({
-                    'id': row[0],
-                    'type': row[1],
-                    'category': row[2],
-                    'amount': row[3],
-                    'description': row[4],
-                    'payment_method': row[5],
-                    'merchant': row[6],
-                    'payment_date': row[7],
-                    'notes': row[8],
-                    'receipt_filename': row[9],
-                    'receipt_summary': row[10],
-                    'payment_type': row[11],
-                    'date': row[12],
-                    'created_by': row[13]
-                })
-            return payments
+            return [payment_to_dict(row) for row in cursor.fetchall()]
     except Exception as e:
         logger.error(f"Error retrieving payments: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while retrieving payments')
 
 @app.post("/api/payments")
-async def create_payment_entry(entry: PaymentEntry):
+@offload_db
+def create_payment_entry(entry: PaymentEntry):
     """Create a new payment entry without receipt"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO financial (type, category, amount, description, payment_method, 
@@ -2600,7 +5360,7 @@ async def upload_receipt(
         
         if file_extension == '.pdf':
             # For PDF files, extract text using existing method
-            text_content = extract_text_from_pdf(file_path)
+            text_content = await cpu_workers.run(extract_text_from_pdf, file_path)
             ocr_result = {
                 "ocr_data": json.dumps({"raw_text": text_content, "file_type": "pdf"}),
                 "human_readable": f"PDF Document processed\n\nExtracted text: {text_content[:500]}..." if text_content and len(text_content) > 500 else f"Extracted text: {text_content}" if text_content else "No text found in PDF",
@@ -2608,7 +5368,7 @@ async def upload_receipt(
             }
         else:
             # For images, use OCR processing
-            ocr_result = ocr_processor.process_receipt_image(file_path, file_content)
+            ocr_result = await ocr_processor.process_receipt_image(file_path, file_content)
 
         # Parse OCR data to extract useful information
         try:
@@ -2632,22 +5392,25 @@ async def upload_receipt(
             payment_date = ''
 
         # Create payment entry in database
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO financial (type, category, amount, description, payment_method, 
-                                     merchant, payment_date, notes, receipt_filename, 
-                                     receipt_ocr_data, receipt_human_readable, payment_type, 
-                                     date, created_by) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                'expense', category, float(amount) if amount else 0.0, description,
-                payment_method, merchant, payment_date, notes, filename,
-                ocr_result["ocr_data"], ocr_result["human_readable"], 'expense',
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"), created_by
-            ))
-            payment_id = cursor.lastrowid
-            conn.commit()
+        def save_payment():
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO financial (type, category, amount, description, payment_method, 
+                                         merchant, payment_date, notes, receipt_filename, 
+                                         receipt_ocr_data, receipt_human_readable, payment_type, 
+                                         date, created_by) 
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    'expense', category, float(amount) if amount else 0.0, description,
+                    payment_method, merchant, payment_date, notes, filename,
+                    ocr_result["ocr_data"], ocr_result["human_readable"], 'expense',
+                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"), created_by
+                ))
+                conn.commit()
+                return cursor.lastrowid
+        
+        payment_id = await run_db(save_payment)
 
         return {
             'success': True, 
@@ -2688,10 +5451,11 @@ async def get_payment_categories():
     }
 
 @app.post("/api/payments/{payment_id}/suggest")
-async def create_payment_suggestion(payment_id: int, suggestion: PaymentSuggestion):
+@offload_db
+def create_payment_suggestion(payment_id: int, suggestion: PaymentSuggestion):
     """Create a payment suggestion for another parent"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Check if payment exists
@@ -2716,10 +5480,11 @@ async def create_payment_suggestion(payment_id: int, suggestion: PaymentSuggesti
         raise HTTPException(status_code=500, detail='An error occurred while creating payment suggestion')
 
 @app.get("/api/payments/suggestions")
-async def get_payment_suggestions():
+@offload_db
+def get_payment_suggestions():
     """Get all payment suggestions"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT ps.*, f.description, f.amount as original_amount, f.category 
@@ -2775,19 +5540,22 @@ async def respond_to_suggestion(
             file_extension = Path(file.filename).suffix.lower()
             if file_extension in {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff'}:
                 ocr_processor = OCRProcessor()
-                ocr_result = ocr_processor.process_receipt_image(file_path, file_content)
+                ocr_result = await ocr_processor.process_receipt_image(file_path, file_content)
                 proof_ocr_data = ocr_result["ocr_data"]
             
             proof_filename = filename
 
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE payment_suggestions 
-                SET status = ?, proof_filename = ?, proof_ocr_data = ?, response_date = ?
-                WHERE id = ?
-            """, (status, proof_filename, proof_ocr_data, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), suggestion_id))
-            conn.commit()
+        def save_response():
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE payment_suggestions 
+                    SET status = ?, proof_filename = ?, proof_ocr_data = ?, response_date = ?
+                    WHERE id = ?
+                """, (status, proof_filename, proof_ocr_data, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), suggestion_id))
+                conn.commit()
+        
+        await run_db(save_response)
             
         return {'success': True}
     except Exception as e:
@@ -2813,9 +5581,10 @@ async def create_financial_entry(entry: FinancialEntry):
     return await create_payment_entry(payment_entry)
 
 @app.get("/api/financial/{financial_id}/messages")
-async def get_financial_messages(financial_id: int):
+@offload_db
+def get_financial_messages(financial_id: int):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM messages WHERE conversation_id = ?", (financial_id,))
             messages = cursor.fetchall()
@@ -2826,9 +5595,10 @@ async def get_financial_messages(financial_id: int):
 
 # Info log endpoints (keeping existing functionality)
 @app.get("/api/info_log")
-async def get_info_log():
+@offload_db
+def get_info_log():
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM info_log")
             info_log_data = cursor.fetchall()
@@ -2838,9 +5608,10 @@ async def get_info_log():
         raise HTTPException(status_code=500, detail='An error occurred while retrieving info log data')
 
 @app.post("/api/info_log")
-async def create_info_log_entry(entry: InfoLogEntry):
+@offload_db
+def create_info_log_entry(entry: InfoLogEntry):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("INSERT INTO info_log (child_name, type, description, date, created_by) VALUES (?, ?, ?, ?, ?)",
                            (entry.child_name, entry.type, entry.description, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), entry.created_by))
@@ -2852,9 +5623,10 @@ async def create_info_log_entry(entry: InfoLogEntry):
 
 # Conversation endpoints (keeping existing functionality)
 @app.get("/api/conversation")
-async def get_conversations():
+@offload_db
+def get_conversations():
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM conversations")
             conversation_data = cursor.fetchall()
@@ -2864,9 +5636,10 @@ async def get_conversations():
         raise HTTPException(status_code=500, detail='An error occurred while retrieving conversation data')
 
 @app.post("/api/conversation")
-async def create_conversation(entry: ConversationEntry):
+@offload_db
+def create_conversation(entry: ConversationEntry):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("INSERT INTO conversations (title, date) VALUES (?, ?)",
                            (entry.title, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
@@ -2878,46 +5651,65 @@ async def create_conversation(entry: ConversationEntry):
         logger.error(f"Error creating conversation: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while creating conversation')
 
+# Timeline rows are tuples; the web client reads them by position
+MESSAGE_TIMELINE_SELECT = """
+    SELECT m.id, m.user_name, m.user_email, m.original_message, 
+           COALESCE(mt.rewritten_text, m.rewritten_message) as display_message,
+           m.conversation_id, m.timestamp, m.parental_role, m.recipient_role,
+           m.is_read, m.read_at, m.read_by, m.message_hash, m.has_attachments,
+           m.attachment_count
+    FROM messages m
+    LEFT JOIN message_translations mt ON m.id = mt.message_id AND mt.language_code = :language"""
+
 @app.get("/api/conversation/{conversation_id}/messages")
-async def get_conversation_messages(conversation_id: int, authorization: Optional[str] = Header(None)):
+@offload_db
+def get_conversation_messages(conversation_id: int, before_id: Optional[int] = None, after_id: Optional[int] = None,
+                              limit: int = MESSAGE_PAGE_SIZE, authorization: Optional[str] = Header(None)):
+    """Return one page of a conversation in timestamp order.
+
+    Without a cursor the newest ``limit`` messages are returned; ``before_id`` pages back through older
+    messages and ``after_id`` forward through newer ones. A page shorter than ``limit`` is the last one.
+    """
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail='Use either before_id or after_id, not both')
+    limit = max(1, min(limit, MESSAGE_PAGE_SIZE_MAX))
+    
     try:
         logger.info(f"Retrieving messages for conversation ID: {conversation_id}")
         
         # Get current user's language preference
         current_user = get_current_user(authorization)
         user_language = 'en'  # Default to English
-        user_id = None
         
-        if current_user:
-            user_id = current_user.get('id')
-            # Get user's language preference
-            with sqlite3.connect(DB_PATH) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT language_code FROM user_settings WHERE user_id = ?", (user_id,))
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            
+            if current_user:
+                cursor.execute("SELECT language_code FROM user_settings WHERE user_id = ?", (current_user.get('id'),))
                 lang_result = cursor.fetchone()
                 if lang_result:
                     user_language = lang_result[0]
-        
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
+            
+            # Keyset pagination over (conversation_id, timestamp, id): cost depends on the page size, not the history
+            cursor_clause = ""
+            if before_id is not None:
+                cursor_clause = "AND (m.timestamp, m.id) < (SELECT timestamp, id FROM messages WHERE id = :before_id)"
+            elif after_id is not None:
+                cursor_clause = "AND (m.timestamp, m.id) > (SELECT timestamp, id FROM messages WHERE id = :after_id)"
+            order = "ASC" if after_id is not None else "DESC"
             
             # Get messages with translations in the user's preferred language
-            cursor.execute("""
-                SELECT m.id, m.user_name, m.user_email, m.original_message, 
-                       COALESCE(mt.rewritten_text, m.rewritten_message) as display_message,
-                       m.conversation_id, m.timestamp, m.parental_role, m.recipient_role,
-                       m.is_read, m.read_at, m.read_by, m.message_hash, m.has_attachments,
-                       (SELECT COUNT(*) FROM message_attachments ma WHERE ma.message_id = m.id) as attachment_count
-                FROM messages m
-                LEFT JOIN message_translations mt ON m.id = mt.message_id AND mt.language_code = ?
-                WHERE m.conversation_id = ?
-                ORDER BY m.timestamp ASC
-            """, (user_language, conversation_id))
+            cursor.execute(f"""
+                {MESSAGE_TIMELINE_SELECT}
+                WHERE m.conversation_id = :conversation_id {cursor_clause}
+                ORDER BY m.timestamp {order}, m.id {order}
+                LIMIT :limit
+            """, {'language': user_language, 'conversation_id': conversation_id,
+                  'before_id': before_id, 'after_id': after_id, 'limit': limit})
             messages = cursor.fetchall()
-
-        if not messages:
-            logger.info(f"No messages found for conversation ID: {conversation_id}")
-            return []
+        
+        if order == "DESC":
+            messages.reverse()
 
         logger.info(f"Retrieved {len(messages)} messages in language: {user_language}")
         return messages
@@ -2926,59 +5718,67 @@ async def get_conversation_messages(conversation_id: int, authorization: Optiona
         logger.error(f"Error retrieving conversation messages: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while retrieving conversation messages')
 
-def get_current_user(authorization):
-    """Extract user info from authorization header"""
-    if not authorization:
-        return None
+# Enhanced messaging endpoints
+def update_read_receipts(cursor, message_ids, is_read, read_by):
+    """Set read receipts on messages and return one message_read event per affected conversation"""
+    read_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    placeholders = ','.join('?' * len(message_ids))
+    cursor.execute(f"""
+        UPDATE messages 
+        SET is_read = ?, read_at = ?, read_by = ?
+        WHERE id IN ({placeholders})
+    """, (is_read, read_at, read_by, *message_ids))
+    cursor.execute(f"SELECT id, conversation_id FROM messages WHERE id IN ({placeholders})", message_ids)
     
-    try:
-        # Extract token from Bearer header
-        token = authorization.replace('Bearer ', '')
-        
-        # Validate token and get user data
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            # Find user by valid token
-            cursor.execute("""
-                SELECT u.id, u.email, u.full_name 
-                FROM users u
-                JOIN user_sessions us ON u.id = us.user_id
-                WHERE us.token = ? AND us.is_active = TRUE 
-                AND datetime(us.expires_at) > datetime('now')
-            """, (token,))
-            user_data = cursor.fetchone()
-            if user_data:
-                return {
-                    'id': user_data[0],
-                    'email': user_data[1],
-                    'name': user_data[2]
-                }
-        return None
-    except Exception as e:
-        logger.error(f"Error getting current user: {str(e)}")
-        return None
+    by_conversation = defaultdict(list)
+    for message_id, conversation_id in cursor.fetchall():
+        by_conversation[conversation_id].append(message_id)
+    return [
+        (MessageReadEvent(conversation_id=conversation_id, message_ids=ids, is_read=is_read, read_by=read_by, read_at=read_at),
+         [user_id for user_id, _ in fetch_conversation_participants(cursor, conversation_id)])
+        for conversation_id, ids in by_conversation.items()
+    ]
 
-# Enhanced messaging endpoints
 @app.put("/api/message/{message_id}/read")
-async def mark_message_read(message_id: int, update: MessageUpdate):
+@offload_db
+def mark_message_read(message_id: int, update: MessageUpdate):
     """Mark a message as read with mandatory read receipts"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE messages 
-                SET is_read = ?, read_at = ?, read_by = ?
-                WHERE id = ?
-            """, (update.is_read, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), update.read_by, message_id))
+            events = update_read_receipts(cursor, [message_id], update.is_read, update.read_by)
             conn.commit()
-            
+        
+        for event, user_ids in events:
+            emit_event(event, conversation_id=event.conversation_id, user_ids=user_ids)
         return {'success': True}
     except Exception as e:
         logger.error(f"Error marking message as read: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while updating message')
 
+@app.put("/api/messages/read")
+@offload_db
+def mark_messages_read(update: MessagesReadUpdate):
+    """Mark several messages as read in one request"""
+    if not update.message_ids:
+        return {'success': True, 'updated': 0}
+    
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            events = update_read_receipts(cursor, update.message_ids, True, update.read_by)
+            conn.commit()
+        
+        for event, user_ids in events:
+            emit_event(event, conversation_id=event.conversation_id, user_ids=user_ids)
+        return {'success': True, 'updated': sum(len(event.message_ids) for event, _ in events)}
+    except Exception as e:
+        logger.error(f"Error marking messages as read: {str(e)}")
+        raise HTTPException(status_code=500, detail='An error occurred while updating messages')
+
 @app.post("/api/message/{message_id}/attachments")
-async def upload_message_attachment(
+@offload_db
+def upload_message_attachment(
     message_id: int,
     file: UploadFile = File(...),
     uploaded_by: str = Form(...)
@@ -2986,7 +5786,7 @@ async def upload_message_attachment(
     """Upload attachment to a message"""
     try:
         # Check if message exists
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id FROM messages WHERE id = ?", (message_id,))
             if not cursor.fetchone():
@@ -3003,7 +5803,7 @@ async def upload_message_attachment(
         file_path = msg_attachments_dir / stored_filename
         
         # Save file
-        content = await file.read()
+        content = file.file.read()
         with open(file_path, 'wb') as f:
             f.write(content)
         
@@ -3011,7 +5811,7 @@ async def upload_message_attachment(
         file_hash = hashlib.sha256(content).hexdigest()
         
         # Save to database
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO message_attachments 
@@ -3046,10 +5846,11 @@ async def upload_message_attachment(
         raise HTTPException(status_code=500, detail='An error occurred while uploading attachment')
 
 @app.get("/api/message/{message_id}/attachments")
-async def get_message_attachments(message_id: int):
+@offload_db
+def get_message_attachments(message_id: int):
     """Get all attachments for a message"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT * FROM message_attachments WHERE message_id = ?
@@ -3063,10 +5864,11 @@ async def get_message_attachments(message_id: int):
         raise HTTPException(status_code=500, detail='An error occurred while retrieving attachments')
 
 @app.get("/api/message/attachment/{attachment_id}/download")
-async def download_message_attachment(attachment_id: int):
+@offload_db
+def download_message_attachment(attachment_id: int):
     """Download a message attachment"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT original_filename, stored_filename, file_path, file_type 
@@ -3092,54 +5894,234 @@ async def download_message_attachment(attachment_id: int):
         logger.error(f"Error downloading attachment: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while downloading attachment')
 
+# Per-language text analysis for the translation search index
+CJK_RUN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff66-\uff9f]+")
+# Light stemming: the longest matching suffix is replaced once, keeping a stem of at least three characters
+SEARCH_STEM_SUFFIXES = {
+    'es': (('amente', ''), ('mente', ''), ('ces', 'z'), ('os', ''), ('as', ''), ('es', ''),
+           ('o', ''), ('a', ''), ('e', ''), ('s', '')),
+    'fr': (('ements', ''), ('ement', ''), ('ments', ''), ('ment', ''), ('euses', ''), ('eaux', 'eau'),
+           ('euse', ''), ('aux', 'al'), ('eux', ''), ('ees', ''), ('es', ''), ('ee', ''), ('e', ''),
+           ('s', ''), ('x', '')),
+    'pt': (('amente', ''), ('mente', ''), ('oes', ''), ('aes', ''), ('ais', 'al'), ('eis', 'el'),
+           ('ns', 'm'), ('ao', ''), ('os', ''), ('as', ''), ('es', ''), ('o', ''), ('a', ''), ('e', ''), ('s', '')),
+}
+
+def fold_word(word):
+    """Case-fold a word and strip its diacritics, as the unicode61 tokenizer does"""
+    folded = unicodedata.normalize('NFKD', word.casefold())
+    return ''.join(ch for ch in folded if not unicodedata.combining(ch))
+
+def stem_word(word, language):
+    for suffix, replacement in SEARCH_STEM_SUFFIXES.get(language, ()):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + replacement
+    return word
+
+def search_terms(text, language=None):
+    """Split text into index terms for ``language``, returning (term, start, end) for each.
+
+    Chinese and Japanese are written without spaces, so their runs become overlapping two-character
+    terms; Spanish, French and Portuguese words are stemmed so plurals and gendered forms match.
+    """
+    terms = []
+    for match in re.finditer(r"[^\W_]+", text or ''):
+        word, offset, position = match.group(), match.start(), 0
+        for run in [*CJK_RUN.finditer(word), None]:
+            end = run.start() if run else len(word)
+            if end > position:
+                terms.append((stem_word(fold_word(word[position:end]), language), offset + position, offset + end))
+            if run is None:
+                break
+            chars = run.group()
+            for i in range(max(1, len(chars) - 1)):
+                start = offset + run.start() + i
+                terms.append((unicodedata.normalize('NFKC', chars[i:i + 2]), start, start + len(chars[i:i + 2])))
+            position = run.end()
+    return terms
+
+def search_index_text(text, language):
+    """The analyzed terms stored in message_translations_fts for ``text`` in ``language``"""
+    return ' '.join(term for term, _, _ in search_terms(text, language))
+
+def search_tokens(text):
+    """Split text the way the unicode61 tokenizer does: case-folded, diacritics removed, word characters only.
+
+    Returns (token, start, end) so matches can be highlighted in the original text.
+    """
+    return [(fold_word(match.group()), match.start(), match.end()) for match in re.finditer(r"[^\W_]+", text)]
+
+def fts_query_terms(words):
+    """FTS5 expression for search words, the last one matching as a prefix.
+
+    Earlier words match exactly: a prefix term has to merge the doclists of every token it covers, which is
+    only worth paying for the word still being typed.
+    """
+    return ' '.join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+
+def search_snippet(text, words, width=16, language=None):
+    """HTML-escaped excerpt of ``text`` around its first match, matches wrapped in <mark>, or None without a match.
+
+    With a ``language`` the text is split by that language's analyzer, as in message_translations_fts.
+    """
+    tokens = search_terms(text, language) if language else search_tokens(text or '')
+    exact, prefix = set(words[:-1]), words[-1]
+    hits = [i for i, (token, _, _) in enumerate(tokens) if token in exact or token.startswith(prefix)]
+    if not hits:
+        return None
+    first = max(0, min(hits[0] - 3, len(tokens) - width))
+    last = min(first + width, len(tokens)) - 1
+    # Merge the spans of matched terms; CJK bigrams overlap their neighbours
+    spans = []
+    for index in hits:
+        if first <= index <= last:
+            _, start, end = tokens[index]
+            if spans and start <= spans[-1][1]:
+                spans[-1][1] = max(spans[-1][1], end)
+            else:
+                spans.append([start, end])
+    parts = ['…'] if first > 0 else []
+    position = tokens[first][1] if first > 0 else 0
+    for start, end in spans:
+        parts.append(html.escape(text[position:start]))
+        parts.append(f'<mark>{html.escape(text[start:end])}</mark>')
+        position = end
+    if last < len(tokens) - 1:
+        parts.append(html.escape(text[position:tokens[last][2]]))
+        parts.append('…')
+    else:
+        parts.append(html.escape(text[position:]))
+    return ''.join(parts)
+
 @app.post("/api/conversation/search")
-async def search_messages(search: MessageSearch):
-    """Search messages across conversations"""
+@offload_db
+def search_messages(search: MessageSearch, response: Response, authorization: Optional[str] = Header(None)):
+    """Search messages and their translations in one language, by default the caller's, best matches first.
+
+    Across all conversations only the newest SEARCH_CANDIDATES matches of each index are ranked; when that
+    cap cut a search short the response carries an X-Search-Candidate-Limit header.
+    """
+    words = [token for token, _, _ in search_tokens(search.query)]
+    if not words:
+        return []
+    if search.language and search.language not in LANGUAGE_NAMES:
+        raise HTTPException(status_code=400, detail='Unsupported language')
+    
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
-            # Build search query
-            base_query = """
-                SELECT m.*, c.title as conversation_title
-                FROM messages m
-                JOIN conversations c ON m.conversation_id = c.id
-                WHERE (m.rewritten_message LIKE ? OR m.user_name LIKE ?)
-            """
-            params = [f"%{search.query}%", f"%{search.query}%"]
-            
-            # Add filters
-            if search.conversation_id:
-                base_query += " AND m.conversation_id = ?"
-                params.append(search.conversation_id)
+            language = search.language
+            if not language:
+                language = 'en'
+                current_user = get_current_user(authorization)
+                if current_user:
+                    cursor.execute("SELECT language_code FROM user_settings WHERE user_id = ?", (current_user.get('id'),))
+                    lang_result = cursor.fetchone()
+                    if lang_result and lang_result[0] in LANGUAGE_NAMES:
+                        language = lang_result[0]
+            terms = [term for term, _, _ in search_terms(search.query, language)]
+            
+            # The stored text and sender are matched as typed; translations in the search language through
+            # that language's analyzer. The conversation and sender filters are part of each MATCH expression,
+            # so they narrow the index scan itself; every word of the sender matches as a prefix
+            scope = f" AND conversation : c{int(search.conversation_id)}" if search.conversation_id else ""
+            senders = [token for token, _, _ in search_tokens(search.sender or '')]
+            sender_match = "user_name : (" + ' '.join(f'"{token}"*' for token in senders) + ")" if senders else ""
+            sources = (
+                ("messages_fts", "JOIN messages m ON m.id = f.rowid",
+                 f"{{body user_name}} : ({fts_query_terms(words)}){scope}" + (f" AND {sender_match}" if senders else ""),
+                 "bm25(messages_fts, 10.0, 2.0, 0.0)"),
+                ("message_translations_fts",
+                 "JOIN message_translations t ON t.id = f.rowid JOIN messages m ON m.id = t.message_id",
+                 f"language : l{language} AND terms : ({fts_query_terms(terms)}){scope}",
+                 "bm25(message_translations_fts, 10.0, 0.0, 0.0)"),
+            )
             
+            filters = ""
+            filter_params = []
             if search.date_from:
-                base_query += " AND m.timestamp >= ?"
-                params.append(search.date_from)
-            
+                filters += " AND m.timestamp >= ?"
+                filter_params.append(search.date_from)
             if search.date_to:
-                base_query += " AND m.timestamp <= ?"
-                params.append(search.date_to)
-            
-            if search.sender:
-                base_query += " AND m.user_name LIKE ?"
-                params.append(f"%{search.sender}%")
-            
-            base_query += " ORDER BY m.timestamp DESC LIMIT 100"
-            
-            cursor.execute(base_query, params)
-            results = cursor.fetchall()
+                filters += " AND m.timestamp <= ?"
+                filter_params.append(search.date_to)
+            
+            best = {}
+            capped = False
+            for table, joins, match, score in sources:
+                matches = f"FROM {table} f {joins} WHERE {table} MATCH ? {filters}"
+                params = [match, *filter_params]
+                # Translations carry no sender, so theirs is matched against the sender column of messages_fts
+                if senders and table == "message_translations_fts":
+                    matches += " AND m.id IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)"
+                    params.append(sender_match)
+                # Across all conversations rank only the newest SEARCH_CANDIDATES matches of each index, so a
+                # very common word costs a bounded amount; a single conversation is small enough to rank in full
+                floor = None
+                if not search.conversation_id:
+                    cursor.execute(f"SELECT f.rowid {matches} ORDER BY f.rowid DESC LIMIT 1 OFFSET ?",
+                                   (*params, SEARCH_CANDIDATES - 1))
+                    floor = cursor.fetchone()
+                    capped = capped or floor is not None
+                cursor.execute(f"""
+                    SELECT m.id, {score} AS score {matches} AND f.rowid >= ?
+                    ORDER BY score LIMIT ?
+                """, (*params, floor[0] if floor else 0, SEARCH_RESULT_LIMIT))
+                for message_id, value in cursor.fetchall():
+                    best[message_id] = min(value, best.get(message_id, value))
+            ranked = sorted(best.items(), key=lambda item: item[1])[:SEARCH_RESULT_LIMIT]
+            if capped:
+                # Older matches were not ranked; the client can narrow the search to reach them
+                response.headers['X-Search-Candidate-Limit'] = str(SEARCH_CANDIDATES)
+            if not ranked:
+                return []
+            
+            # Snippets are built here for the returned page only; FTS5 would re-run the MATCH for every row
+            ids = [message_id for message_id, _ in ranked]
+            cursor.execute(f"""
+                SELECT m.id, m.conversation_id, c.title, m.user_name, m.timestamp, m.rewritten_message, mt.rewritten_text
+                FROM messages m
+                JOIN conversations c ON m.conversation_id = c.id
+                LEFT JOIN message_translations mt ON mt.message_id = m.id AND mt.language_code = ?
+                WHERE m.id IN ({','.join('?' * len(ids))})
+            """, (language, *ids))
+            rows = {row[0]: row for row in cursor.fetchall()}
+            
+            results = []
+            for message_id, score in ranked:
+                row = rows.get(message_id)
+                if not row:
+                    continue
+                # Show the search language's version, excerpting whichever text the match came from
+                message = row[6] if row[6] is not None else row[5]
+                snippet = ((row[6] is not None and search_snippet(row[6], terms, language=language))
+                           or search_snippet(row[5], words) or html.escape(message or ''))
+                results.append({
+                    'id': row[0],
+                    'conversation_id': row[1],
+                    'conversation_title': row[2],
+                    'user_name': row[3],
+                    'timestamp': row[4],
+                    'message': message,
+                    'language': language,
+                    'snippet': snippet,
+                    'score': round(-score, 4)
+                })
             
         return results
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching messages: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while searching messages')
 
 @app.post("/api/conversation/report")
-async def report_conversation(report: MessageReport):
+@offload_db
+def report_conversation(report: MessageReport):
     """Report a conversation or specific message"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO conversation_reports 
@@ -3179,71 +6161,210 @@ async def report_conversation(report: MessageReport):
         raise HTTPException(status_code=500, detail='An error occurred while creating report')
 
 @app.post("/api/conversation/export")
-async def export_conversation(export: ConversationExport):
+@offload_db
+def export_conversation(export: ConversationExport):
     """Export conversation to PDF with Safe space header and hash verification"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
+            cache_key, filename, _ = prepare_conversation_export(cursor, export)
             
-            # Get conversation details
-            cursor.execute("SELECT * FROM conversations WHERE id = ?", (export.conversation_id,))
-            conversation = cursor.fetchone()
-            if not conversation:
-                raise HTTPException(status_code=404, detail="Conversation not found")
-            
-            # Build message query with date filters
-            message_query = "SELECT * FROM messages WHERE conversation_id = ?"
-            params = [export.conversation_id]
-            
-            if export.date_from:
-                message_query += " AND timestamp >= ?"
-                params.append(export.date_from)
-            
-            if export.date_to:
-                message_query += " AND timestamp <= ?"
-                params.append(export.date_to)
-            
-            message_query += " ORDER BY timestamp ASC"
-            
-            cursor.execute(message_query, params)
-            messages = cursor.fetchall()
-            
-            if not messages:
-                raise HTTPException(status_code=404, detail="No messages found for export")
-        
-        # Generate PDF with Safe space header
-        pdf_content = generate_conversation_pdf(conversation, messages, export)
+            # A copy rendered earlier for the same messages is served as it is
+            cached = export_jobs.cached(cache_key)
+            if cached is None:
+                conversation, message_ids, conversation_hash = read_conversation_export(cursor, export)
         
-        # Create filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"conversation_{export.conversation_id}_{timestamp}.pdf"
+        if cached is not None:
+            return FileResponse(cached, media_type="application/pdf", filename=filename)
         
         return StreamingResponse(
-            io.BytesIO(pdf_content),
+            export_jobs.cache_stream(cache_key, stream_conversation_pdf(conversation, message_ids, conversation_hash, export)),
             media_type="application/pdf",
             headers={"Content-Disposition": f"attachment; filename=\"{filename}\""}
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error exporting conversation: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while exporting conversation')
 
-def generate_conversation_pdf(conversation, messages, export_params):
-    """Generate PDF with Safe space header for court use"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    content = []
+def select_export_messages(cursor, export, columns):
+    """Run the export's message query, with its date filters, for ``columns`` in timeline order"""
+    message_query = f"SELECT {columns} FROM messages WHERE conversation_id = ?"
+    params = [export.conversation_id]
     
-    # Title
-    title_style = styles['Title']
-    title_style.textColor = colors.darkblue
-    content.append(Paragraph("SAFESPACE SECURE MESSAGING", title_style))
-    content.append(Paragraph("CONVERSATION EXPORT CERTIFICATE", title_style))
-    content.append(Spacer(1, 0.3*inch))
+    if export.date_from:
+        message_query += " AND timestamp >= ?"
+        params.append(export.date_from)
+    
+    if export.date_to:
+        message_query += " AND timestamp <= ?"
+        params.append(export.date_to)
+    
+    message_query += " ORDER BY timestamp ASC, id ASC"
+    return cursor.execute(message_query, params)
+
+def prepare_conversation_export(cursor, export):
+    """Check a conversation export has something to render; returns (cache key, file name, render args)"""
+    cursor.execute("SELECT id FROM conversations WHERE id = ?", (export.conversation_id,))
+    if not cursor.fetchone():
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    # Messages are never edited, so the newest id and the count identify the exported set
+    message_count, last_message_id = select_export_messages(cursor, export, "COUNT(*), MAX(id)").fetchone()
+    if not message_count:
+        raise HTTPException(status_code=404, detail="No messages found for export")
+    
+    cache_key = export_cache_key('conversation', export.conversation_id, export.date_from, export.date_to,
+                                 last_message_id, message_count)
+    filename = f"conversation_{export.conversation_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    return cache_key, filename, export.model_dump()
+
+def read_conversation_export(cursor, export):
+    """Return (conversation row, message ids, conversation hash) for an export"""
+    cursor.execute("SELECT * FROM conversations WHERE id = ?", (export.conversation_id,))
+    conversation = cursor.fetchone()
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
     
-    # Safe space Verification Statement
-    verification_text = """
+    # The certificate on the first page needs the count and hash of every message, so they are read
+    # once here without keeping the rows; the pages are rendered from the same ids while streaming
+    select_export_messages(cursor, export, "id, rewritten_message, timestamp")
+    message_ids, conversation_hash = hash_conversation_messages(conversation, cursor)
+    if not message_ids:
+        raise HTTPException(status_code=404, detail="No messages found for export")
+    return conversation, message_ids, conversation_hash
+
+def write_conversation_export(args, output):
+    """Export renderer: the conversation PDF, streamed into ``output``"""
+    export = ConversationExport(**args)
+    with get_db_connection() as conn:
+        conversation, message_ids, conversation_hash = read_conversation_export(conn.cursor(), export)
+    for chunk in stream_conversation_pdf(conversation, message_ids, conversation_hash, export):
+        output.write(chunk)
+
+def hash_conversation_messages(conversation, rows):
+    """Return (message ids, SHA-256) for (id, content, timestamp) rows read one at a time.
+
+    Hashes the same bytes as json.dumps({'conversation_id', 'title', 'messages': [...]}, sort_keys=True)
+    over the whole conversation, so exports stay verifiable against earlier ones.
+    """
+    digest = hashlib.sha256(f'{{"conversation_id": {json.dumps(conversation[0])}, "messages": ['.encode())
+    message_ids = array('q')
+    for msg_id, content, timestamp in rows:
+        entry = json.dumps({'id': msg_id, 'content': content, 'timestamp': timestamp}, sort_keys=True)
+        digest.update(f"{', ' if message_ids else ''}{entry}".encode())
+        message_ids.append(msg_id)
+    digest.update(f'], "title": {json.dumps(conversation[1])}}}'.encode())
+    return message_ids, digest.hexdigest()
+
+class PDFPageStitcher:
+    """Writes one PDF front to back from the pages of many small PDFs.
+
+    Each segment's pages and the objects they use are copied out as soon as the segment is added, so
+    only the output's object offsets and page ids stay in memory however many segments there are.
+    """
+
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, title=""):
+        self.title = title
+        self._offsets = array('Q', [0, 0])  # byte offset of each object, by id - 1
+        self._page_ids = array('L')
+        self._position = 0
+        self._buffer = io.BytesIO()
+
+    def _emit(self, data: bytes):
+        self._buffer.write(data)
+        self._position += len(data)
+
+    def _take(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer = io.BytesIO()
+        return data
+
+    def _allocate(self):
+        self._offsets.append(0)
+        return len(self._offsets)
+
+    def _write_object(self, object_id, obj):
+        self._offsets[object_id - 1] = self._position
+        self._emit(f"{object_id} 0 obj\n".encode())
+        stream = io.BytesIO()
+        obj.write_to_stream(stream, None)
+        self._emit(stream.getvalue())
+        self._emit(b"\nendobj\n")
+
+    def _copy(self, obj, ids):
+        """Copy of a segment object with its references renumbered, writing each referenced object once"""
+        if isinstance(obj, IndirectObject):
+            if obj.idnum not in ids:
+                ids[obj.idnum] = object_id = self._allocate()
+                self._write_object(object_id, self._copy(obj.get_object(), ids))
+            return IndirectObject(ids[obj.idnum], 0, None)
+        if isinstance(obj, StreamObject):
+            copy = obj.__class__()
+            copy._data = obj._data
+            copy.update({key: self._copy(value, ids) for key, value in obj.items() if key != "/Length"})
+            return copy
+        if isinstance(obj, DictionaryObject):
+            return DictionaryObject({key: self._copy(value, ids) for key, value in obj.items()})
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._copy(value, ids) for value in obj)
+        return obj
+
+    def start(self) -> bytes:
+        self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        return self._take()
+
+    def add_segment(self, source) -> bytes:
+        """Append every page of the PDF in ``source`` and return the bytes written for them"""
+        ids = {}
+        for page in PdfReader(source).pages:
+            page_id = self._allocate()
+            content = {key: value for key, value in page.items() if key != "/Parent"}
+            # Attributes a page may inherit from its page tree are copied onto the page itself
+            node = page
+            while "/Parent" in node:
+                node = node["/Parent"].get_object()
+                for key in ("/Resources", "/MediaBox", "/CropBox", "/Rotate"):
+                    if key in node and key not in content:
+                        content[key] = node.raw_get(key)
+            copy = self._copy(DictionaryObject(content), ids)
+            copy[NameObject("/Parent")] = IndirectObject(self.PAGES_ID, 0, None)
+            self._write_object(page_id, copy)
+            self._page_ids.append(page_id)
+        return self._take()
+
+    def finish(self) -> bytes:
+        """Write the page tree, catalog and cross-reference table"""
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        for object_id, body in ((self.PAGES_ID, f"<< /Type /Pages /Count {len(self._page_ids)} /Kids [{kids}] >>"),
+                                (self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>")):
+            self._offsets[object_id - 1] = self._position
+            self._emit(f"{object_id} 0 obj\n{body}\nendobj\n".encode())
+        info_id = self._allocate()
+        self._offsets[info_id - 1] = self._position
+        title = self.title.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        self._emit(f"{info_id} 0 obj\n<< /Producer (Safespace) /Title ({title}) >>\nendobj\n".encode("latin-1", "replace"))
+
+        xref_position = self._position
+        self._emit(f"xref\n0 {len(self._offsets) + 1}\n0000000000 65535 f \n".encode())
+        for offset in self._offsets:
+            self._emit(f"{offset:010d} 00000 n \n".encode())
+        self._emit(f"trailer\n<< /Size {len(self._offsets) + 1} /Root {self.CATALOG_ID} 0 R /Info {info_id} 0 R >>\n"
+                   f"startxref\n{xref_position}\n%%EOF\n".encode())
+        return self._take()
+
+def conversation_export_header(conversation, message_count, conversation_hash, export_params):
+    """Certificate pages opening a conversation export"""
+    # The PDF is cached and served again for the same messages, so its dates are those of this render
+    generated = datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
+    
+    # Title and Safe space Verification Statement
+    content = certificate_header(["SAFESPACE SECURE MESSAGING", "CONVERSATION EXPORT CERTIFICATE"], """
     <b>CERTIFICATION OF MESSAGE INTEGRITY</b><br/>
     <br/>
     This document contains an export of secure family communications from the Safespace platform,
@@ -3253,71 +6374,29 @@ def generate_conversation_pdf(conversation, messages, export_params):
     <br/>
     The integrity and authenticity of these communications are verified through cryptographic
     hash validation as detailed below.
-    """
-    content.append(Paragraph(verification_text, styles['Normal']))
-    content.append(Spacer(1, 0.2*inch))
+    """)
     
     # Conversation Information Table
-    conv_info_data = [
-        ['Conversation Information', ''],
+    content.extend(certificate_table('Conversation Information', [
         ['Conversation ID:', str(conversation[0])],
         ['Title:', conversation[1]],
         ['Created Date:', conversation[2]],
-        ['Total Messages:', str(len(messages))],
-        ['Export Date:', datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")],
+        ['Total Messages:', str(message_count)],
+        ['Export Generated:', generated],
         ['Export Range:', f"{export_params.date_from or 'All'} to {export_params.date_to or 'All'}"],
-    ]
-    
-    conv_info_table = Table(conv_info_data, colWidths=[2*inch, 4*inch])
-    conv_info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (1, 0), colors.lightblue),
-        ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    content.append(conv_info_table)
-    content.append(Spacer(1, 0.2*inch))
-    
-    # Generate hash for entire conversation
-    conversation_data = json.dumps({
-        'conversation_id': conversation[0],
-        'title': conversation[1],
-        'messages': [{'id': msg[0], 'content': msg[4], 'timestamp': msg[6]} for msg in messages]
-    }, sort_keys=True)
-    conversation_hash = hashlib.sha256(conversation_data.encode()).hexdigest()
+    ], 'information'))
     
     # Cryptographic Verification Table
-    crypto_data = [
-        ['Cryptographic Verification', ''],
+    content.extend(certificate_table('Cryptographic Verification', [
         ['Hash Algorithm:', 'SHA-256'],
         ['Conversation Hash:', conversation_hash],
-        ['Message Count Verified:', str(len(messages))],
-        ['Hash Generation Date:', datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")],
+        ['Message Count Verified:', str(message_count)],
+        ['Hash Generation Date:', generated],
         ['Verification Status:', 'VERIFIED ✓'],
-    ]
-    
-    crypto_table = Table(crypto_data, colWidths=[2*inch, 4*inch])
-    crypto_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (1, 0), colors.darkgreen),
-        ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    content.append(crypto_table)
-    content.append(Spacer(1, 0.3*inch))
+    ], 'verification', space_after=0.3*inch))
     
     # Legal Statement
-    legal_text = """
+    content.append(legal_footer("""
     <b>LEGAL CERTIFICATION:</b><br/>
     <br/>
     This conversation export was generated from the Safespace secure messaging system where all
@@ -3331,75 +6410,122 @@ def generate_conversation_pdf(conversation, messages, export_params):
     <br/>
     <b>For court verification:</b> The conversation hash and individual message details can be
     independently verified by accessing the Safespace system records or by contacting Safespace
-    technical support with the Conversation ID provided above.
-    """
-    content.append(Paragraph(legal_text, styles['Normal']))
+    technical support with the Conversation ID provided above.<br/>
+    <br/>
+    The export and hash dates above record when this document was generated. A later download of the
+    same messages returns this document unchanged.
+    """))
     content.append(Spacer(1, 0.3*inch))
     
     # Messages Section
-    content.append(Paragraph("<b>CONVERSATION MESSAGES</b>", styles['Heading2']))
+    content.append(Paragraph("<b>CONVERSATION MESSAGES</b>", PDF_STYLES['Heading2']))
     content.append(Spacer(1, 0.2*inch))
+    return content
+
+def message_export_flowables(number, message):
+    """Header, details table and content of one exported message"""
+    msg_id, user_name, original_msg, rewritten_msg, timestamp, parental_role, recipient_role = message
+    content = []
     
-    for i, message in enumerate(messages, 1):
-        msg_id, user_name, user_email, original_msg, rewritten_msg, conv_id, timestamp, parental_role, recipient_role = message[:9]
-        
-        # Message header
-        msg_header = f"<b>Message #{i}</b> - {timestamp}"
-        content.append(Paragraph(msg_header, styles['Heading3']))
-        
-        # Message details table
-        msg_data = [
-            ['From:', f"{user_name} ({parental_role})"],
-            ['To:', recipient_role],
-            ['Timestamp:', timestamp],
-            ['Message ID:', str(msg_id)],
-        ]
-        
-        msg_table = Table(msg_data, colWidths=[1*inch, 5*inch])
-        msg_table.setStyle(TableStyle([
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.lightyellow),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        content.append(msg_table)
-        content.append(Spacer(1, 0.1*inch))
-        
-        # Message content
-        content.append(Paragraph("<b>Message Content:</b>", styles['Normal']))
-        content.append(Paragraph(rewritten_msg, styles['Normal']))
-        
-        # AI Processing indicator
-        if original_msg != rewritten_msg:
-            content.append(Paragraph(
-                "<i>Note: This message was AI-enhanced for safety and respectful communication.</i>", 
-                styles['Normal']
-            ))
-        
-        content.append(Spacer(1, 0.2*inch))
+    # Message header
+    msg_header = f"<b>Message #{number}</b> - {timestamp}"
+    content.append(Paragraph(msg_header, PDF_STYLES['Heading3']))
     
-    # Footer
-    footer_text = f"""
-    <br/>
-    This export was generated automatically by the Safespace system on {datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")}.
-    Document hash: {conversation_hash}
-    """
-    content.append(Paragraph(footer_text, styles['Normal']))
+    # Message details table
+    msg_data = [
+        ['From:', f"{user_name} ({parental_role})"],
+        ['To:', recipient_role],
+        ['Timestamp:', timestamp],
+        ['Message ID:', str(msg_id)],
+    ]
     
-    # Build PDF
-    doc.build(content)
-    buffer.seek(0)
+    content.append(Table(msg_data, colWidths=[1*inch, 5*inch], style=PDF_TABLE_STYLES['message']))
+    content.append(Spacer(1, 0.1*inch))
+    
+    # Message content, escaped so text such as "<" cannot break the paragraph markup
+    content.append(Paragraph("<b>Message Content:</b>", PDF_STYLES['Normal']))
+    content.append(Paragraph(html.escape(rewritten_msg or ''), PDF_STYLES['Normal']))
+    
+    # AI Processing indicator
+    if original_msg != rewritten_msg:
+        content.append(Paragraph(
+            "<i>Note: This message was AI-enhanced for safety and respectful communication.</i>", 
+            PDF_STYLES['Normal']
+        ))
+    
+    content.append(Spacer(1, 0.2*inch))
+    return content
+
+def iter_export_messages(message_ids):
+    """Yield export rows in ``message_ids`` order, reading one segment at a time"""
+    for start in range(0, len(message_ids), EXPORT_SEGMENT_MESSAGES):
+        segment_ids = message_ids[start:start + EXPORT_SEGMENT_MESSAGES]
+        with get_db_connection() as conn:
+            rows = conn.execute(f"""
+                SELECT id, user_name, original_message, rewritten_message, timestamp, parental_role, recipient_role
+                FROM messages WHERE id IN ({','.join('?' * len(segment_ids))})
+            """, segment_ids.tolist()).fetchall()
+        by_id = {row[0]: row for row in rows}
+        yield [by_id[msg_id] for msg_id in segment_ids if msg_id in by_id]
+
+def render_conversation_segment(messages, first_number, header=None, footer=None):
+    """CPU worker task: lay out one segment of a conversation export as a standalone PDF; None if it is empty"""
+    story = conversation_export_header(*header) if header else []
+    for number, message in enumerate(messages, first_number):
+        story.extend(message_export_flowables(number, message))
+    if footer:
+        story.append(legal_footer(footer))
+    if not story:
+        return None
+    buffer = io.BytesIO()
+    pdf_document(buffer).build(story)
     return buffer.getvalue()
 
+def stream_conversation_pdf(conversation, message_ids, conversation_hash, export_params):
+    """Generate PDF with Safe space header for court use, yielding bytes as each segment of pages is rendered.
+
+    Every EXPORT_SEGMENT_MESSAGES messages are laid out as a separate ReportLab document on a CPU worker,
+    and their pages are appended to the output, so memory stays flat however long the conversation is.
+    The next segment is read and rendering while the current one is sent. Each segment starts on a new page.
+    """
+    stitcher = PDFPageStitcher(title=f"Conversation {conversation[0]} export")
+    header = (conversation, len(message_ids), conversation_hash, export_params)
+    footer = (f"<br/>This export was generated automatically by the Safespace system on "
+              f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}. Document hash: {conversation_hash}")
+    segments = math.ceil(len(message_ids) / EXPORT_SEGMENT_MESSAGES)
+    number = 1
+    rendering = None
+    try:
+        yield stitcher.start()
+        for index, segment in enumerate(iter_export_messages(message_ids), 1):
+            future = cpu_workers.submit(render_conversation_segment, segment, number,
+                                        header if index == 1 else None, footer if index == segments else None)
+            number += len(segment)
+            rendered, rendering = rendering, future
+            if rendered is not None and rendered.result():
+                yield stitcher.add_segment(io.BytesIO(rendered.result()))
+        if rendering is not None and rendering.result():
+            yield stitcher.add_segment(io.BytesIO(rendering.result()))
+        yield stitcher.finish()
+    except Exception as e:
+        # Headers are already sent; the client sees a truncated download
+        logger.error(f"Error streaming conversation export: {str(e)}")
+        raise
+    finally:
+        if rendering is not None:
+            rendering.cancel()
+
 @app.post("/api/notifications/send")
-async def send_notification(notification_data: dict):
+@offload_db
+def send_notification(notification_data: dict):
     """Send notification for new message"""
     try:
         # For now, just log the notification (in production, integrate with email/push service)
         logger.info(f"Notification would be sent: {notification_data}")
         
         # Store notification in database
-        with sqlite3.connect(DB_PATH) as conn:
+        created_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO message_notifications 
@@ -3410,20 +6536,27 @@ async def send_notification(notification_data: dict):
                 notification_data.get('message_id'),
                 notification_data.get('conversation_id'),
                 notification_data.get('type', 'new_message'),
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                created_date
             ))
             conn.commit()
         
+        emit_event(NotificationEvent(
+            notification_type=notification_data.get('type', 'new_message'),
+            message_id=notification_data.get('message_id'),
+            conversation_id=notification_data.get('conversation_id'),
+            created_date=created_date
+        ), user_ids=[notification_data.get('user_id', 0)])
         return {'success': True, 'message': 'Notification queued'}
     except Exception as e:
         logger.error(f"Error sending notification: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while sending notification')
 
 @app.get("/api/user/{user_id}/notifications")
-async def get_user_notifications(user_id: int):
+@offload_db
+def get_user_notifications(user_id: int):
     """Get notifications for a user"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT n.*, c.title as conversation_title
@@ -3460,36 +6593,17 @@ async def get_supported_languages():
     }
 
 @app.put("/api/user/{user_id}/language")
-async def update_user_language(user_id: int, language_data: dict):
+@offload_db
+def update_user_language(user_id: int, language_data: dict):
     """Update user's preferred language"""
     try:
         language_code = language_data.get('language_code', 'en')
         
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
-            # Check if user_settings table exists, create if not
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_settings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    language_code TEXT DEFAULT 'en',
-                    ai_language_instruction TEXT,
-                    created_date TEXT NOT NULL,
-                    updated_date TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                    UNIQUE(user_id)
-                )
-            """)
-            
             # Create AI instruction for the selected language
-            language_names = {
-                'en': 'English', 'zh': 'Mandarin Chinese', 'hi': 'Hindi', 'es': 'Spanish',
-                'fr': 'French', 'ar': 'Arabic', 'bn': 'Bengali', 'pt': 'Portuguese', 
-                'ru': 'Russian', 'ja': 'Japanese'
-            }
-            
-            language_name = language_names.get(language_code, 'English')
+            language_name = LANGUAGE_NAMES.get(language_code, 'English')
             ai_instruction = f"Always respond and rewrite messages in {language_name} language. Ensure all text output is in {language_name}."
             
             # Upsert user language setting
@@ -3513,9 +6627,10 @@ async def update_user_language(user_id: int, language_data: dict):
         raise HTTPException(status_code=500, detail='An error occurred while updating language preference')
 
 @app.get("/api/profile")
-async def get_profiles():
+@offload_db
+def get_profiles():
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM profiles")
             profile_data = cursor.fetchall()
@@ -3525,58 +6640,115 @@ async def get_profiles():
         raise HTTPException(status_code=500, detail='An error occurred while retrieving profile data')
 
 @app.post("/api/profile")
-async def create_profile(entry: ProfileEntry):
+@offload_db
+def create_profile(entry: ProfileEntry):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO profiles (trigger_words, pronouns, preferred_name_a, preferred_name_b, alternate_contact, 
-                children_names, emergency_contact, postcode, usual_address, dob, parental_role, created_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                children_names, emergency_contact, postcode, usual_address, dob, parental_role, created_date,
+                relationship_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (entry.trigger_words, entry.pronouns, entry.preferred_name_a, entry.preferred_name_b, entry.alternate_contact, 
                   entry.children_names, entry.emergency_contact, entry.postcode, entry.usual_address, entry.dob, 
-                  entry.parental_role, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+                  entry.parental_role, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), entry.relationship_id))
             conn.commit()
+        # Every worker holds its own matchers, so the change is published for the others to drop theirs
+        trigger_word_scanners.invalidate(entry.relationship_id)
+        submit_publish(event_broker.publish, {'trigger_words_changed': {'relationship_id': entry.relationship_id}})
         return {'success': True}
     except Exception as e:
         logger.error(f"Error creating profile: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while creating profile')
 
+def search_document_entries(cursor, source, columns, to_dict, query, category):
+    """Entries of ``source`` whose title/description or extracted text match ``query``.
+
+    Title and description matches come first, newest first, followed by content matches ranked by BM25.
+    Every entry carries the pages its text matched on, each with a highlighted snippet.
+    """
+    category_filter = " AND e.category = :category" if category and category != "all" else ""
+    params = {'source': source, 'category': category, 'like': f"%{query}%", 'limit': SEARCH_CANDIDATES}
+    cursor.execute(f"""
+        SELECT {columns} FROM {source} e
+        WHERE (:like = '%%' OR e.title LIKE :like OR e.description LIKE :like){category_filter}
+        ORDER BY e.upload_date DESC
+    """, params)
+    entries = {row[0]: dict(to_dict(row), matches=[], score=None) for row in cursor.fetchall()}
+    words = [token for token, _, _ in search_tokens(query)]
+    if not words:
+        return list(entries.values())
+
+    params['match'] = fts_query_terms(words)
+    cursor.execute(f"""
+        SELECT p.entry_id, p.page, p.text, bm25(document_pages_fts) AS score
+        FROM document_pages_fts f
+        JOIN document_pages p ON p.id = f.rowid
+        JOIN {source} e ON e.id = p.entry_id
+        WHERE document_pages_fts MATCH :match AND p.source = :source{category_filter}
+        ORDER BY score LIMIT :limit
+    """, params)
+    pages = cursor.fetchall()
+    missing = list(dict.fromkeys(entry_id for entry_id, _, _, _ in pages if entry_id not in entries))
+    content_only = {}
+    if missing:
+        cursor.execute(f"SELECT {columns} FROM {source} e WHERE e.id IN ({','.join('?' * len(missing))})", missing)
+        rows = {row[0]: row for row in cursor.fetchall()}
+        content_only = {entry_id: dict(to_dict(rows[entry_id]), matches=[], score=None)
+                        for entry_id in missing if entry_id in rows}
+
+    # Pages arrive best first, so an entry's first page sets its score
+    for entry_id, page, text, score in pages:
+        entry = entries.get(entry_id) or content_only.get(entry_id)
+        if entry is None:
+            continue
+        if entry['score'] is None:
+            entry['score'] = round(-score, 4)
+        if len(entry['matches']) < DOCUMENT_MATCHES_PER_ENTRY:
+            entry['matches'].append({'page': page, 'snippet': search_snippet(text, words, width=24) or html.escape(text[:200])})
+    return list(entries.values()) + list(content_only.values())
+
 # Info Library endpoints
+INFO_LIBRARY_COLUMNS = """id, title, description, category, file_name, file_type, file_size, 
+                       is_file, uploaded_by, upload_date, downloads_log"""
+
+def info_library_entry_to_dict(row):
+    return {
+        'id': row[0],
+        'title': row[1],
+        'description': row[2],
+        'category': row[3],
+        'file_name': row[4],
+        'file_type': row[5],
+        'file_size': row[6],
+        'is_file': bool(row[7]),
+        'uploaded_by': row[8],
+        'upload_date': row[9],
+        'downloads_log': row[10] or ''
+    }
+
 @app.get("/api/info-library")
-async def get_info_library():
+@offload_db
+def get_info_library():
     """Get all info library entries"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, title, description, category, file_name, file_type, file_size, 
-                       is_file, uploaded_by, upload_date, downloads_log
+            cursor.execute(f"""
+                SELECT {INFO_LIBRARY_COLUMNS}
                 FROM info_library 
                 ORDER BY upload_date DESC
             """)
-            entries = []
-            for row in cursor.fetchall():
-                entries.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'description': row[2],
-                    'category': row[3],
-                    'file_name': row[4],
-                    'file_type': row[5],
-                    'file_size': row[6],
-                    'is_file': bool(row[7]),
-                    'uploaded_by': row[8],
-                    'upload_date': row[9],
-                    'downloads_log': row[10] or ''
-                })
+            entries = [info_library_entry_to_dict(row) for row in cursor.fetchall()]
         return entries
     except Exception as e:
         logger.error(f"Error retrieving info library entries: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while retrieving info library entries')
 
 @app.post("/api/info-library/upload")
-async def upload_info_library_file(
+@offload_db
+def upload_info_library_file(
     file: UploadFile = File(...),
     title: str = Form(...),
     description: str = Form(""),
@@ -3596,7 +6768,7 @@ async def upload_info_library_file(
             raise HTTPException(status_code=400, detail='File type not supported. Please upload PDF, DOC, DOCX, TXT, or image files.')
 
         # Read file content and check size (10MB limit)
-        file_content = await file.read()
+        file_content = file.file.read()
         file_size = len(file_content)
         
         if file_size > 10 * 1024 * 1024:  # 10MB limit
@@ -3612,7 +6784,7 @@ async def upload_info_library_file(
             buffer.write(file_content)
 
         # Store entry in database
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO info_library (title, description, category, file_name, file_path, 
@@ -3622,7 +6794,9 @@ async def upload_info_library_file(
                   file_extension.lstrip('.'), file_size, True, created_by, 
                   datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
             entry_id = cursor.lastrowid
+            queue_document_index(cursor, 'info_library', entry_id)
             conn.commit()
+        document_indexer.submit('info_library', entry_id)
 
         return {
             'success': True, 
@@ -3639,10 +6813,11 @@ async def upload_info_library_file(
         raise HTTPException(status_code=500, detail=f'An error occurred while uploading file: {str(e)}')
 
 @app.post("/api/info-library/info")
-async def create_info_library_entry(entry: InfoLibraryEntry):
+@offload_db
+def create_info_library_entry(entry: InfoLibraryEntry):
     """Create a text-based info library entry (non-file)"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO info_library (title, description, category, is_file, uploaded_by, upload_date) 
@@ -3657,10 +6832,11 @@ async def create_info_library_entry(entry: InfoLibraryEntry):
         raise HTTPException(status_code=500, detail='An error occurred while creating info library entry')
 
 @app.get("/api/info-library/download/{entry_id}")
-async def download_info_library_file(entry_id: int, downloaded_by: str):
+@offload_db
+def download_info_library_file(entry_id: int, downloaded_by: str):
     """Download a file from the info library and log the download"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get file information
@@ -3723,93 +6899,62 @@ async def get_info_library_categories():
     }
 
 @app.get("/api/info-library/search")
-async def search_info_library(query: str = "", category: str = ""):
-    """Search info library entries"""
+@offload_db
+def search_info_library(query: str = "", category: str = ""):
+    """Search info library entries by title, description and document text"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            
-            # Build search query
-            sql = """
-                SELECT id, title, description, category, file_name, file_type, file_size, 
-                       is_file, uploaded_by, upload_date, downloads_log
-                FROM info_library 
-                WHERE 1=1
-            """
-            params = []
-            
-            if query:
-                sql += " AND (title LIKE ? OR description LIKE ?)"
-                search_term = f"%{query}%"
-                params.extend([search_term, search_term])
-            
-            if category and category != "all":
-                sql += " AND category = ?"
-                params.append(category)
-            
-            sql += " ORDER BY upload_date DESC"
-            
-            cursor.execute(sql, params)
-            entries = []
-            for row in cursor.fetchall():
-                entries.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'description': row[2],
-                    'category': row[3],
-                    'file_name': row[4],
-                    'file_type': row[5],
-                    'file_size': row[6],
-                    'is_file': bool(row[7]),
-                    'uploaded_by': row[8],
-                    'upload_date': row[9],
-                    'downloads_log': row[10] or ''
-                })
-        return entries
+        with get_db_connection() as conn:
+            return search_document_entries(conn.cursor(), 'info_library', INFO_LIBRARY_COLUMNS,
+                                           info_library_entry_to_dict, query, category)
     except Exception as e:
         logger.error(f"Error searching info library: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while searching info library')
 
 # Unalterable Records endpoints
+UNALTERABLE_RECORD_COLUMNS = """id, title, description, category, file_name, original_file_name,
+                       file_type, file_size, file_hash, hash_algorithm, uploaded_by, 
+                       upload_date, downloads_log, access_log, is_verified"""
+
+def unalterable_record_to_dict(row):
+    return {
+        'id': row[0],
+        'title': row[1],
+        'description': row[2],
+        'category': row[3],
+        'file_name': row[4],
+        'original_file_name': row[5],
+        'file_type': row[6],
+        'file_size': row[7],
+        'file_hash': row[8],
+        'hash_algorithm': row[9],
+        'uploaded_by': row[10],
+        'upload_date': row[11],
+        'downloads_log': row[12] or '',
+        'access_log': row[13] or '',
+        'is_verified': bool(row[14])
+    }
+
 @app.get("/api/unalterable-records")
-async def get_unalterable_records():
+@offload_db
+def get_unalterable_records():
     """Get all unalterable records entries"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, title, description, category, file_name, original_file_name,
-                       file_type, file_size, file_hash, hash_algorithm, uploaded_by, 
-                       upload_date, downloads_log, access_log, is_verified
+            cursor.execute(f"""
+                SELECT {UNALTERABLE_RECORD_COLUMNS}
                 FROM unalterable_records 
                 ORDER BY upload_date DESC
             """)
-            entries = []
-            for row in cursor.fetchall():
-                entries.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'description': row[2],
-                    'category': row[3],
-                    'file_name': row[4],
-                    'original_file_name': row[5],
-                    'file_type': row[6],
-                    'file_size': row[7],
-                    'file_hash': row[8],
-                    'hash_algorithm': row[9],
-                    'uploaded_by': row[10],
-                    'upload_date': row[11],
-                    'downloads_log': row[12] or '',
-                    'access_log': row[13] or '',
-                    'is_verified': bool(row[14])
-                })
+            entries = [unalterable_record_to_dict(row) for row in cursor.fetchall()]
         return entries
     except Exception as e:
         logger.error(f"Error retrieving unalterable records: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while retrieving unalterable records')
 
 @app.post("/api/unalterable-records/upload")
-async def upload_unalterable_record(
+@offload_db
+def upload_unalterable_record(
     file: UploadFile = File(...),
     title: str = Form(...),
     description: str = Form(""),
@@ -3829,7 +6974,7 @@ async def upload_unalterable_record(
             raise HTTPException(status_code=400, detail='File type not supported. Please upload PDF, DOC, DOCX, TXT, or image files.')
 
         # Read file content and check size (25MB limit for legal documents)
-        file_content = await file.read()
+        file_content = file.file.read()
         file_size = len(file_content)
         
         if file_size > 25 * 1024 * 1024:  # 25MB limit
@@ -3854,7 +6999,7 @@ async def upload_unalterable_record(
         is_verified = records_manager.verify_file_integrity(file_path, file_hash)
         
         # Store entry in database
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO unalterable_records (title, description, category, file_name, 
@@ -3867,7 +7012,9 @@ async def upload_unalterable_record(
                   'SHA-256', created_by, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                   is_verified))
             entry_id = cursor.lastrowid
+            queue_document_index(cursor, 'unalterable_records', entry_id)
             conn.commit()
+        document_indexer.submit('unalterable_records', entry_id)
 
         return {
             'success': True, 
@@ -3886,10 +7033,11 @@ async def upload_unalterable_record(
         raise HTTPException(status_code=500, detail=f'An error occurred while uploading record: {str(e)}')
 
 @app.get("/api/unalterable-records/download/{entry_id}")
-async def download_unalterable_record(entry_id: int, downloaded_by: str):
+@offload_db
+def download_unalterable_record(entry_id: int, downloaded_by: str):
     """Download an unalterable record and log the access"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get record information
@@ -3953,69 +7101,15 @@ async def download_unalterable_record(entry_id: int, downloaded_by: str):
 async def download_record_with_verification(entry_id: int, downloaded_by: str):
     """Download record with verification certificate as PDF"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            
-            # Get record information
-            cursor.execute("""
-                SELECT file_path, file_name, original_file_name, downloads_log, access_log,
-                       title, category, file_type, file_size, file_hash, hash_algorithm,
-                       uploaded_by, upload_date, is_verified
-                FROM unalterable_records WHERE id = ?
-            """, (entry_id,))
-            result = cursor.fetchone()
-            
-            if not result:
-                raise HTTPException(status_code=404, detail='Record not found')
-            
-            (file_path, file_name, original_file_name, downloads_log, access_log,
-             title, category, file_type, file_size, file_hash, hash_algorithm,
-             uploaded_by, upload_date, is_verified) = result
-            
-            # Verify file integrity
-            actual_file_path = Path(file_path)
-            if not actual_file_path.exists():
-                raise HTTPException(status_code=404, detail='File not found on disk')
-            
-            records_manager = UnalterableRecordsManager()
-            current_verification = records_manager.verify_file_integrity(actual_file_path, file_hash)
-            
-            # Prepare record data for verification PDF
-            record_data = {
-                'id': entry_id,
-                'title': title,
-                'category': category,
-                'original_file_name': original_file_name,
-                'file_type': file_type,
-                'file_size': file_size,
-                'file_hash': file_hash,
-                'hash_algorithm': hash_algorithm,
-                'uploaded_by': uploaded_by,
-                'upload_date': upload_date,
-                'is_verified': current_verification
-            }
-            
-            # Generate verification PDF
-            verification_pdf = records_manager.generate_verification_pdf(record_data, downloaded_by)
-            
-            # Log the access
-            access_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            new_access_log = f"{access_log}\n{downloaded_by} downloaded with verification on {access_timestamp}".strip()
-            new_download_log = f"{downloads_log}\n{downloaded_by} downloaded with verification on {access_timestamp}".strip()
-            
-            cursor.execute("""
-                UPDATE unalterable_records 
-                SET downloads_log = ?, access_log = ? 
-                WHERE id = ?
-            """, (new_download_log, new_access_log, entry_id))
-            conn.commit()
-            
+        _, filename, args = await run_db(with_db_cursor, prepare_record_verification, entry_id, downloaded_by)
+        
+        # Rendered on a CPU worker for every download, as the certificate states when the file was hashed
+        verification_pdf = await cpu_workers.run(record_verification_pdf, args)
+        
+        await run_db(with_db_cursor, log_verified_download, entry_id, downloaded_by)
+        
         # Return verification PDF
-        return StreamingResponse(
-            io.BytesIO(verification_pdf),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=VERIFIED_{original_file_name}_verification.pdf"}
-        )
+        return verification_pdf_response(verification_pdf, filename)
         
     except HTTPException:
         raise
@@ -4023,6 +7117,72 @@ async def download_record_with_verification(entry_id: int, downloaded_by: str):
         logger.error(f"Error generating verification PDF: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while generating verification PDF')
 
+def prepare_record_verification(cursor, entry_id, downloaded_by):
+    """Check a record's file is on disk; returns (job key, file name, render args) for its certificate"""
+    cursor.execute("""
+        SELECT file_path, original_file_name, title, category, file_type, file_size, file_hash,
+               hash_algorithm, uploaded_by, upload_date
+        FROM unalterable_records WHERE id = ?
+    """, (entry_id,))
+    result = cursor.fetchone()
+    
+    if not result:
+        raise HTTPException(status_code=404, detail='Record not found')
+    
+    (file_path, original_file_name, title, category, file_type, file_size, file_hash,
+     hash_algorithm, uploaded_by, upload_date) = result
+    
+    actual_file_path = Path(file_path)
+    if not actual_file_path.exists():
+        raise HTTPException(status_code=404, detail='File not found on disk')
+    
+    # Prepare record data for verification PDF
+    record_data = {
+        'id': entry_id,
+        'title': title,
+        'category': category,
+        'original_file_name': original_file_name,
+        'file_type': file_type,
+        'file_size': file_size,
+        'file_hash': file_hash,
+        'hash_algorithm': hash_algorithm,
+        'uploaded_by': uploaded_by,
+        'upload_date': upload_date
+    }
+    args = {'record': record_data, 'file_path': file_path, 'downloaded_by': downloaded_by}
+    
+    # Certificates are never cached, so the key only names export jobs for the record
+    return export_cache_key('unalterable_record', args), f"VERIFIED_{original_file_name}_verification.pdf", args
+
+def record_verification_pdf(args):
+    """CPU worker task: the verification certificate, after hashing the stored file again"""
+    records_manager = UnalterableRecordsManager()
+    record_data = dict(args['record'])
+    record_data['is_verified'] = records_manager.verify_file_integrity(Path(args['file_path']), record_data['file_hash'])
+    return records_manager.generate_verification_pdf(record_data, args['downloaded_by'])
+
+def verification_pdf_response(verification_pdf, filename):
+    return StreamingResponse(
+        io.BytesIO(verification_pdf),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename=\"{filename}\""}
+    )
+
+def log_verified_download(cursor, entry_id, downloaded_by):
+    """Append a verified download to a record's access and download logs"""
+    cursor.execute("SELECT downloads_log, access_log FROM unalterable_records WHERE id = ?", (entry_id,))
+    downloads_log, access_log = cursor.fetchone()
+    
+    access_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    new_access_log = f"{access_log}\n{downloaded_by} downloaded with verification on {access_timestamp}".strip()
+    new_download_log = f"{downloads_log}\n{downloaded_by} downloaded with verification on {access_timestamp}".strip()
+    
+    cursor.execute("""
+        UPDATE unalterable_records 
+        SET downloads_log = ?, access_log = ? 
+        WHERE id = ?
+    """, (new_download_log, new_access_log, entry_id))
+
 @app.get("/api/unalterable-records/categories")
 async def get_unalterable_record_categories():
     """Get list of available unalterable record categories"""
@@ -4042,63 +7202,23 @@ async def get_unalterable_record_categories():
     }
 
 @app.get("/api/unalterable-records/search")
-async def search_unalterable_records(query: str = "", category: str = ""):
-    """Search unalterable records entries"""
+@offload_db
+def search_unalterable_records(query: str = "", category: str = ""):
+    """Search unalterable records by title, description and document text"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            
-            # Build search query
-            sql = """
-                SELECT id, title, description, category, file_name, original_file_name,
-                       file_type, file_size, file_hash, hash_algorithm, uploaded_by, 
-                       upload_date, downloads_log, access_log, is_verified
-                FROM unalterable_records 
-                WHERE 1=1
-            """
-            params = []
-            
-            if query:
-                sql += " AND (title LIKE ? OR description LIKE ?)"
-                search_term = f"%{query}%"
-                params.extend([search_term, search_term])
-            
-            if category and category != "all":
-                sql += " AND category = ?"
-                params.append(category)
-            
-            sql += " ORDER BY upload_date DESC"
-            
-            cursor.execute(sql, params)
-            entries = []
-            for row in cursor.fetchall():
-                entries.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'description': row[2],
-                    'category': row[3],
-                    'file_name': row[4],
-                    'original_file_name': row[5],
-                    'file_type': row[6],
-                    'file_size': row[7],
-                    'file_hash': row[8],
-                    'hash_algorithm': row[9],
-                    'uploaded_by': row[10],
-                    'upload_date': row[11],
-                    'downloads_log': row[12] or '',
-                    'access_log': row[13] or '',
-                    'is_verified': bool(row[14])
-                })
-        return entries
+        with get_db_connection() as conn:
+            return search_document_entries(conn.cursor(), 'unalterable_records', UNALTERABLE_RECORD_COLUMNS,
+                                           unalterable_record_to_dict, query, category)
     except Exception as e:
         logger.error(f"Error searching unalterable records: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while searching unalterable records')
 
 @app.get("/api/unalterable-records/verify/{entry_id}")
-async def verify_record_integrity(entry_id: int):
+@offload_db
+def verify_record_integrity(entry_id: int):
     """Verify the integrity of a specific record"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get record information
@@ -4146,68 +7266,72 @@ async def verify_record_integrity(entry_id: int):
         raise HTTPException(status_code=500, detail='An error occurred while verifying record integrity')
 
 # Personal Journal endpoints
+JOURNAL_ENTRY_COLUMNS = "id, title, content, mood, entry_date, created_by, created_date, last_modified"
+
+def journal_entry_to_dict(cursor, row):
+    """Serialize a journal entry together with the files its author attached"""
+    entry_data = {
+        'id': row[0],
+        'title': row[1],
+        'content': row[2],
+        'mood': row[3],
+        'entry_date': row[4],
+        'created_by': row[5],
+        'created_date': row[6],
+        'last_modified': row[7]
+    }
+    
+    # Get attached files for this entry
+    cursor.execute("""
+        SELECT id, original_filename, stored_filename, file_type, file_size, upload_date
+        FROM journal_files 
+        WHERE journal_entry_id = ? AND uploaded_by = ?
+        ORDER BY upload_date DESC
+    """, (row[0], row[5]))
+    
+    files = []
+    for file_row in cursor.fetchall():
+        files.append({
+            'id': file_row[0],
+            'original_filename': file_row[1],
+            'stored_filename': file_row[2],
+            'file_type': file_row[3],
+            'file_size': file_row[4],
+            'upload_date': file_row[5]
+        })
+    
+    entry_data['files'] = files
+    return entry_data
+
 @app.get("/api/personal-journal")
-async def get_personal_journal_entries(created_by: str):
+@offload_db
+def get_personal_journal_entries(created_by: str):
     """Get all personal journal entries for a specific user"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, title, content, mood, entry_date, created_by, created_date, last_modified
+            cursor.execute(f"""
+                SELECT {JOURNAL_ENTRY_COLUMNS}
                 FROM personal_journal 
                 WHERE created_by = ?
                 ORDER BY entry_date DESC, created_date DESC
             """, (created_by,))
             
-            entries = []
-            for row in cursor.fetchall():
-                entry_data = {
-                    'id': row[0],
-                    'title': row[1],
-                    'content': row[2],
-                    'mood': row[3],
-                    'entry_date': row[4],
-                    'created_by': row[5],
-                    'created_date': row[6],
-                    'last_modified': row[7]
-                }
-                
-                # Get attached files for this entry
-                cursor.execute("""
-                    SELECT id, original_filename, stored_filename, file_type, file_size, upload_date
-                    FROM journal_files 
-                    WHERE journal_entry_id = ? AND uploaded_by = ?
-                    ORDER BY upload_date DESC
-                """, (row[0], created_by))
-                
-                files = []
-                for file_row in cursor.fetchall():
-                    files.append({
-                        'id': file_row[0],
-                        'original_filename': file_row[1],
-                        'stored_filename': file_row[2],
-                        'file_type': file_row[3],
-                        'file_size': file_row[4],
-                        'upload_date': file_row[5]
-                    })
-                
-                entry_data['files'] = files
-                entries.append(entry_data)
-            
-            return entries
+            return [journal_entry_to_dict(cursor, row) for row in cursor.fetchall()]
             
     except Exception as e:
         logger.error(f"Error retrieving personal journal entries: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while retrieving journal entries')
 
 @app.post("/api/personal-journal")
-async def create_personal_journal_entry(entry: PersonalJournalEntry):
+@offload_db
+def create_personal_journal_entry(entry: PersonalJournalEntry):
     """Create a new personal journal entry"""
     try:
         current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         entry_date = datetime.now().strftime("%Y-%m-%d")  # Auto-generate entry date as today
         
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO personal_journal (title, content, mood, entry_date, created_by, created_date)
@@ -4224,10 +7348,11 @@ async def create_personal_journal_entry(entry: PersonalJournalEntry):
         raise HTTPException(status_code=500, detail='An error occurred while creating journal entry')
 
 @app.put("/api/personal-journal/{entry_id}")
-async def update_personal_journal_entry(entry_id: int, entry: PersonalJournalUpdate, updated_by: str):
+@offload_db
+def update_personal_journal_entry(entry_id: int, entry: PersonalJournalUpdate, updated_by: str):
     """Update a personal journal entry"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Check if entry exists and user has permission to edit
@@ -4274,10 +7399,11 @@ async def update_personal_journal_entry(entry_id: int, entry: PersonalJournalUpd
         raise HTTPException(status_code=500, detail='An error occurred while updating journal entry')
 
 @app.delete("/api/personal-journal/{entry_id}")
-async def delete_personal_journal_entry(entry_id: int, deleted_by: str):
+@offload_db
+def delete_personal_journal_entry(entry_id: int, deleted_by: str):
     """Delete a personal journal entry and associated files"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Check if entry exists and user has permission to delete
@@ -4316,7 +7442,8 @@ async def delete_personal_journal_entry(entry_id: int, deleted_by: str):
         raise HTTPException(status_code=500, detail='An error occurred while deleting journal entry')
 
 @app.post("/api/personal-journal/{entry_id}/upload-file")
-async def upload_journal_file(
+@offload_db
+def upload_journal_file(
     entry_id: int,
     file: UploadFile = File(...),
     uploaded_by: str = Form(...)
@@ -4324,7 +7451,7 @@ async def upload_journal_file(
     """Upload a file attachment to a personal journal entry"""
     try:
         # Check if journal entry exists and user has permission
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT created_by FROM personal_journal WHERE id = ?", (entry_id,))
             result = cursor.fetchone()
@@ -4349,7 +7476,7 @@ async def upload_journal_file(
         file_path = user_dir / stored_filename
         
         # Save file
-        file_content = await file.read()
+        file_content = file.file.read()
         with open(file_path, "wb") as buffer:
             buffer.write(file_content)
         
@@ -4358,7 +7485,7 @@ async def upload_journal_file(
         file_type = mimetypes.guess_type(file.filename)[0] or 'application/octet-stream'
         
         # Save file info to database
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO journal_files (journal_entry_id, original_filename, stored_filename, 
@@ -4388,10 +7515,11 @@ async def upload_journal_file(
         raise HTTPException(status_code=500, detail=f'An error occurred while uploading file: {str(e)}')
 
 @app.get("/api/personal-journal/file/{file_id}")
-async def download_journal_file(file_id: int, downloaded_by: str):
+@offload_db
+def download_journal_file(file_id: int, downloaded_by: str):
     """Download a journal file (only accessible by the uploader)"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT original_filename, stored_filename, file_path, file_type, uploaded_by
@@ -4426,10 +7554,11 @@ async def download_journal_file(file_id: int, downloaded_by: str):
         raise HTTPException(status_code=500, detail='An error occurred while downloading file')
 
 @app.delete("/api/personal-journal/file/{file_id}")
-async def delete_journal_file(file_id: int, deleted_by: str):
+@offload_db
+def delete_journal_file(file_id: int, deleted_by: str):
     """Delete a journal file attachment"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT file_path, uploaded_by
@@ -4461,145 +7590,418 @@ async def delete_journal_file(file_id: int, deleted_by: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting journal file: {str(e)}")
-        raise HTTPException(status_code=500, detail='An error occurred while deleting file')
-
-@app.get("/api/personal-journal/{entry_id}/export-pdf")
-async def export_journal_entry_pdf(entry_id: int, exported_by: str):
-    """Export a journal entry to PDF"""
+        logger.error(f"Error deleting journal file: {str(e)}")
+        raise HTTPException(status_code=500, detail='An error occurred while deleting file')
+
+@app.get("/api/personal-journal/{entry_id}/export-pdf")
+async def export_journal_entry_pdf(entry_id: int, exported_by: str):
+    """Export a journal entry to PDF"""
+    try:
+        cache_key, filename, args = await run_db(with_db_cursor, prepare_journal_export, entry_id, exported_by)
+        
+        # Rendered on a CPU worker, or served from an earlier copy of the same entry
+        return FileResponse(await export_jobs.render('journal_entry', cache_key, args),
+                            media_type="application/pdf", filename=filename)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting journal entry to PDF: {str(e)}")
+        raise HTTPException(status_code=500, detail='An error occurred while exporting journal entry')
+
+def prepare_journal_export(cursor, entry_id, exported_by):
+    """Check the exporter owns a journal entry; returns (cache key, file name, render args)"""
+    cursor.execute("""
+        SELECT title, content, mood, entry_date, created_by, created_date
+        FROM personal_journal 
+        WHERE id = ?
+    """, (entry_id,))
+    result = cursor.fetchone()
+    
+    if not result:
+        raise HTTPException(status_code=404, detail='Journal entry not found')
+    
+    title, content, mood, entry_date, created_by, created_date = result
+    
+    # Check permission - only owner can export
+    if created_by != exported_by:
+        raise HTTPException(status_code=403, detail='You can only export your own journal entries')
+    
+    # Get attached files info
+    cursor.execute("""
+        SELECT original_filename, file_type, file_size
+        FROM journal_files 
+        WHERE journal_entry_id = ?
+        ORDER BY upload_date DESC
+    """, (entry_id,))
+    files = [list(row) for row in cursor.fetchall()]
+    
+    args = {'entry': [title, content, mood, entry_date, created_by, created_date], 'files': files}
+    cache_key = export_cache_key('journal_entry', entry_id, args)
+    filename = f"journal_entry_{entry_id}_{entry_date.replace(' ', '_').replace(':', '-')}.pdf"
+    return cache_key, filename, args
+
+def write_journal_entry_pdf(args, output):
+    """Export renderer: a private journal entry with its attachment list"""
+    title, content, mood, entry_date, created_by, created_date = args['entry']
+    files = args['files']
+    
+    # Title and entry details table
+    content_list = certificate_header(["🔒 PRIVATE PERSONAL JOURNAL ENTRY"])
+    content_list.extend(certificate_table('Entry Information', [
+        ['Title:', title],
+        ['Entry Date:', entry_date],
+        ['Created:', created_date],
+        ['Mood:', mood or 'Not specified'],
+        ['Owner:', created_by],
+    ], 'information'))
+    
+    # Journal content
+    content_list.append(Paragraph("<b>Journal Entry:</b>", PDF_STYLES['Heading2']))
+    content_list.append(Spacer(1, 0.1*inch))
+    
+    # Split content into paragraphs and add each
+    paragraphs = content.split('\n')
+    for para in paragraphs:
+        if para.strip():
+            content_list.append(Paragraph(para.strip(), PDF_STYLES['Normal']))
+        else:
+            content_list.append(Spacer(1, 0.1*inch))
+    
+    content_list.append(Spacer(1, 0.2*inch))
+    
+    # Attached files
+    if files:
+        content_list.append(Paragraph("<b>Attached Files:</b>", PDF_STYLES['Heading2']))
+        file_data = [['Filename', 'Type', 'Size']]
+    
+        for filename, file_type, file_size in files:
+            size_mb = f"{file_size / 1024 / 1024:.2f} MB" if file_size > 1024*1024 else f"{file_size / 1024:.2f} KB"
+            file_data.append([filename, file_type or 'Unknown', size_mb])
+    
+        content_list.append(Table(file_data, colWidths=[3*inch, 1.5*inch, 1*inch], style=PDF_TABLE_STYLES['attachments']))
+    
+    content_list.append(Spacer(1, 0.3*inch))
+    
+    # Privacy notice
+    content_list.append(legal_footer("""
+    <b>PRIVACY NOTICE:</b><br/>
+    <br/>
+    This is a private personal journal entry that is only accessible by the owner. 
+    This document was generated from the Safespace Personal Journal system on 
+    """ + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + """ UTC. A later download of the unchanged
+    entry returns this document as it was generated.<br/>
+    <br/>
+    <b>Important:</b> This journal entry and any attached files are completely private 
+    and are not visible to other users of the Safespace system.
+    """))
+    
+    # Build PDF
+    pdf_document(output).build(content_list)
+
+# =============================================================================
+# EXPORT JOB API ENDPOINTS
+# =============================================================================
+
+def export_cache_key(kind, *parts):
+    """Hash everything that shapes an export into the name of its cached PDF"""
+    material = json.dumps([EXPORT_LAYOUT_VERSION, kind, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+# kind -> function writing that export's PDF into a binary file, run in an export process. Record
+# verification certificates are not among them: they are rendered for each download, never cached
+EXPORT_RENDERERS = {
+    'conversation': write_conversation_export,
+    'journal_entry': write_journal_entry_pdf,
+}
+
+def render_export(kind, args, path):
+    """CPU worker task: render one export into ``path``, replacing it atomically"""
+    partial_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        with open(partial_path, 'wb') as output:
+            EXPORT_RENDERERS[kind](args, output)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return os.path.getsize(path)
+
+class ExportJobQueue:
+    """Renders court-bundle exports on the CPU workers and keeps the finished PDFs in EXPORT_CACHE_DIR.
+
+    Each PDF is named by a hash of everything that shapes it, so a repeat request for an unchanged
+    conversation or journal entry is served from disk without rendering, and concurrent requests
+    for the same export share one render. Record verification certificates are rendered when downloaded. export_jobs records every job, so jobs still queued when the
+    server stopped are picked up again by ``resume``.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self._lock = threading.Lock()
+        self._renders = {}  # cache key -> future of the render in progress
+        self._jobs = 0
+        self._cache_hits = 0
+        self._rendered = 0
+        self._failed = 0
+        self._seconds = 0.0
+
+    def artifact_path(self, cache_key):
+        return self.cache_dir / f"{cache_key}.pdf"
+
+    def cached(self, cache_key):
+        """Path of the cached PDF for ``cache_key``, or None; a hit keeps it from being pruned"""
+        path = self.artifact_path(cache_key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._cache_hits += 1
+        return path
+
+    def cache_stream(self, cache_key, chunks):
+        """Pass a PDF streamed in the request through, keeping a copy in the cache once it completes"""
+        path = self.artifact_path(cache_key)
+        partial_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(partial_path, 'wb') as copy:
+                for chunk in chunks:
+                    copy.write(chunk)
+                    yield chunk
+            os.replace(partial_path, path)
+        finally:
+            # Also reached when the client disconnects part way through
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def _render_future(self, kind, cache_key, args):
+        with self._lock:
+            future = self._renders.get(cache_key)
+            started = future is None
+            if started:
+                future = cpu_workers.submit(render_export, kind, args, str(self.artifact_path(cache_key)))
+                self._renders[cache_key] = future
+        if started:
+            future.add_done_callback(functools.partial(self._render_done, cache_key, time.monotonic()))
+        return future
+
+    def _render_done(self, cache_key, started, future):
+        with self._lock:
+            self._renders.pop(cache_key, None)
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self._failed += 1
+            else:
+                self._rendered += 1
+                self._seconds += time.monotonic() - started
+        if future.exception() is not None:
+            logger.error(f"Error rendering export {cache_key}: {str(future.exception())}")
+
+    async def render(self, kind, cache_key, args):
+        """Render an export, or reuse the cached copy; returns the PDF path once it is on disk"""
+        path = self.cached(cache_key)
+        if path is None:
+            await asyncio.wrap_future(self._render_future(kind, cache_key, args))
+            path = self.artifact_path(cache_key)
+        return path
+
+    def submit(self, kind, cache_key, file_name, args, user_id=None):
+        """Record a job and start it in the background; returns the job id"""
+        job_id = uuid.uuid4().hex
+        with get_db_connection() as conn:
+            conn.execute("""
+                INSERT INTO export_jobs (id, kind, cache_key, file_name, render_args, status, user_id, requested_date)
+                VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)
+            """, (job_id, kind, cache_key, file_name, json.dumps(args), user_id,
+                  datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        with self._lock:
+            self._jobs += 1
+        self._start(job_id, kind, cache_key, args)
+        return job_id
+
+    def _start(self, job_id, kind, cache_key, args):
+        # A record's certificate states when it was verified and downloaded, so it is rendered at download
+        if kind not in EXPORT_RENDERERS or self.cached(cache_key) is not None:
+            self._finish(job_id, None)
+        else:
+            self._render_future(kind, cache_key, args).add_done_callback(functools.partial(self._rendered_job, job_id))
+
+    def _rendered_job(self, job_id, future):
+        # Done callbacks run on the process pool's result thread, which must not wait on the database
+        db_executor.submit(self._finish, job_id, future)
+
+    def _finish(self, job_id, future):
+        # Cancelled at shutdown: the job stays queued and is resumed on the next start
+        if future is not None and future.cancelled():
+            return
+        error = str(future.exception()) if future is not None and future.exception() is not None else None
+        status = 'failed' if error else 'done'
+        try:
+            with get_db_connection() as conn:
+                conn.execute("UPDATE export_jobs SET status = ?, finished_date = ?, error = ? WHERE id = ?",
+                             (status, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), error, job_id))
+                row = conn.execute("SELECT kind, file_name, user_id FROM export_jobs WHERE id = ?", (job_id,)).fetchone()
+        except Exception as e:
+            logger.error(f"Error finishing export job {job_id}: {str(e)}")
+            return
+        kind, file_name, user_id = row
+        if user_id is not None:
+            emit_event(ExportJobEvent(job_id=job_id, kind=kind, status=status, file_name=file_name,
+                                      error='Export failed' if error else None), user_ids=[user_id])
+
+    def status(self, job_id):
+        """The job as returned by the API, or None"""
+        with get_db_connection() as conn:
+            row = conn.execute("""
+                SELECT id, kind, file_name, status, user_id, requested_date, finished_date
+                FROM export_jobs WHERE id = ?
+            """, (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(('job_id', 'kind', 'file_name', 'status', 'user_id', 'requested_date', 'finished_date'), row))
+        job['download_url'] = f"/api/exports/{job_id}/download" if job['status'] == 'done' else None
+        return job
+
+    def resume(self):
+        """Start every job still marked queued"""
+        with get_db_connection() as conn:
+            queued = conn.execute("SELECT id, kind, cache_key, render_args FROM export_jobs WHERE status = 'queued'").fetchall()
+        for job_id, kind, cache_key, render_args in queued:
+            self._start(job_id, kind, cache_key, json.loads(render_args))
+        return len(queued)
+
+    def prune(self):
+        """Drop jobs and cached PDFs unused for EXPORT_CACHE_DAYS"""
+        cutoff = datetime.now() - timedelta(days=EXPORT_CACHE_DAYS)
+        with get_db_connection() as conn:
+            conn.execute("DELETE FROM export_jobs WHERE status != 'queued' AND requested_date < ?",
+                         (cutoff.strftime("%Y-%m-%d %H:%M:%S"),))
+        removed = 0
+        for path in self.cache_dir.glob("*.pdf"):
+            if datetime.fromtimestamp(path.stat().st_mtime) < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rendering': len(self._renders),
+                'jobs': self._jobs,
+                'cache_hits': self._cache_hits,
+                'rendered': self._rendered,
+                'failed': self._failed,
+                'avg_render_ms': round(self._seconds * 1000 / self._rendered, 2) if self._rendered else 0.0
+            }
+
+export_jobs = ExportJobQueue(EXPORT_CACHE_DIR)
+
+def prune_export_cache():
+    removed = export_jobs.prune()
+    if removed:
+        logger.info(f"Removed {removed} cached exports unused for {EXPORT_CACHE_DAYS:g} days")
+
+@app.on_event("startup")
+async def resume_export_jobs():
+    schedule_maintenance(prune_export_cache, "pruning export cache")
+    try:
+        await run_db(prune_export_cache)
+        queued = await run_db(export_jobs.resume)
+        if queued:
+            logger.info(f"Resumed {queued} export jobs")
+    except Exception as e:
+        logger.error(f"Error resuming export jobs: {str(e)}")
+
+def get_export_job(job_id, authorization):
+    """The job, if it exists and belongs to the caller; jobs submitted without a session are open to anyone with the id"""
+    job = export_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Export job not found')
+    if job['user_id'] is not None:
+        current_user = get_current_user(authorization)
+        if not current_user or current_user.get('id') != job['user_id']:
+            raise HTTPException(status_code=404, detail='Export job not found')
+    return job
+
+@app.post("/api/exports")
+@offload_db
+def submit_export_job(request: ExportJobRequest, authorization: Optional[str] = Header(None)):
+    """Queue a conversation, journal entry or record verification export; poll it or wait for its export_job event"""
+    if request.kind == 'conversation' and request.conversation_id is None:
+        raise HTTPException(status_code=400, detail='conversation_id is required')
+    if request.kind != 'conversation' and (request.entry_id is None or not request.requested_by):
+        raise HTTPException(status_code=400, detail='entry_id and requested_by are required')
+    
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if request.kind == 'conversation':
+                export = ConversationExport(conversation_id=request.conversation_id,
+                                            date_from=request.date_from, date_to=request.date_to)
+                cache_key, file_name, args = prepare_conversation_export(cursor, export)
+            elif request.kind == 'journal_entry':
+                cache_key, file_name, args = prepare_journal_export(cursor, request.entry_id, request.requested_by)
+            else:
+                cache_key, file_name, args = prepare_record_verification(cursor, request.entry_id, request.requested_by)
+        
+        current_user = get_current_user(authorization)
+        job_id = export_jobs.submit(request.kind, cache_key, file_name, args,
+                                    user_id=current_user.get('id') if current_user else None)
+        job = export_jobs.status(job_id)
+        del job['user_id']
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error submitting export job: {str(e)}")
+        raise HTTPException(status_code=500, detail='An error occurred while submitting export')
+
+@app.get("/api/exports/{job_id}")
+@offload_db
+def get_export_job_status(job_id: str, authorization: Optional[str] = Header(None)):
+    """Status of an export job: queued, done (with its download_url) or failed"""
+    job = get_export_job(job_id, authorization)
+    del job['user_id']
+    return job
+
+@app.get("/api/exports/{job_id}/download")
+@offload_db
+def download_export_job(job_id: str, authorization: Optional[str] = Header(None)):
+    """Download the PDF of a finished export job"""
+    job = get_export_job(job_id, authorization)
+    if job['status'] == 'failed':
+        raise HTTPException(status_code=500, detail='Export failed; submit it again')
+    if job['status'] != 'done':
+        raise HTTPException(status_code=409, detail='Export is not ready yet')
+    
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT title, content, mood, entry_date, created_by, created_date
-                FROM personal_journal 
-                WHERE id = ?
-            """, (entry_id,))
-            result = cursor.fetchone()
-            
-            if not result:
-                raise HTTPException(status_code=404, detail='Journal entry not found')
-            
-            title, content, mood, entry_date, created_by, created_date = result
-            
-            # Check permission - only owner can export
-            if created_by != exported_by:
-                raise HTTPException(status_code=403, detail='You can only export your own journal entries')
-            
-            # Get attached files info
-            cursor.execute("""
-                SELECT original_filename, file_type, file_size
-                FROM journal_files 
-                WHERE journal_entry_id = ?
-                ORDER BY upload_date DESC
-            """, (entry_id,))
-            files = cursor.fetchall()
-        
-        # Generate PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        content_list = []
-        
-        # Title
-        title_style = styles['Title']
-        title_style.textColor = colors.darkblue
-        content_list.append(Paragraph("🔒 PRIVATE PERSONAL JOURNAL ENTRY", title_style))
-        content_list.append(Spacer(1, 0.3*inch))
-        
-        # Entry details table
-        entry_data = [
-            ['Entry Information', ''],
-            ['Title:', title],
-            ['Entry Date:', entry_date],
-            ['Created:', created_date],
-            ['Mood:', mood or 'Not specified'],
-            ['Owner:', created_by],
-        ]
-        
-        entry_table = Table(entry_data, colWidths=[2*inch, 4*inch])
-        entry_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (1, 0), colors.lightblue),
-            ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        content_list.append(entry_table)
-        content_list.append(Spacer(1, 0.2*inch))
-        
-        # Journal content
-        content_list.append(Paragraph("<b>Journal Entry:</b>", styles['Heading2']))
-        content_list.append(Spacer(1, 0.1*inch))
-        
-        # Split content into paragraphs and add each
-        paragraphs = content.split('\n')
-        for para in paragraphs:
-            if para.strip():
-                content_list.append(Paragraph(para.strip(), styles['Normal']))
+            cursor.execute("SELECT cache_key, render_args FROM export_jobs WHERE id = ?", (job_id,))
+            cache_key, render_args = cursor.fetchone()
+            if job['kind'] == 'unalterable_record':
+                args = json.loads(render_args)
+                entry_id, downloaded_by = args['record']['id'], args['downloaded_by']
+                _, _, args = prepare_record_verification(cursor, entry_id, downloaded_by)
             else:
-                content_list.append(Spacer(1, 0.1*inch))
-        
-        content_list.append(Spacer(1, 0.2*inch))
-        
-        # Attached files
-        if files:
-            content_list.append(Paragraph("<b>Attached Files:</b>", styles['Heading2']))
-            file_data = [['Filename', 'Type', 'Size']]
-            
-            for filename, file_type, file_size in files:
-                size_mb = f"{file_size / 1024 / 1024:.2f} MB" if file_size > 1024*1024 else f"{file_size / 1024:.2f} KB"
-                file_data.append([filename, file_type or 'Unknown', size_mb])
-            
-            file_table = Table(file_data, colWidths=[3*inch, 1.5*inch, 1*inch])
-            file_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            content_list.append(file_table)
-        
-        content_list.append(Spacer(1, 0.3*inch))
-        
-        # Privacy notice
-        privacy_text = """
-        <b>PRIVACY NOTICE:</b><br/>
-        <br/>
-        This is a private personal journal entry that is only accessible by the owner. 
-        This document was exported from the Safespace Personal Journal system on 
-        """ + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + """ UTC.<br/>
-        <br/>
-        <b>Important:</b> This journal entry and any attached files are completely private 
-        and are not visible to other users of the Safespace system.
-        """
-        content_list.append(Paragraph(privacy_text, styles['Normal']))
-        
-        # Build PDF
-        doc.build(content_list)
-        buffer.seek(0)
+                path = export_jobs.artifact_path(cache_key)
+                if not path.exists():
+                    raise HTTPException(status_code=410, detail='Export has expired; submit it again')
         
-        # Return PDF as streaming response
-        return StreamingResponse(
-            io.BytesIO(buffer.getvalue()),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=journal_entry_{entry_id}_{entry_date.replace(' ', '_').replace(':', '-')}.pdf"}
-        )
+        # Certificates are verified, rendered and logged for each download, as with the direct endpoint
+        if job['kind'] == 'unalterable_record':
+            verification_pdf = cpu_workers.call(record_verification_pdf, args)
+            with_db_cursor(log_verified_download, entry_id, downloaded_by)
+            return verification_pdf_response(verification_pdf, job['file_name'])
         
+        return FileResponse(path, media_type="application/pdf", filename=job['file_name'])
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error exporting journal entry to PDF: {str(e)}")
-        raise HTTPException(status_code=500, detail='An error occurred while exporting journal entry')
+        logger.error(f"Error downloading export job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail='An error occurred while downloading export')
 
 # =============================================================================
 # VAULT FILE STORAGE API ENDPOINTS
@@ -4608,7 +8010,7 @@ async def export_journal_entry_pdf(entry_id: int, exported_by: str):
 def log_vault_access(file_id: int, accessed_by: str, access_type: str, ip_address: str = None, user_agent: str = None):
     """Log access to vault files for tracking purposes"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO vault_access_logs (file_id, accessed_by, access_type, access_date, ip_address, user_agent)
@@ -4619,10 +8021,11 @@ def log_vault_access(file_id: int, accessed_by: str, access_type: str, ip_addres
         logger.error(f"Error logging vault access: {str(e)}")
 
 @app.get("/api/vault/folders")
-async def get_vault_folders():
+@offload_db
+def get_vault_folders():
     """Get all vault folders with organization"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT id, name, parent_folder_id, created_by, created_date, is_shared, shared_with
@@ -4646,10 +8049,11 @@ async def get_vault_folders():
         raise HTTPException(status_code=500, detail='An error occurred while retrieving vault folders')
 
 @app.post("/api/vault/folders")
-async def create_vault_folder(folder: VaultFolderEntry):
+@offload_db
+def create_vault_folder(folder: VaultFolderEntry):
     """Create a new vault folder"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO vault_folders (name, parent_folder_id, created_by, created_date) 
@@ -4662,64 +8066,67 @@ async def create_vault_folder(folder: VaultFolderEntry):
         logger.error(f"Error creating vault folder: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while creating vault folder')
 
+VAULT_FILE_COLUMNS = """id, title, description, original_filename, file_type, file_size, 
+                           folder_id, uploaded_by, upload_date, is_shared, shared_with"""
+
+def vault_file_to_dict(cursor, row):
+    """Serialize a vault file with its access statistics"""
+    cursor.execute("""
+        SELECT access_type, COUNT(*) as count
+        FROM vault_access_logs 
+        WHERE file_id = ? 
+        GROUP BY access_type
+    """, (row[0],))
+    access_stats = {access[0]: access[1] for access in cursor.fetchall()}
+    
+    return {
+        'id': row[0],
+        'title': row[1],
+        'description': row[2],
+        'filename': row[3],
+        'file_type': row[4],
+        'file_size': row[5],
+        'folder_id': row[6],
+        'uploaded_by': row[7],
+        'upload_date': row[8],
+        'is_shared': bool(row[9]),
+        'shared_with': row[10],
+        'access_stats': access_stats
+    }
+
 @app.get("/api/vault/files")
-async def get_vault_files(folder_id: Optional[int] = None, user: Optional[str] = None):
+@offload_db
+def get_vault_files(folder_id: Optional[int] = None, user: Optional[str] = None):
     """Get vault files, optionally filtered by folder or user"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             if folder_id is not None:
                 # Get files in specific folder
-                cursor.execute("""
-                    SELECT id, title, description, original_filename, file_type, file_size, 
-                           folder_id, uploaded_by, upload_date, is_shared, shared_with
+                cursor.execute(f"""
+                    SELECT {VAULT_FILE_COLUMNS}
                     FROM vault_files 
                     WHERE folder_id = ? OR (folder_id = ? AND (uploaded_by = ? OR is_shared = 1))
                     ORDER BY title
                 """, (folder_id, folder_id, user))
             else:
                 # Get all files the user can access
-                cursor.execute("""
-                    SELECT id, title, description, original_filename, file_type, file_size, 
-                           folder_id, uploaded_by, upload_date, is_shared, shared_with
+                cursor.execute(f"""
+                    SELECT {VAULT_FILE_COLUMNS}
                     FROM vault_files 
                     WHERE uploaded_by = ? OR is_shared = 1 OR shared_with LIKE ?
                     ORDER BY title
                 """, (user, f'%{user}%'))
             
-            files = []
-            for row in cursor.fetchall():
-                # Get access statistics for each file
-                cursor.execute("""
-                    SELECT access_type, COUNT(*) as count
-                    FROM vault_access_logs 
-                    WHERE file_id = ? 
-                    GROUP BY access_type
-                """, (row[0],))
-                access_stats = {access[0]: access[1] for access in cursor.fetchall()}
-                
-                files.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'description': row[2],
-                    'filename': row[3],
-                    'file_type': row[4],
-                    'file_size': row[5],
-                    'folder_id': row[6],
-                    'uploaded_by': row[7],
-                    'upload_date': row[8],
-                    'is_shared': bool(row[9]),
-                    'shared_with': row[10],
-                    'access_stats': access_stats
-                })
-            return files
+            return [vault_file_to_dict(cursor, row) for row in cursor.fetchall()]
     except Exception as e:
         logger.error(f"Error retrieving vault files: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while retrieving vault files')
 
 @app.post("/api/vault/upload")
-async def upload_vault_file(
+@offload_db
+def upload_vault_file(
     file: UploadFile = File(...),
     title: str = Form(...),
     description: Optional[str] = Form(""),
@@ -4745,7 +8152,7 @@ async def upload_vault_file(
             raise HTTPException(status_code=400, detail='File type not supported. Please upload documents, images, or media files.')
 
         # Read file content
-        file_content = await file.read()
+        file_content = file.file.read()
         file_size = len(file_content)
         
         # Check file size limit (50MB)
@@ -4765,7 +8172,7 @@ async def upload_vault_file(
         file_hash = hashlib.sha256(file_content).hexdigest()
         
         # Store file information in database
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO vault_files (title, description, original_filename, stored_filename, 
@@ -4798,10 +8205,11 @@ async def upload_vault_file(
         raise HTTPException(status_code=500, detail=f'An error occurred while uploading file: {str(e)}')
 
 @app.get("/api/vault/file/{file_id}")
-async def download_vault_file(file_id: int, accessed_by: str):
+@offload_db
+def download_vault_file(file_id: int, accessed_by: str):
     """Download a vault file with access logging"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT original_filename, stored_filename, file_path, file_type, uploaded_by, is_shared, shared_with
@@ -4845,10 +8253,11 @@ async def download_vault_file(file_id: int, accessed_by: str):
         raise HTTPException(status_code=500, detail='An error occurred while downloading file')
 
 @app.get("/api/vault/file/{file_id}/preview")
-async def preview_vault_file(file_id: int, accessed_by: str):
+@offload_db
+def preview_vault_file(file_id: int, accessed_by: str):
     """Preview a vault file (for images/documents) with access logging"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT original_filename, stored_filename, file_path, file_type, uploaded_by, 
@@ -4895,10 +8304,11 @@ async def preview_vault_file(file_id: int, accessed_by: str):
         raise HTTPException(status_code=500, detail='An error occurred while previewing file')
 
 @app.put("/api/vault/file/{file_id}")
-async def update_vault_file(file_id: int, update: VaultFileUpdate, updated_by: str):
+@offload_db
+def update_vault_file(file_id: int, update: VaultFileUpdate, updated_by: str):
     """Update vault file metadata"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Check if file exists and user has permission
@@ -4949,10 +8359,11 @@ async def update_vault_file(file_id: int, update: VaultFileUpdate, updated_by: s
         raise HTTPException(status_code=500, detail='An error occurred while updating file')
 
 @app.delete("/api/vault/file/{file_id}")
-async def delete_vault_file(file_id: int, deleted_by: str):
+@offload_db
+def delete_vault_file(file_id: int, deleted_by: str):
     """Delete a vault file"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT file_path, uploaded_by
@@ -4988,10 +8399,11 @@ async def delete_vault_file(file_id: int, deleted_by: str):
         raise HTTPException(status_code=500, detail='An error occurred while deleting file')
 
 @app.get("/api/vault/file/{file_id}/access-logs")
-async def get_vault_file_access_logs(file_id: int, requested_by: str):
+@offload_db
+def get_vault_file_access_logs(file_id: int, requested_by: str):
     """Get access logs for a vault file (only accessible by file owner)"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Check if file exists and user has permission
@@ -5030,10 +8442,11 @@ async def get_vault_file_access_logs(file_id: int, requested_by: str):
         raise HTTPException(status_code=500, detail='An error occurred while retrieving access logs')
 
 @app.get("/api/vault/stats")
-async def get_vault_stats(user: str):
+@offload_db
+def get_vault_stats(user: str):
     """Get vault storage statistics for a user"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get user's files count and total size
@@ -5099,7 +8512,8 @@ async def get_support_categories():
     }
 
 @app.post("/api/support/tickets")
-async def create_support_ticket(ticket: SupportTicketEntry):
+@offload_db
+def create_support_ticket(ticket: SupportTicketEntry):
     """Create a new support ticket"""
     try:
         # Generate unique ticket number
@@ -5109,7 +8523,7 @@ async def create_support_ticket(ticket: SupportTicketEntry):
         
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO support_tickets (ticket_number, subject, category, priority, description, 
@@ -5132,10 +8546,11 @@ async def create_support_ticket(ticket: SupportTicketEntry):
         raise HTTPException(status_code=500, detail='An error occurred while creating the support ticket')
 
 @app.get("/api/support/tickets")
-async def get_user_support_tickets(user_email: str):
+@offload_db
+def get_user_support_tickets(user_email: str):
     """Get all support tickets for a specific user"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT id, ticket_number, subject, category, priority, status, 
@@ -5166,10 +8581,11 @@ async def get_user_support_tickets(user_email: str):
         raise HTTPException(status_code=500, detail='An error occurred while retrieving support tickets')
 
 @app.get("/api/support/tickets/{ticket_id}")
-async def get_support_ticket_details(ticket_id: int):
+@offload_db
+def get_support_ticket_details(ticket_id: int):
     """Get detailed information about a specific ticket including attachments"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get ticket details
@@ -5228,7 +8644,8 @@ async def get_support_ticket_details(ticket_id: int):
         raise HTTPException(status_code=500, detail='An error occurred while retrieving ticket details')
 
 @app.post("/api/support/tickets/{ticket_id}/attachments")
-async def upload_ticket_attachment(
+@offload_db
+def upload_ticket_attachment(
     ticket_id: int,
     file: UploadFile = File(...),
     uploaded_by: str = Form(...)
@@ -5239,7 +8656,7 @@ async def upload_ticket_attachment(
             raise HTTPException(status_code=400, detail='No file selected')
 
         # Check if ticket exists
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id FROM support_tickets WHERE id = ?", (ticket_id,))
             if not cursor.fetchone():
@@ -5253,7 +8670,7 @@ async def upload_ticket_attachment(
             raise HTTPException(status_code=400, detail='File type not supported')
 
         # Check file size (limit to 10MB)
-        file_content = await file.read()
+        file_content = file.file.read()
         if len(file_content) > 10 * 1024 * 1024:  # 10MB
             raise HTTPException(status_code=400, detail='File size too large (max 10MB)')
 
@@ -5270,7 +8687,7 @@ async def upload_ticket_attachment(
             buffer.write(file_content)
 
         # Save to database
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO support_ticket_attachments 
@@ -5308,10 +8725,11 @@ async def upload_ticket_attachment(
         raise HTTPException(status_code=500, detail=f'An error occurred while uploading attachment: {str(e)}')
 
 @app.get("/api/support/tickets/{ticket_id}/attachments/{attachment_id}/download")
-async def download_ticket_attachment(ticket_id: int, attachment_id: int):
+@offload_db
+def download_ticket_attachment(ticket_id: int, attachment_id: int):
     """Download a ticket attachment"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT original_filename, file_path, file_type
@@ -5353,7 +8771,7 @@ def send_call_notification_email(recipient_email: str, notification_type: str, c
         logger.info(f"Email notification to {recipient_email}: {notification_type} - {call_details}")
         
         # Store notification record
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO call_notifications (scheduled_call_id, recipient_email, notification_type, sent_at, email_sent)
@@ -5368,7 +8786,8 @@ def send_call_notification_email(recipient_email: str, notification_type: str, c
         return False
 
 @app.post("/api/calls/schedule")
-async def schedule_call(call_request: ScheduleCallRequest, current_user: dict = Depends(get_current_user)):
+@offload_db
+def schedule_call(call_request: ScheduleCallRequest, current_user: dict = Depends(get_current_user_async)):
     """Schedule a new call"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
@@ -5385,7 +8804,7 @@ async def schedule_call(call_request: ScheduleCallRequest, current_user: dict =
         
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO scheduled_calls (caller_id, caller_name, caller_email, recipient_name, 
@@ -5399,6 +8818,10 @@ async def schedule_call(call_request: ScheduleCallRequest, current_user: dict =
             
             call_id = cursor.lastrowid
             conn.commit()
+            participant_ids = fetch_user_ids(cursor, [current_user['email'], call_request.recipient_email])
+        
+        emit_event(CallStateEvent(call_id=call_id, state='pending', changed_by=current_user['email'], timestamp=current_time),
+                   user_ids=participant_ids)
         
         # Send email notification to recipient
         call_details = {
@@ -5423,13 +8846,14 @@ async def schedule_call(call_request: ScheduleCallRequest, current_user: dict =
         raise HTTPException(status_code=500, detail='An error occurred while scheduling the call')
 
 @app.get("/api/calls/pending")
-async def get_pending_calls(current_user: dict = Depends(get_current_user)):
+@offload_db
+def get_pending_calls(current_user: dict = Depends(get_current_user_async)):
     """Get pending call invitations for the current user"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get calls where user is the recipient
@@ -5461,13 +8885,14 @@ async def get_pending_calls(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail='An error occurred while retrieving pending calls')
 
 @app.post("/api/calls/{call_id}/respond")
-async def respond_to_call(call_id: int, response: CallResponse, current_user: dict = Depends(get_current_user)):
+@offload_db
+def respond_to_call(call_id: int, response: CallResponse, current_user: dict = Depends(get_current_user_async)):
     """Accept or reject a call invitation"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Verify call exists and user is the recipient
@@ -5507,6 +8932,8 @@ async def respond_to_call(call_id: int, response: CallResponse, current_user: di
                 """, (call_id, session_token))
                 
                 conn.commit()
+                emit_event(CallStateEvent(call_id=call_id, state='accepted', changed_by=current_user['email'], timestamp=current_time),
+                           user_ids=fetch_user_ids(cursor, [caller_email, recipient_email]))
                 
                 # Send acceptance notification to caller
                 send_call_notification_email(caller_email, 'call_accepted', {
@@ -5528,6 +8955,8 @@ async def respond_to_call(call_id: int, response: CallResponse, current_user: di
                 """, (current_time, call_id))
                 
                 conn.commit()
+                emit_event(CallStateEvent(call_id=call_id, state='rejected', changed_by=current_user['email'], timestamp=current_time),
+                           user_ids=fetch_user_ids(cursor, [caller_email, recipient_email]))
                 
                 # Send rejection notification to caller
                 send_call_notification_email(caller_email, 'call_rejected', {
@@ -5547,13 +8976,14 @@ async def respond_to_call(call_id: int, response: CallResponse, current_user: di
         raise HTTPException(status_code=500, detail='An error occurred while responding to the call')
 
 @app.get("/api/calls/scheduled")
-async def get_scheduled_calls(current_user: dict = Depends(get_current_user)):
+@offload_db
+def get_scheduled_calls(current_user: dict = Depends(get_current_user_async)):
     """Get all scheduled calls for the current user"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get calls where user is either caller or recipient
@@ -5605,13 +9035,14 @@ async def get_scheduled_calls(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail='An error occurred while retrieving scheduled calls')
 
 @app.post("/api/calls/{call_id}/join")
-async def join_call(call_id: int, current_user: dict = Depends(get_current_user)):
+@offload_db
+def join_call(call_id: int, current_user: dict = Depends(get_current_user_async)):
     """Join an active call session"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get call details
@@ -5685,6 +9116,9 @@ async def join_call(call_id: int, current_user: dict = Depends(get_current_user)
                 """, (current_time, session_id))
             
             conn.commit()
+            emit_event(CallStateEvent(call_id=call_id, session_id=session_id, state='active' if both_joined else 'waiting',
+                                      changed_by=current_user['email'], timestamp=current_time),
+                       user_ids=fetch_user_ids(cursor, [caller_email, recipient_email]))
             
             return {
                 'success': True,
@@ -5705,70 +9139,77 @@ async def join_call(call_id: int, current_user: dict = Depends(get_current_user)
         raise HTTPException(status_code=500, detail='An error occurred while joining the call')
 
 @app.post("/api/calls/sessions/{session_id}/transcription")
-async def add_call_transcription(session_id: int, transcription: CallTranscription, current_user: dict = Depends(get_current_user)):
+async def add_call_transcription(session_id: int, transcription: CallTranscription, current_user: dict = Depends(get_current_user_async)):
     """Add transcription text from the call"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
         # Verify user is part of this call session
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT sc.caller_email, sc.recipient_email, cs.status
-                FROM call_sessions cs
-                JOIN scheduled_calls sc ON cs.scheduled_call_id = sc.id
-                WHERE cs.id = ?
-            """, (session_id,))
-            result = cursor.fetchone()
-            
-            if not result:
-                raise HTTPException(status_code=404, detail="Call session not found")
-            
-            caller_email, recipient_email, session_status = result
-            
-            if current_user['email'] not in [caller_email, recipient_email]:
-                raise HTTPException(status_code=403, detail="You are not part of this call")
-            
-            if session_status != 'active':
-                raise HTTPException(status_code=400, detail="Call is not active")
-            
-            # Check for policy violations using existing AI system
-            chatbot = ChatbotModule()
-            orders_text = ""  # Could load from database if needed
-            
-            # Use existing message evaluation system to check for violations
-            evaluation_result = chatbot.evaluate_message(
-                transcription.transcript_text,
-                orders_text,
-                'Father' if current_user['email'] == caller_email else 'Mother',
-                'Mother' if current_user['email'] == caller_email else 'Father'
+        def get_call_participants():
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT sc.caller_email, sc.recipient_email, cs.status
+                    FROM call_sessions cs
+                    JOIN scheduled_calls sc ON cs.scheduled_call_id = sc.id
+                    WHERE cs.id = ?
+                """, (session_id,))
+                return cursor.fetchone()
+        
+        result = await run_db(get_call_participants)
+        
+        if not result:
+            raise HTTPException(status_code=404, detail="Call session not found")
+        
+        caller_email, recipient_email, session_status = result
+        
+        if current_user['email'] not in [caller_email, recipient_email]:
+            raise HTTPException(status_code=403, detail="You are not part of this call")
+        
+        if session_status != 'active':
+            raise HTTPException(status_code=400, detail="Call is not active")
+        
+        # Check for policy violations using existing AI system
+        chatbot = ChatbotModule()
+        orders_text = ""  # Could load from database if needed
+        
+        # Use existing message evaluation system to check for violations
+        evaluation_result = await chatbot.evaluate_message(
+            transcription.transcript_text,
+            orders_text,
+            'Father' if current_user['email'] == caller_email else 'Mother',
+            'Mother' if current_user['email'] == caller_email else 'Father'
+        )
+        
+        violation_detected = evaluation_result != transcription.transcript_text
+        
+        # Store transcription with violation flag (but don't end call)
+        def save_transcription():
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO call_transcriptions (call_session_id, speaker, transcript_text, 
+                                                   timestamp, confidence_score, is_final, 
+                                                   violation_detected, ai_analysis)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (session_id, transcription.speaker, transcription.transcript_text,
+                      datetime.now().strftime("%Y-%m-%d %H:%M:%S"), transcription.confidence_score,
+                      transcription.is_final, violation_detected, 
+                      "Policy violation detected" if violation_detected else "Clean"))
+                conn.commit()
+        
+        await run_db(save_transcription)
+        
+        # Log violation but continue call (no automatic termination)
+        return {
+            'success': True,
+            'violation_detected': violation_detected,
+            'call_ended': False,  # Never auto-end calls
+            'message': 'Transcription processed successfully' + (
+                ' - Policy concern noted' if violation_detected else ''
             )
-            
-            violation_detected = evaluation_result != transcription.transcript_text
-            
-            # Store transcription with violation flag (but don't end call)
-            cursor.execute("""
-                INSERT INTO call_transcriptions (call_session_id, speaker, transcript_text, 
-                                               timestamp, confidence_score, is_final, 
-                                               violation_detected, ai_analysis)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (session_id, transcription.speaker, transcription.transcript_text,
-                  datetime.now().strftime("%Y-%m-%d %H:%M:%S"), transcription.confidence_score,
-                  transcription.is_final, violation_detected, 
-                  "Policy violation detected" if violation_detected else "Clean"))
-            
-            conn.commit()
-            
-            # Log violation but continue call (no automatic termination)
-            return {
-                'success': True,
-                'violation_detected': violation_detected,
-                'call_ended': False,  # Never auto-end calls
-                'message': 'Transcription processed successfully' + (
-                    ' - Policy concern noted' if violation_detected else ''
-                )
-            }
+        }
             
     except HTTPException:
         raise
@@ -5777,13 +9218,14 @@ async def add_call_transcription(session_id: int, transcription: CallTranscripti
         raise HTTPException(status_code=500, detail='An error occurred while processing transcription')
 
 @app.post("/api/calls/sessions/{session_id}/report")
-async def report_call_violation(session_id: int, report: CallReport, current_user: dict = Depends(get_current_user)):
+@offload_db
+def report_call_violation(session_id: int, report: CallReport, current_user: dict = Depends(get_current_user_async)):
     """Report a policy violation during a call"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Verify user is part of this call session
@@ -5841,7 +9283,7 @@ async def report_call_violation(session_id: int, report: CallReport, current_use
         logger.error(f"Error reporting call violation: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while submitting the report')
 
-def analyze_call_with_ai(session_id: int, call_transcriptions: list, reports: list) -> dict:
+async def analyze_call_with_ai(session_id: int, call_transcriptions: list, reports: list) -> dict:
     """Analyze complete call transcript and reports using AI"""
     try:
         chatbot = ChatbotModule()
@@ -5909,15 +9351,13 @@ def analyze_call_with_ai(session_id: int, call_transcriptions: list, reports: li
         """
 
         # Generate AI response
-        response = client.messages.create(
+        response_text = await llm_gateway.complete(
             model=chatbot.model,
             max_tokens=2000,
             temperature=0.2,
             messages=[{"role": "user", "content": analysis_prompt}]
         )
         
-        response_text = ' '.join([block.text for block in response.content])
-        
         # Try to parse JSON response
         try:
             analysis_data = json.loads(response_text)
@@ -5964,131 +9404,142 @@ def analyze_call_with_ai(session_id: int, call_transcriptions: list, reports: li
         }
 
 @app.post("/api/calls/sessions/{session_id}/end")
-async def end_call(session_id: int, end_request: CallEndRequest, current_user: dict = Depends(get_current_user)):
+async def end_call(session_id: int, end_request: CallEndRequest, current_user: dict = Depends(get_current_user_async)):
     """End a call session"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            
-            # Verify user is part of this call session
-            cursor.execute("""
-                SELECT sc.caller_email, sc.recipient_email, cs.call_started_at, cs.status
-                FROM call_sessions cs
-                JOIN scheduled_calls sc ON cs.scheduled_call_id = sc.id
-                WHERE cs.id = ?
-            """, (session_id,))
-            result = cursor.fetchone()
-            
-            if not result:
-                raise HTTPException(status_code=404, detail="Call session not found")
-            
-            caller_email, recipient_email, call_started_at, session_status = result
-            
-            if current_user['email'] not in [caller_email, recipient_email]:
-                raise HTTPException(status_code=403, detail="You are not part of this call")
-            
-            if session_status != 'active':
-                raise HTTPException(status_code=400, detail="Call is not active")
-            
-            # Calculate call duration
-            end_time = datetime.now()
-            start_time = datetime.strptime(call_started_at, "%Y-%m-%d %H:%M:%S")
-            duration_seconds = int((end_time - start_time).total_seconds())
-            
-            # End the call
-            cursor.execute("""
-                UPDATE call_sessions 
-                SET status = 'ended', call_ended_at = ?, ended_by = ?, 
-                    end_reason = ?, duration_seconds = ?
-                WHERE id = ?
-            """, (end_time.strftime("%Y-%m-%d %H:%M:%S"), current_user['fullName'],
-                  end_request.end_reason, duration_seconds, session_id))
-            
-            # Update scheduled call status
-            cursor.execute("""
-                UPDATE scheduled_calls 
-                SET status = 'completed', completed_date = ?
-                WHERE id = (SELECT scheduled_call_id FROM call_sessions WHERE id = ?)
-            """, (end_time.strftime("%Y-%m-%d %H:%M:%S"), session_id))
-            
-            # Get transcriptions and reports for AI analysis
-            cursor.execute("""
-                SELECT speaker, transcript_text, timestamp, confidence_score, 
-                       violation_detected, violation_type, ai_analysis
-                FROM call_transcriptions 
-                WHERE call_session_id = ? AND is_final = 1
-                ORDER BY timestamp
-            """, (session_id,))
-            
-            transcriptions = []
-            for row in cursor.fetchall():
-                transcriptions.append({
-                    'speaker': row[0],
-                    'transcript_text': row[1],
-                    'timestamp': row[2],
-                    'confidence_score': row[3],
-                    'violation_detected': bool(row[4]),
-                    'violation_type': row[5],
-                    'ai_analysis': row[6]
-                })
-            
-            # Get manual reports
-            cursor.execute("""
-                SELECT reported_by, report_type, reason, description, timestamp
-                FROM call_reports
-                WHERE call_session_id = ?
-                ORDER BY timestamp
-            """, (session_id,))
-            
-            reports = []
-            for row in cursor.fetchall():
-                reports.append({
-                    'reported_by': row[0],
-                    'report_type': row[1],
-                    'reason': row[2],
-                    'description': row[3],
-                    'timestamp': row[4]
-                })
-            
-            conn.commit()
-            
-            # Perform AI analysis of the complete call
-            if transcriptions:  # Only analyze if there were transcriptions
-                analysis_result = analyze_call_with_ai(session_id, transcriptions, reports)
+        def close_session():
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
                 
-                # Store analysis results
+                # Verify user is part of this call session
                 cursor.execute("""
-                    INSERT INTO call_analyses (call_session_id, violations_detected, violation_details,
-                                             call_summary, content_analysis, safety_score, 
-                                             recommendations, analysis_date)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (session_id, analysis_result['violations_detected'], 
-                      json.dumps(analysis_result['violation_details']),
-                      analysis_result['call_summary'], analysis_result['content_analysis'],
-                      analysis_result['safety_score'], json.dumps(analysis_result['recommendations']),
-                      datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+                    SELECT sc.caller_email, sc.recipient_email, cs.call_started_at, cs.status
+                    FROM call_sessions cs
+                    JOIN scheduled_calls sc ON cs.scheduled_call_id = sc.id
+                    WHERE cs.id = ?
+                """, (session_id,))
+                result = cursor.fetchone()
                 
-                conn.commit()
+                if not result:
+                    raise HTTPException(status_code=404, detail="Call session not found")
                 
-                return {
-                    'success': True,
-                    'duration_seconds': duration_seconds,
-                    'message': 'Call ended successfully',
-                    'analysis_completed': True,
-                    'call_summary': analysis_result['call_summary'],
-                    'safety_score': analysis_result['safety_score'],
-                    'violations_detected': analysis_result['violations_detected']
-                }
-            else:
-                return {
-                    'success': True,
-                    'duration_seconds': duration_seconds,
-                    'message': 'Call ended successfully',
-                    'analysis_completed': False
-                }
+                caller_email, recipient_email, call_started_at, session_status = result
+                
+                if current_user['email'] not in [caller_email, recipient_email]:
+                    raise HTTPException(status_code=403, detail="You are not part of this call")
+                
+                if session_status != 'active':
+                    raise HTTPException(status_code=400, detail="Call is not active")
+                
+                # Calculate call duration
+                end_time = datetime.now()
+                start_time = datetime.strptime(call_started_at, "%Y-%m-%d %H:%M:%S")
+                duration_seconds = int((end_time - start_time).total_seconds())
+                
+                # End the call
+                cursor.execute("""
+                    UPDATE call_sessions 
+                    SET status = 'ended', call_ended_at = ?, ended_by = ?, 
+                        end_reason = ?, duration_seconds = ?
+                    WHERE id = ?
+                """, (end_time.strftime("%Y-%m-%d %H:%M:%S"), current_user['fullName'],
+                      end_request.end_reason, duration_seconds, session_id))
+                
+                # Update scheduled call status
+                cursor.execute("""
+                    UPDATE scheduled_calls 
+                    SET status = 'completed', completed_date = ?
+                    WHERE id = (SELECT scheduled_call_id FROM call_sessions WHERE id = ?)
+                """, (end_time.strftime("%Y-%m-%d %H:%M:%S"), session_id))
+                
+                # Get transcriptions and reports for AI analysis
+                cursor.execute("""
+                    SELECT speaker, transcript_text, timestamp, confidence_score, 
+                           violation_detected, violation_type, ai_analysis
+                    FROM call_transcriptions 
+                    WHERE call_session_id = ? AND is_final = 1
+                    ORDER BY timestamp
+                """, (session_id,))
+                
+                transcriptions = []
+                for row in cursor.fetchall():
+                    transcriptions.append({
+                        'speaker': row[0],
+                        'transcript_text': row[1],
+                        'timestamp': row[2],
+                        'confidence_score': row[3],
+                        'violation_detected': bool(row[4]),
+                        'violation_type': row[5],
+                        'ai_analysis': row[6]
+                    })
+                
+                # Get manual reports
+                cursor.execute("""
+                    SELECT reported_by, report_type, reason, description, timestamp
+                    FROM call_reports
+                    WHERE call_session_id = ?
+                    ORDER BY timestamp
+                """, (session_id,))
+                
+                reports = []
+                for row in cursor.fetchall():
+                    reports.append({
+                        'reported_by': row[0],
+                        'report_type': row[1],
+                        'reason': row[2],
+                        'description': row[3],
+                        'timestamp': row[4]
+                    })
+                
+                conn.commit()
+                emit_event(CallStateEvent(session_id=session_id, state='ended', changed_by=current_user['email'],
+                                          timestamp=end_time.strftime("%Y-%m-%d %H:%M:%S")),
+                           user_ids=fetch_user_ids(cursor, [caller_email, recipient_email]))
+                return duration_seconds, transcriptions, reports
+        
+        duration_seconds, transcriptions, reports = await run_db(close_session)
+        
+        # Perform AI analysis of the complete call
+        if transcriptions:  # Only analyze if there were transcriptions
+            analysis_result = await analyze_call_with_ai(session_id, transcriptions, reports)
+            
+            # Store analysis results
+            def save_analysis():
+                with get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        INSERT INTO call_analyses (call_session_id, violations_detected, violation_details,
+                                                 call_summary, content_analysis, safety_score, 
+                                                 recommendations, analysis_date)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (session_id, analysis_result['violations_detected'], 
+                          json.dumps(analysis_result['violation_details']),
+                          analysis_result['call_summary'], analysis_result['content_analysis'],
+                          analysis_result['safety_score'], json.dumps(analysis_result['recommendations']),
+                          datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+                    conn.commit()
+            
+            await run_db(save_analysis)
+            
+            return {
+                'success': True,
+                'duration_seconds': duration_seconds,
+                'message': 'Call ended successfully',
+                'analysis_completed': True,
+                'call_summary': analysis_result['call_summary'],
+                'safety_score': analysis_result['safety_score'],
+                'violations_detected': analysis_result['violations_detected']
+            }
+        else:
+            return {
+                'success': True,
+                'duration_seconds': duration_seconds,
+                'message': 'Call ended successfully',
+                'analysis_completed': False
+            }
             
     except HTTPException:
         raise
@@ -6097,13 +9548,14 @@ async def end_call(session_id: int, end_request: CallEndRequest, current_user: d
         raise HTTPException(status_code=500, detail='An error occurred while ending the call')
 
 @app.get("/api/calls/sessions/{session_id}/transcription")
-async def get_call_transcription(session_id: int, current_user: dict = Depends(get_current_user)):
+@offload_db
+def get_call_transcription(session_id: int, current_user: dict = Depends(get_current_user_async)):
     """Get full transcription of a call session"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Verify user is part of this call session
@@ -6153,13 +9605,14 @@ async def get_call_transcription(session_id: int, current_user: dict = Depends(g
         raise HTTPException(status_code=500, detail='An error occurred while retrieving transcription')
 
 @app.get("/api/calls/sessions/{session_id}/analysis")
-async def get_call_analysis(session_id: int, current_user: dict = Depends(get_current_user)):
+@offload_db
+def get_call_analysis(session_id: int, current_user: dict = Depends(get_current_user_async)):
     """Get AI analysis results for a completed call"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Verify user is part of this call session
@@ -6222,13 +9675,14 @@ async def get_call_analysis(session_id: int, current_user: dict = Depends(get_cu
         raise HTTPException(status_code=500, detail='An error occurred while retrieving analysis')
 
 @app.get("/api/calls/history")
-async def get_call_history(current_user: dict = Depends(get_current_user)):
+@offload_db
+def get_call_history(current_user: dict = Depends(get_current_user_async)):
     """Get call history for the current user"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get completed calls with analysis data
@@ -6287,7 +9741,8 @@ class ParentSwitchRequest(BaseModel):
 
 # Get user's relationships (co-parents)  
 @app.get("/api/user/relationships")
-async def get_user_relationships(authorization: Optional[str] = Header(None)):
+@offload_db
+def get_user_relationships(authorization: Optional[str] = Header(None)):
     """Get all relationships for the current user"""
     if not authorization or not authorization.startswith('Bearer '):
         raise HTTPException(status_code=401, detail="Authentication token required")
@@ -6295,7 +9750,7 @@ async def get_user_relationships(authorization: Optional[str] = Header(None)):
     token = authorization.split(' ')[1]
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get user ID from token
@@ -6342,7 +9797,8 @@ async def get_user_relationships(authorization: Optional[str] = Header(None)):
 
 # Get data for specific relationship
 @app.post("/api/user/switch-parent")
-async def switch_parent_context(request: ParentSwitchRequest, authorization: Optional[str] = Header(None)):
+@offload_db
+def switch_parent_context(request: ParentSwitchRequest, authorization: Optional[str] = Header(None)):
     """Switch to a different co-parent relationship context"""
     if not authorization or not authorization.startswith('Bearer '):
         raise HTTPException(status_code=401, detail="Authentication token required")
@@ -6350,7 +9806,7 @@ async def switch_parent_context(request: ParentSwitchRequest, authorization: Opt
     token = authorization.split(' ')[1]
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get user ID from token
@@ -6401,7 +9857,8 @@ class SubscriptionUpdate(BaseModel):
     subscription_type: str  # 'trial', 'basic', 'premium'
 
 @app.get("/api/user/subscription")
-async def get_subscription_info(authorization: Optional[str] = Header(None)):
+@offload_db
+def get_subscription_info(authorization: Optional[str] = Header(None)):
     """Get current subscription information"""
     if not authorization or not authorization.startswith('Bearer '):
         raise HTTPException(status_code=401, detail="Authentication token required")
@@ -6409,7 +9866,7 @@ async def get_subscription_info(authorization: Optional[str] = Header(None)):
     token = authorization.split(' ')[1]
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get user ID and subscription info from token
@@ -6473,7 +9930,8 @@ async def get_subscription_info(authorization: Optional[str] = Header(None)):
         raise HTTPException(status_code=500, detail="Failed to retrieve subscription information")
 
 @app.post("/api/user/subscription/update")
-async def update_subscription(request: SubscriptionUpdate, authorization: Optional[str] = Header(None)):
+@offload_db
+def update_subscription(request: SubscriptionUpdate, authorization: Optional[str] = Header(None)):
     """Update user subscription"""
     if not authorization or not authorization.startswith('Bearer '):
         raise HTTPException(status_code=401, detail="Authentication token required")
@@ -6481,7 +9939,7 @@ async def update_subscription(request: SubscriptionUpdate, authorization: Option
     token = authorization.split(' ')[1]
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get user ID from token
@@ -6516,7 +9974,8 @@ async def update_subscription(request: SubscriptionUpdate, authorization: Option
         raise HTTPException(status_code=500, detail="Failed to update subscription")
 
 @app.post("/api/user/subscription/unsubscribe") 
-async def unsubscribe_user(authorization: Optional[str] = Header(None)):
+@offload_db
+def unsubscribe_user(authorization: Optional[str] = Header(None)):
     """Unsubscribe user (downgrade to basic)"""
     if not authorization or not authorization.startswith('Bearer '):
         raise HTTPException(status_code=401, detail="Authentication token required")
@@ -6524,7 +9983,7 @@ async def unsubscribe_user(authorization: Optional[str] = Header(None)):
     token = authorization.split(' ')[1]
     
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Get user ID from token
@@ -6562,10 +10021,11 @@ async def unsubscribe_user(authorization: Optional[str] = Header(None)):
 
 # Enhanced conversation endpoint with relationship filtering
 @app.get("/api/conversation")
-async def get_conversations_for_relationship(relationship_id: Optional[int] = None, authorization: Optional[str] = Header(None)):
+@offload_db
+def get_conversations_for_relationship(relationship_id: Optional[int] = None, authorization: Optional[str] = Header(None)):
     """Get conversations filtered by relationship"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             if relationship_id:
@@ -6584,67 +10044,67 @@ async def get_conversations_for_relationship(relationship_id: Optional[int] = No
         raise HTTPException(status_code=500, detail='An error occurred while retrieving conversations')
 
 # Enhanced calendar endpoint with relationship filtering and soft deletes
+CALENDAR_EVENT_COLUMNS = """id, event_label, event_time, repeat_occurrence, created_by, created_date,
+                           is_active, deleted_date, deleted_by"""
+
+def calendar_event_to_dict(row):
+    return {
+        'id': row[0],
+        'title': row[1], 
+        'datetime': row[2],
+        'recurrence': row[3],
+        'createdBy': row[4],
+        'createdDate': row[5],
+        'is_active': row[6],
+        'deleted_date': row[7],
+        'deleted_by': row[8],
+        'is_deleted': not row[6]  # is_active = FALSE means deleted
+    }
+
 @app.get("/api/calendar")
-async def get_calendar_events(relationship_id: Optional[int] = None, show_deleted: bool = True):
+@offload_db
+def get_calendar_events(relationship_id: Optional[int] = None, show_deleted: bool = True):
     """Get calendar events with soft delete support"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             if relationship_id:
                 if show_deleted:
                     # Show all events including soft-deleted ones
-                    cursor.execute("""
-                        SELECT id, event_label, event_time, repeat_occurrence, created_by, created_date,
-                               is_active, deleted_date, deleted_by
+                    cursor.execute(f"""
+                        SELECT {CALENDAR_EVENT_COLUMNS}
                         FROM calendar 
                         WHERE relationship_id = ?
                         ORDER BY event_time ASC
                     """, (relationship_id,))
                 else:
                     # Show only active events
-                    cursor.execute("""
-                        SELECT id, event_label, event_time, repeat_occurrence, created_by, created_date,
-                               is_active, deleted_date, deleted_by
+                    cursor.execute(f"""
+                        SELECT {CALENDAR_EVENT_COLUMNS}
                         FROM calendar 
                         WHERE relationship_id = ? AND is_active = TRUE
                         ORDER BY event_time ASC
                     """, (relationship_id,))
             else:
-                cursor.execute("""
-                    SELECT id, event_label, event_time, repeat_occurrence, created_by, created_date,
-                           is_active, deleted_date, deleted_by
+                cursor.execute(f"""
+                    SELECT {CALENDAR_EVENT_COLUMNS}
                     FROM calendar 
                     ORDER BY event_time ASC
                 """)
             
-            events = []
-            for row in cursor.fetchall():
-                event = {
-                    'id': row[0],
-                    'title': row[1], 
-                    'datetime': row[2],
-                    'recurrence': row[3],
-                    'createdBy': row[4],
-                    'createdDate': row[5],
-                    'is_active': row[6],
-                    'deleted_date': row[7],
-                    'deleted_by': row[8],
-                    'is_deleted': not row[6]  # is_active = FALSE means deleted
-                }
-                events.append(event)
-                
-            return events
+            return [calendar_event_to_dict(row) for row in cursor.fetchall()]
             
     except Exception as e:
         logger.error(f"Error retrieving calendar events: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while retrieving calendar data')
 
 @app.delete("/api/calendar/{event_id}")
-async def soft_delete_calendar_event(event_id: int, created_by: str):
+@offload_db
+def soft_delete_calendar_event(event_id: int, created_by: str):
     """Soft delete calendar event - mark as deleted but keep in database"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Soft delete: mark as inactive and record deletion details
@@ -6666,6 +10126,128 @@ async def soft_delete_calendar_event(event_id: int, created_by: str):
         logger.error(f"Error soft deleting calendar event: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while deleting calendar event')
 
+# Delta sync over the change_log table
+RELATIONSHIP_SCOPE = """(relationship_id IS NULL OR relationship_id IN
+    (SELECT id FROM user_relationships WHERE :user_id IN (user_id, other_parent_id)))"""
+
+# Whether the caller may see a hard delete, from its logged (relationship, owner, shared with) scope;
+# each mirrors the visibility clause of its feed's query
+def relationship_delete_visible(scope, viewer):
+    return scope[0] is None or scope[0] in viewer['relationship_ids']
+
+def owned_delete_visible(scope, viewer):
+    return scope[1] in (viewer['name'], viewer['email'])
+
+def vault_delete_visible(scope, viewer):
+    return owned_delete_visible(scope, viewer) or scope[2] == '*' or viewer['email'] in (scope[2] or '')
+
+# Feed name -> (table, query for the changed rows visible to the caller, row serializer, delete visibility)
+SYNC_FEEDS = {
+    'messages': ('messages', MESSAGE_TIMELINE_SELECT + f"""
+        WHERE m.id IN ({{ids}}) AND m.conversation_id IN (SELECT id FROM conversations WHERE {RELATIONSHIP_SCOPE})""",
+        lambda cursor, row: row, relationship_delete_visible),
+    'calendar': ('calendar', f"SELECT {CALENDAR_EVENT_COLUMNS} FROM calendar WHERE id IN ({{ids}}) AND {RELATIONSHIP_SCOPE}",
+                 lambda cursor, row: calendar_event_to_dict(row), relationship_delete_visible),
+    'payments': ('financial', f"SELECT {PAYMENT_COLUMNS} FROM financial WHERE id IN ({{ids}}) AND {RELATIONSHIP_SCOPE}",
+                 lambda cursor, row: payment_to_dict(row), relationship_delete_visible),
+    'info_library': ('info_library', f"SELECT {INFO_LIBRARY_COLUMNS} FROM info_library WHERE id IN ({{ids}}) AND {RELATIONSHIP_SCOPE}",
+                     lambda cursor, row: info_library_entry_to_dict(row), relationship_delete_visible),
+    'unalterable_records': ('unalterable_records',
+                            f"SELECT {UNALTERABLE_RECORD_COLUMNS} FROM unalterable_records WHERE id IN ({{ids}}) AND {RELATIONSHIP_SCOPE}",
+                            lambda cursor, row: unalterable_record_to_dict(row), relationship_delete_visible),
+    'personal_journal': ('personal_journal',
+                         f"SELECT {JOURNAL_ENTRY_COLUMNS} FROM personal_journal WHERE id IN ({{ids}}) AND created_by IN (:name, :email)",
+                         journal_entry_to_dict, owned_delete_visible),
+    'vault_files': ('vault_files', f"""SELECT {VAULT_FILE_COLUMNS} FROM vault_files WHERE id IN ({{ids}})
+                    AND (uploaded_by IN (:name, :email) OR is_shared = 1 OR shared_with LIKE :shared_with)""",
+                    vault_file_to_dict, vault_delete_visible),
+}
+
+def read_change_log(cursor, since, limit):
+    """Return (reset, next_since, has_more, {table: {row_id: (operation, scope)}}) for changes after ``since``.
+
+    Several changes to one row collapse to the last. ``reset`` means ``since`` is 0, unknown or older than
+    the retained log, so the client must reload in full and continue from ``next_since``.
+    """
+    cursor.execute("SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'change_log'), 0), MIN(seq) FROM change_log")
+    latest, oldest = cursor.fetchone()
+    if since <= 0 or since > latest or since < (oldest or latest + 1) - 1:
+        return True, latest, False, {}
+    
+    cursor.execute("""
+        SELECT seq, table_name, row_id, operation, relationship_id, owner, shared_with
+        FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?
+    """, (since, limit))
+    rows = cursor.fetchall()
+    changed = {}
+    for seq, table, row_id, operation, *scope in rows:
+        changed.setdefault(table, {})[row_id] = (operation, scope)
+    next_since = rows[-1][0] if rows else since
+    return False, next_since, len(rows) == limit, changed
+
+def prune_change_log():
+    """Drop change_log rows older than the retention window; clients behind it are told to reload"""
+    cutoff = (datetime.now() - timedelta(days=SYNC_RETENTION_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    with get_db_connection() as conn:
+        conn.execute("DELETE FROM change_log WHERE changed_at < ?", (cutoff,))
+        conn.commit()
+
+@app.on_event("startup")
+async def start_change_log_pruning():
+    schedule_maintenance(prune_change_log, "pruning change log")
+    try:
+        await run_db(prune_change_log)
+    except Exception as e:
+        logger.error(f"Error pruning change log: {str(e)}")
+
+@app.get("/api/sync")
+@offload_db
+def sync_changes(since: int = 0, tables: Optional[str] = None, limit: int = SYNC_PAGE_SIZE,
+                 authorization: Optional[str] = Header(None)):
+    """Return rows inserted, updated or soft-deleted, and ids hard-deleted, after change sequence ``since``"""
+    current_user = get_current_user(authorization)
+    if not current_user:
+        raise HTTPException(status_code=401, detail='Authentication required')
+    
+    feeds = SYNC_FEEDS if not tables else {name: SYNC_FEEDS[name] for name in tables.split(',') if name in SYNC_FEEDS}
+    limit = max(1, min(limit, SYNC_PAGE_SIZE))
+    
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            reset, next_since, has_more, changed = read_change_log(cursor, since, limit)
+            
+            cursor.execute("SELECT language_code FROM user_settings WHERE user_id = ?", (current_user['id'],))
+            lang_result = cursor.fetchone()
+            cursor.execute("SELECT id FROM user_relationships WHERE ? IN (user_id, other_parent_id)", (current_user['id'],))
+            params = {
+                'user_id': current_user['id'],
+                'name': current_user.get('fullName'),
+                'email': current_user.get('email'),
+                'shared_with': f"%{current_user.get('email')}%",
+                'language': lang_result[0] if lang_result else 'en',
+                'relationship_ids': {row[0] for row in cursor.fetchall()}
+            }
+            
+            changes = {}
+            for name, (table, query, serialize, delete_visible) in feeds.items():
+                operations = changed.get(table, {})
+                # A deleted row can no longer be read, so its logged scope decides whether the caller sees the id
+                deleted = [row_id for row_id, (operation, scope) in operations.items()
+                           if operation == 'delete' and delete_visible(scope, params)]
+                live_ids = [row_id for row_id, (operation, _) in operations.items() if operation != 'delete']
+                upserted = []
+                if live_ids:
+                    cursor.execute(query.format(ids=','.join(str(int(row_id)) for row_id in live_ids)), params)
+                    upserted = [serialize(cursor, row) for row in cursor.fetchall()]
+                if upserted or deleted:
+                    changes[name] = {'upserted': upserted, 'deleted': deleted}
+        
+        return {'reset': reset, 'since': since, 'next_since': next_since, 'has_more': has_more, 'changes': changes}
+    except Exception as e:
+        logger.error(f"Error reading sync changes: {str(e)}")
+        raise HTTPException(status_code=500, detail='An error occurred while reading changes')
+
 # Document serving endpoint
 @app.get("/api/documents/{filename}")
 async def serve_document(filename: str):
@@ -6694,6 +10276,12 @@ async def serve_document(filename: str):
         logger.error(f"Error serving document: {str(e)}")
         raise HTTPException(status_code=500, detail='An error occurred while serving the document')
 
+# Bring the schema up to date once every migration and the helpers it uses are defined.
+# CPU workers share the server's database and leave this to the server.
+if not cpu_worker_process:
+    init_db()
+    create_default_users()
+
 # Remove the uvicorn.run call since supervisor will handle it
 # if __name__ == "__main__":
 #     logger.info("Starting Safespace FastAPI server")
@@ -0,0 +1,63 @@
+"""Shared test setup.
+
+The server is pointed at a copy of the bundled sample database, which predates every schema migration,
+so importing it runs the whole migration chain on a legacy database. Nothing under the repo is written.
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+LEGACY_DATABASE = BACKEND_DIR.parent / "Client_Databases" / "client_database.db"
+
+TMP_DIR = tempfile.mkdtemp(prefix="safespace-tests-")
+DB_PATH = os.path.join(TMP_DIR, "client_database.db")
+shutil.copyfile(LEGACY_DATABASE, DB_PATH)
+
+# Tables and row ids of the legacy database, read before the server migrates it
+legacy = sqlite3.connect(DB_PATH)
+LEGACY_TABLES = {row[0] for row in legacy.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+LEGACY_ROWS = {table: {row[0] for row in legacy.execute(f"SELECT id FROM {table}")}
+               for table in ("users", "conversations", "messages")}
+legacy.close()
+
+os.environ["SAFESPACE_DB_PATH"] = DB_PATH
+os.environ["SAFESPACE_EXPORT_CACHE_DIR"] = os.path.join(TMP_DIR, "export_cache")
+sys.path.insert(0, str(BACKEND_DIR))
+
+import server  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(server.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def sign_up(client):
+    """Sign up a parent and return (auth headers, user row id, relationship id)"""
+    def sign_up(email, other_parent_email):
+        client.post("/api/auth/signup", json={
+            "email": email, "password": "Passw0rd!", "fullName": email.split("@")[0].title(), "role": "father",
+            "otherParentName": "Other Parent", "otherParentEmail": other_parent_email, "otherParentRole": "mother",
+            "children": [], "phoneNumber": "0400000000", "address": "1 Test St", "postcode": "2000",
+        })
+        response = client.post("/api/auth/signin", json={"email": email, "password": "Passw0rd!"})
+        assert response.status_code == 200, response.text
+        with server.get_db_connection() as conn:
+            user_id = conn.execute("SELECT id FROM users WHERE email = ?", (email,)).fetchone()[0]
+            relationship_id = conn.execute("SELECT id FROM user_relationships WHERE user_id = ?", (user_id,)).fetchone()[0]
+        return {"Authorization": f"Bearer {response.json()['token']}"}, user_id, relationship_id
+    return sign_up
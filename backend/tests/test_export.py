@@ -0,0 +1,79 @@
+import hashlib
+import io
+import json
+
+import pytest
+from PyPDF2 import PdfReader
+
+import server
+
+
+def baseline_hash(conversation, rows):
+    """The conversation hash as computed before exports were streamed"""
+    return hashlib.sha256(json.dumps({
+        'conversation_id': conversation[0],
+        'title': conversation[1],
+        'messages': [{'id': msg_id, 'content': content, 'timestamp': timestamp} for msg_id, content, timestamp in rows],
+    }, sort_keys=True).encode()).hexdigest()
+
+
+@pytest.mark.parametrize("conversation, rows", [
+    ((1, "Kids"), []),
+    ((2, "Kids (pickup)"), [(10, "See you at five", "2024-01-01 10:00:00")]),
+    ((3, 'Quotes "and" \\ slashes'), [(11, 'He said "no" \\ then\nleft', "2024-01-01 10:00:00"),
+                                      (12, None, None)]),
+    ((4, "Ünïcode 学校"), [(13, "¿Mañana? 明天 👍", "2024-01-02 08:30:00"), (14, "", "2024-01-02 08:31:00")]),
+])
+def test_streamed_hash_matches_baseline(conversation, rows):
+    message_ids, digest = server.hash_conversation_messages(conversation, iter(rows))
+    assert list(message_ids) == [row[0] for row in rows]
+    assert digest == baseline_hash(conversation, rows)
+
+
+def message(msg_id, text):
+    return msg_id, "Jane Doe", "original", text, "2024-01-01 10:00:00", "mother", "father"
+
+
+def test_stitched_segments_parse_strictly():
+    segments = [
+        server.render_conversation_segment([message(1, "First <segment> & text " * 40)], 1),
+        server.render_conversation_segment([message(n, "Second segment " * 60) for n in range(2, 12)], 2),
+        server.render_conversation_segment([], 12, footer="Closing statement"),
+    ]
+    pages = sum(len(PdfReader(io.BytesIO(segment)).pages) for segment in segments)
+    stitcher = server.PDFPageStitcher(title="Conversation (1) export")
+    output = stitcher.start()
+    for segment in segments:
+        output += stitcher.add_segment(io.BytesIO(segment))
+    output += stitcher.finish()
+
+    reader = PdfReader(io.BytesIO(output), strict=True)
+    assert len(reader.pages) == pages > len(segments)
+    assert reader.metadata.title == "Conversation (1) export"
+    assert "First <segment> & text" in reader.pages[0].extract_text()
+    assert "Closing statement" in reader.pages[-1].extract_text()
+
+
+def test_exported_conversation_carries_its_hash(client, monkeypatch):
+    monkeypatch.setattr(server, "EXPORT_SEGMENT_MESSAGES", 4)
+    with server.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO conversations (title, date) VALUES ('Export (pickup)', '2024')")
+        conversation_id = cursor.lastrowid
+        cursor.executemany("""
+            INSERT INTO messages (user_name, original_message, rewritten_message, conversation_id, timestamp,
+                                  parental_role, recipient_role)
+            VALUES ('Jane Doe', 'original', ?, ?, ?, 'mother', 'father')
+        """, [(f"Message <{number}> & text", conversation_id, f"2024-01-01 10:{number:02d}:00") for number in range(10)])
+        conn.commit()
+        conversation = cursor.execute("SELECT id, title FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        rows = cursor.execute("""
+            SELECT id, rewritten_message, timestamp FROM messages WHERE conversation_id = ? ORDER BY timestamp, id
+        """, (conversation_id,)).fetchall()
+
+    response = client.post("/api/conversation/export", json={"conversation_id": conversation_id})
+    assert response.status_code == 200, response.text
+    reader = PdfReader(io.BytesIO(response.content), strict=True)
+    text = "".join(page.extract_text() for page in reader.pages).replace("\n", "")
+    assert baseline_hash(conversation, rows) in text
+    assert all(f"Message #{number}" in text for number in range(1, 11))
@@ -0,0 +1,36 @@
+import server
+from conftest import LEGACY_ROWS, LEGACY_TABLES
+
+
+def test_sample_database_predates_migrations():
+    assert "schema_version" not in LEGACY_TABLES
+    assert LEGACY_ROWS["messages"]
+
+
+def test_legacy_database_migrates_to_latest_version():
+    with server.get_db_connection() as conn:
+        versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == [version for version, _, _ in server.SCHEMA_MIGRATIONS]
+
+
+def test_migrations_keep_existing_rows():
+    with server.get_db_connection() as conn:
+        for table, ids in LEGACY_ROWS.items():
+            assert ids <= {row[0] for row in conn.execute(f"SELECT id FROM {table}")}
+
+
+def test_existing_messages_are_indexed_for_search():
+    with server.get_db_connection() as conn:
+        indexed = {row[0] for row in conn.execute("SELECT rowid FROM messages_fts")}
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(messages_fts)")]
+    assert LEGACY_ROWS["messages"] <= indexed
+    assert "translations" not in columns
+
+
+def test_rerunning_migrations_is_a_no_op():
+    with server.get_db_connection() as conn:
+        before = conn.execute("SELECT version, applied_date FROM schema_version ORDER BY version").fetchall()
+    server.init_db()
+    with server.get_db_connection() as conn:
+        assert conn.execute("SELECT version, applied_date FROM schema_version ORDER BY version").fetchall() == before
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
@@ -0,0 +1,86 @@
+import pytest
+
+import server
+
+
+@pytest.fixture(scope="module")
+def conversations():
+    """Two conversations with messages to search, and a Spanish translation of the first message"""
+    with server.get_db_connection() as conn:
+        cursor = conn.cursor()
+        ids = []
+        for title, sender, text, timestamp in (
+            ("Search pickups", "Jane Doe", "Can you do the school pickup on <Friday>?", "2024-02-01 10:00:00"),
+            ("Search holidays", "John Roe", "School holidays start soon", "2024-03-01 10:00:00"),
+        ):
+            cursor.execute("INSERT INTO conversations (title, date) VALUES (?, '2024')", (title,))
+            conversation_id = cursor.lastrowid
+            cursor.execute("""
+                INSERT INTO messages (user_name, original_message, rewritten_message, conversation_id, timestamp)
+                VALUES (?, 'original', ?, ?, ?)
+            """, (sender, text, conversation_id, timestamp))
+            ids.append((conversation_id, cursor.lastrowid))
+        translation = "¿Puedes recoger a los niños de la escuela el viernes?"
+        cursor.execute("""
+            INSERT INTO message_translations (message_id, language_code, original_text, rewritten_text, created_date)
+            VALUES (?, 'es', 'original', ?, '2024')
+        """, (ids[0][1], translation))
+        server.index_message_translation(cursor, cursor.lastrowid, translation, 'es', ids[0][0])
+        conn.commit()
+    return ids
+
+
+def search(client, **query):
+    response = client.post("/api/conversation/search", json=query)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_prefix_matches_rank_and_highlight(client, conversations):
+    (_, pickup), (_, holidays) = conversations
+    results = search(client, query="schoo")
+    assert {result["id"] for result in results} >= {pickup, holidays}
+    snippet = next(result["snippet"] for result in results if result["id"] == pickup)
+    assert "<mark>school</mark>" in snippet
+    assert "&lt;Friday&gt;" in snippet
+
+
+def test_every_word_must_match(client, conversations):
+    (_, pickup), (_, holidays) = conversations
+    ids = {result["id"] for result in search(client, query="school holi")}
+    assert holidays in ids and pickup not in ids
+
+
+def test_filters_narrow_the_results(client, conversations):
+    (pickup_conversation, pickup), (holidays_conversation, holidays) = conversations
+    assert [r["id"] for r in search(client, query="school", conversation_id=holidays_conversation)] == [holidays]
+    assert [r["id"] for r in search(client, query="school", conversation_id=pickup_conversation,
+                                    sender="jan")] == [pickup]
+    assert search(client, query="school", conversation_id=pickup_conversation, sender="john") == []
+    assert search(client, query="school", conversation_id=pickup_conversation, date_from="2024-02-15") == []
+
+
+def test_translations_are_searched_in_their_language(client, conversations):
+    (pickup_conversation, pickup), _ = conversations
+    results = search(client, query="escuelas", language="es", conversation_id=pickup_conversation)
+    assert [result["id"] for result in results] == [pickup]
+    assert results[0]["message"].startswith("¿Puedes")
+    assert search(client, query="escuela", language="en", conversation_id=pickup_conversation) == []
+
+
+def test_deleted_messages_leave_the_index(client, conversations):
+    _, (holidays_conversation, holidays) = conversations
+    with server.get_db_connection() as conn:
+        conn.execute("DELETE FROM messages WHERE id = ?", (holidays,))
+        conn.commit()
+    assert search(client, query="holidays", conversation_id=holidays_conversation) == []
+
+
+def test_query_syntax_is_not_interpreted(client, conversations):
+    assert search(client, query='"); DROP TABLE messages; --') == []
+    assert search(client, query="   ") == []
+
+
+def test_unsupported_language_is_rejected(client, conversations):
+    response = client.post("/api/conversation/search", json={"query": "school", "language": "xx"})
+    assert response.status_code == 400
@@ -0,0 +1,89 @@
+import pytest
+
+import server
+
+
+@pytest.fixture(scope="module")
+def parents(sign_up):
+    """Two parents in separate relationships"""
+    return sign_up("sync.alice@example.com", "sync.alan@example.com"), sign_up("sync.carol@example.com", "sync.colin@example.com")
+
+
+def sync(client, headers, since, **params):
+    response = client.get("/api/sync", params={"since": since, **params}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_sync_requires_sign_in(client):
+    assert client.get("/api/sync").status_code == 401
+
+
+def test_first_sync_asks_for_a_full_reload(client, parents):
+    (alice, _, _), _ = parents
+    feed = sync(client, alice, 0)
+    assert feed["reset"] is True and feed["changes"] == {}
+    assert feed["next_since"] > 0
+    assert sync(client, alice, feed["next_since"])["reset"] is False
+
+
+def test_changes_are_scoped_to_the_caller(client, parents):
+    (alice, _, alice_relationship), (carol, _, _) = parents
+    alice_since = sync(client, alice, 0)["next_since"]
+    carol_since = sync(client, carol, 0)["next_since"]
+    with server.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO conversations (title, date, relationship_id) VALUES ('Sync', '2024', ?)",
+                       (alice_relationship,))
+        cursor.execute("""
+            INSERT INTO messages (user_name, original_message, rewritten_message, conversation_id, timestamp)
+            VALUES ('Alice', 'original', 'See you at five', ?, '2024-01-01 10:00:00')
+        """, (cursor.lastrowid,))
+        message_id = cursor.lastrowid
+        cursor.execute("INSERT INTO calendar (event_label, event_time, relationship_id) VALUES ('Dentist', '2024', ?)",
+                       (alice_relationship,))
+        event_id = cursor.lastrowid
+        conn.commit()
+
+    feed = sync(client, alice, alice_since)
+    assert [row[0] for row in feed["changes"]["messages"]["upserted"]] == [message_id]
+    assert [event["id"] for event in feed["changes"]["calendar"]["upserted"]] == [event_id]
+    assert sync(client, carol, carol_since)["changes"] == {}
+
+    only_calendar = sync(client, alice, alice_since, tables="calendar")
+    assert list(only_calendar["changes"]) == ["calendar"]
+
+    with server.get_db_connection() as conn:
+        conn.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+        conn.commit()
+    after_delete = sync(client, alice, feed["next_since"])
+    assert after_delete["changes"]["messages"] == {"upserted": [], "deleted": [message_id]}
+    assert sync(client, carol, carol_since)["changes"] == {}
+
+
+def test_private_deletes_are_seen_only_by_their_owner(client, parents):
+    (alice, _, _), (carol, _, _) = parents
+    alice_since = sync(client, alice, 0)["next_since"]
+    carol_since = sync(client, carol, 0)["next_since"]
+    with server.get_db_connection() as conn:
+        entry_id = conn.execute("""
+            INSERT INTO personal_journal (title, content, entry_date, created_by, created_date)
+            VALUES ('Private', 'Notes', '2024', 'sync.alice@example.com', '2024')
+        """).lastrowid
+        conn.execute("DELETE FROM personal_journal WHERE id = ?", (entry_id,))
+        conn.commit()
+    assert sync(client, alice, alice_since)["changes"]["personal_journal"]["deleted"] == [entry_id]
+    assert sync(client, carol, carol_since)["changes"] == {}
+
+
+def test_pages_follow_the_limit(client, parents):
+    (alice, _, alice_relationship), _ = parents
+    since = sync(client, alice, 0)["next_since"]
+    with server.get_db_connection() as conn:
+        conn.executemany("INSERT INTO calendar (event_label, event_time, relationship_id) VALUES (?, '2024', ?)",
+                         [(f"Event {number}", alice_relationship) for number in range(3)])
+        conn.commit()
+    first = sync(client, alice, since, limit=2)
+    assert first["has_more"] is True and len(first["changes"]["calendar"]["upserted"]) == 2
+    second = sync(client, alice, first["next_since"], limit=2)
+    assert second["has_more"] is False and len(second["changes"]["calendar"]["upserted"]) == 1
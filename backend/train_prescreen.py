@@ -0,0 +1,115 @@
+"""Train the local pre-screen classifier from logged messages (original vs. rewritten).
+
+A message counts as needing a rewrite when its stored rewritten text differs from the original.
+Requires NumPy (training only; the server scores in pure Python).
+
+Usage: python backend/train_prescreen.py [--buckets 262144] [--epochs 300] [--out backend/prescreen_model.json]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import server  # noqa: E402
+
+
+def load_examples():
+    """Return (text, needs_rewrite) pairs for every logged message"""
+    with server.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT original_message, rewritten_message FROM messages
+            WHERE original_message IS NOT NULL AND original_message != ''
+        """)
+        rows = cursor.fetchall()
+    normalize = server.EvaluationCache.normalize
+    return [(original, normalize(original) != normalize(rewritten or original)) for original, rewritten in rows]
+
+
+def vectorize(texts, buckets):
+    """Flatten hashed features into (row_ids, indices) arrays"""
+    row_ids, indices = [], []
+    for row, text in enumerate(texts):
+        features = server.MessagePrescreen.features(text, buckets)
+        row_ids.extend([row] * len(features))
+        indices.extend(features)
+    return np.array(row_ids, dtype=np.int64), np.array(indices, dtype=np.int64)
+
+
+def predict(weights, bias, row_ids, indices, count):
+    z = bias + np.bincount(row_ids, weights=weights[indices], minlength=count)
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+def train(row_ids, indices, labels, buckets, epochs, learning_rate, l2):
+    """Full-batch gradient descent on L2-regularized logistic loss"""
+    count = len(labels)
+    weights = np.zeros(buckets)
+    bias = 0.0
+    for _ in range(epochs):
+        error = predict(weights, bias, row_ids, indices, count) - labels
+        gradient = np.bincount(indices, weights=error[row_ids], minlength=buckets) / count + l2 * weights
+        weights -= learning_rate * gradient
+        bias -= learning_rate * error.mean()
+    return weights, bias
+
+
+def report(label, texts, probabilities, labels, threshold):
+    """Print how many messages would skip the LLM and how many of those actually needed a rewrite"""
+    prescreen = server.message_prescreen
+    benign = np.array([p <= threshold and prescreen.lexicon_risk(t) == 0 for t, p in zip(texts, probabilities)])
+    false_negatives = int((benign & (labels == 1)).sum())
+    rate = false_negatives / benign.sum() if benign.sum() else 0.0
+    print(f"{label:<8} messages={len(labels)} flagged={int(labels.sum())} bypassed={int(benign.sum())} "
+          f"({benign.mean():.1%}) false_negatives={false_negatives} ({rate:.2%} of bypassed)")
+
+
+def main(args):
+    examples = load_examples()
+    if not examples:
+        sys.exit("No logged messages to train on")
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(examples))
+    split = int(len(examples) * (1 - args.holdout))
+    texts = [examples[i][0] for i in order]
+    labels = np.array([examples[i][1] for i in order], dtype=float)
+
+    train_rows, train_indices = vectorize(texts[:split], args.buckets)
+    weights, bias = train(train_rows, train_indices, labels[:split], args.buckets, args.epochs, args.learning_rate, args.l2)
+
+    for label, subset in (("train", slice(0, split)), ("holdout", slice(split, None))):
+        subset_texts, subset_labels = texts[subset], labels[subset]
+        if not subset_texts:
+            continue
+        rows, indices = vectorize(subset_texts, args.buckets)
+        report(label, subset_texts, predict(weights, bias, rows, indices, len(subset_texts)), subset_labels, args.threshold)
+
+    nonzero = np.flatnonzero(np.abs(weights) > 1e-4)
+    model = {
+        'buckets': args.buckets,
+        'bias': round(float(bias), 6),
+        'weights': {str(index): round(float(weights[index]), 6) for index in nonzero},
+        'trained_on': len(examples)
+    }
+    Path(args.out).write_text(json.dumps(model))
+    print(f"Wrote {len(nonzero)} weights to {args.out}")
+    server.db_executor.shutdown()
+    server.db_pool.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buckets", type=int, default=2 ** 18)
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--learning-rate", type=float, default=2.0)
+    parser.add_argument("--l2", type=float, default=1e-5)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=server.PRESCREEN_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=str(server.PRESCREEN_MODEL_PATH))
+    main(parser.parse_args())
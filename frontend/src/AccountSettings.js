@@ -318,6 +318,11 @@ function AccountSettings({ currentUser, onUpdateUser }) {
       });
       
       if (response.ok) {
+        const data = await response.json();
+        // Signed sessions are reissued after a password change
+        if (data.token) {
+          localStorage.setItem('authToken', data.token);
+        }
         setSuccessMessage('Password changed successfully!');
         setFormData(prev => ({
           ...prev,
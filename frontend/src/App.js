@@ -59,6 +59,15 @@ function App() {
   };
 
   const handleSignOut = () => {
+    // Revoke the token on the server; local sign out proceeds regardless
+    const token = localStorage.getItem('authToken') || authToken;
+    if (token) {
+      fetch(`${process.env.REACT_APP_BACKEND_URL}/api/auth/signout`, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` }
+      }).catch((error) => console.error('Error signing out:', error));
+    }
+
     setUser(null);
     setAuthToken(null);
     
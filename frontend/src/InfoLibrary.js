@@ -380,6 +380,17 @@ function InfoLibrary({ currentUser }) {
               <div className="entry-body">
                 <h4>{entry.title}</h4>
                 {entry.description && <p className="entry-description">{entry.description}</p>}
+
+                {entry.matches?.length > 0 && (
+                  <div className="page-matches">
+                    {entry.matches.map(match => (
+                      <p key={match.page} className="page-match">
+                        <span className="page-number">Page {match.page}</span>
+                        <span dangerouslySetInnerHTML={{ __html: match.snippet }} />
+                      </p>
+                    ))}
+                  </div>
+                )}
                 
                 {entry.is_file && (
                   <div className="file-details">
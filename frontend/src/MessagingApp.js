@@ -10,13 +10,17 @@ import AccountSettings from './AccountSettings';
 import HelpCenter from './HelpCenter';
 import AccountableCalling from './AccountableCalling';
 
+const MESSAGE_PAGE_SIZE = 50;
+
 function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
   const [connectionStatus, setConnectionStatus] = useState('Connecting...');
   const [ws, setWs] = useState(null);
   const [conversations, setConversations] = useState([]);
   const [selectedConversation, setSelectedConversation] = useState(null);
   const [messages, setMessages] = useState([]);
+  const [hasEarlierMessages, setHasEarlierMessages] = useState(false);
   const [newMessage, setNewMessage] = useState('');
+  const [streamingRewrite, setStreamingRewrite] = useState(null);
   const [showNewConversationModal, setShowNewConversationModal] = useState(false);
   const [newConversationTitle, setNewConversationTitle] = useState('');
   const [activeView, setActiveView] = useState('messaging');
@@ -40,6 +44,7 @@ function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
 
   const fileInputRef = useRef(null);
   const messagesEndRef = useRef(null);
+  const selectedConversationRef = useRef(null);
   
   // Use real user data or fallback
   const currentUser = user || {
@@ -157,10 +162,14 @@ function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
     }
   };
 
-  // Load messages for selected conversation
-  const loadMessages = async (conversationId) => {
+  // Load the newest page of messages, or the page before beforeId
+  const loadMessages = async (conversationId, beforeId = null) => {
     try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/conversation/${conversationId}/messages`, {
+      const params = new URLSearchParams({ limit: MESSAGE_PAGE_SIZE });
+      if (beforeId) {
+        params.set('before_id', beforeId);
+      }
+      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/conversation/${conversationId}/messages?${params}`, {
         headers: authToken ? {
           'Authorization': `Bearer ${authToken}`
         } : {}
@@ -187,18 +196,22 @@ function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
           hasAttachments: msg[13] || false, // has_attachments field
           attachmentCount: msg[14] || 0 // attachment_count field
         }));
-        setMessages(formattedMessages);
+        setHasEarlierMessages(data.length === MESSAGE_PAGE_SIZE);
+        setMessages(prev => beforeId ? [...formattedMessages, ...prev] : formattedMessages);
         
-        // Mark messages as read
-        for (const msg of formattedMessages) {
-          if (!msg.isCurrentUser && !msg.isRead) {
-            await markMessageAsRead(msg.id);
-          }
+        // Mark messages as read in one request
+        const unreadIds = formattedMessages
+          .filter(msg => !msg.isCurrentUser && !msg.isRead)
+          .map(msg => msg.id);
+        if (unreadIds.length > 0) {
+          await markMessagesAsRead(unreadIds);
         }
       }
     } catch (error) {
       console.error('Error loading messages:', error);
-      setMessages([]);
+      if (!beforeId) {
+        setMessages([]);
+      }
     }
   };
 
@@ -221,6 +234,24 @@ function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
     }
   };
 
+  const markMessagesAsRead = async (messageIds) => {
+    try {
+      await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/messages/read`, {
+        method: 'PUT',
+        headers: {
+          'Content-Type': 'application/json',
+          ...(authToken ? { 'Authorization': `Bearer ${authToken}` } : {})
+        },
+        body: JSON.stringify({
+          message_ids: messageIds,
+          read_by: getFullName()
+        })
+      });
+    } catch (error) {
+      console.error('Error marking messages as read:', error);
+    }
+  };
+
   // Search messages
   const searchMessages = async () => {
     if (!searchQuery.trim()) {
@@ -400,7 +431,7 @@ function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
   useEffect(() => {
     // Initialize WebSocket connection
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${protocol}//${window.location.hostname}:8001/ws`;
+    const wsUrl = `${protocol}//${window.location.hostname}:8001/ws${authToken ? `?token=${encodeURIComponent(authToken)}` : ''}`;
     
     try {
       const websocket = new WebSocket(wsUrl);
@@ -412,12 +443,26 @@ function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
       
       websocket.onmessage = (event) => {
         const data = JSON.parse(event.data);
-        if (data.type === 'message_evaluation_result') {
+        if (data.type === 'rewrite_delta') {
+          setStreamingRewrite(prev => (prev || '') + data.delta);
+        } else if (data.type === 'message_evaluation_result') {
+          setStreamingRewrite(null);
           handleMessageProcessed(data);
+        } else if (data.type === 'message_created') {
+          handleMessageCreated(data);
+        } else if (data.type === 'message_read') {
+          handleMessageRead(data);
+        } else if (data.type === 'notification') {
+          setNotifications(prev => [data, ...prev]);
+        } else if (data.type === 'error') {
+          // A rejected or failed evaluation never sends its result, so drop any partial rewrite
+          setStreamingRewrite(null);
+          console.error('Server error:', data.message);
         }
       };
       
       websocket.onclose = () => {
+        setStreamingRewrite(null);
         setConnectionStatus('Disconnected');
         console.log('WebSocket disconnected');
       };
@@ -441,6 +486,49 @@ function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
     loadConversations();
   }, [authToken]);
 
+  // Keep the server's conversation subscription in step with the open conversation
+  useEffect(() => {
+    const previous = selectedConversationRef.current;
+    selectedConversationRef.current = selectedConversation;
+    if (!ws || ws.readyState !== WebSocket.OPEN) return;
+    if (previous && (!selectedConversation || previous.id !== selectedConversation.id)) {
+      ws.send(JSON.stringify({ type: 'unsubscribe', conversation_id: previous.id }));
+    }
+    if (selectedConversation) {
+      ws.send(JSON.stringify({ type: 'subscribe', conversation_id: selectedConversation.id }));
+    }
+  }, [selectedConversation, ws]);
+
+  const handleMessageCreated = (data) => {
+    // A message sent by someone else (or from another of our sessions) in the open conversation
+    const conversation = selectedConversationRef.current;
+    if (!conversation || data.conversation_id !== conversation.id) return;
+
+    const isCurrentUser = data.user_email === currentUser.email;
+    setMessages(prev => prev.some(msg => msg.id === data.message_id) ? prev : [...prev, {
+      id: data.message_id,
+      sender: isCurrentUser ? 'You' : data.user_name,
+      content: data.message,
+      timestamp: new Date(data.timestamp).toLocaleString(),
+      isCurrentUser: isCurrentUser,
+      aiProcessed: false,
+      isRead: false,
+      hasAttachments: false,
+      attachmentCount: 0
+    }]);
+
+    if (!isCurrentUser) {
+      markMessageAsRead(data.message_id);
+    }
+  };
+
+  const handleMessageRead = (data) => {
+    // Read receipts pushed by the server replace re-fetching the conversation
+    setMessages(prev => prev.map(msg => data.message_ids.includes(msg.id)
+      ? { ...msg, isRead: data.is_read, readAt: data.read_at, readBy: data.read_by }
+      : msg));
+  };
+
   const handleMessageProcessed = (data) => {
     // Add the processed message to the conversation
     const newMsg = {
@@ -481,7 +569,8 @@ function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
       parental_role: currentUser.role,
       recipient_role: recipientRole,
       message: newMessage,
-      conversation_id: selectedConversation.id
+      conversation_id: selectedConversation.id,
+      stream: true
     };
 
     if (ws && ws.readyState === WebSocket.OPEN) {
@@ -692,21 +781,22 @@ function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
                     ) : (
                       searchResults.map(result => (
                         <div 
-                          key={result[0]} 
+                          key={result.id} 
                           className="search-result-item"
                           onClick={() => {
                             // Find and select the conversation
-                            const conv = conversations.find(c => c.id === result[5]);
+                            const conv = conversations.find(c => c.id === result.conversation_id);
                             if (conv) {
                               selectConversation(conv);
                             }
                           }}
                         >
-                          <div className="result-conversation">{result[10] || 'Unknown Conversation'}</div>
-                          <div className="result-content">{result[4]}</div>
+                          <div className="result-conversation">{result.conversation_title || 'Unknown Conversation'}</div>
+                          {/* The server escapes the snippet and only adds <mark> tags around matches */}
+                          <div className="result-content" dangerouslySetInnerHTML={{ __html: result.snippet }} />
                           <div className="result-meta">
-                            <span className="result-sender">{result[1]}</span>
-                            <span className="result-date">{new Date(result[6]).toLocaleString()}</span>
+                            <span className="result-sender">{result.user_name}</span>
+                            <span className="result-date">{new Date(result.timestamp).toLocaleString()}</span>
                           </div>
                         </div>
                       ))
@@ -806,7 +896,16 @@ function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
                         <p>Start a conversation below - all messages are AI-enhanced for safety.</p>
                       </div>
                     ) : (
-                      messages.map(message => (
+                      <>
+                      {hasEarlierMessages && (
+                        <button
+                          className="load-earlier-button"
+                          onClick={() => loadMessages(selectedConversation.id, messages[0].id)}
+                        >
+                          Load earlier messages
+                        </button>
+                      )}
+                      {messages.map(message => (
                         <div 
                           key={message.id} 
                           className={`message ${message.isCurrentUser ? 'sent' : 'received'}`}
@@ -828,7 +927,18 @@ function MessagingApp({ user, authToken, onSignOut, onUpdateUser }) {
                             )}
                           </div>
                         </div>
-                      ))
+                      ))}
+                      </>
+                    )}
+                    {streamingRewrite !== null && (
+                      <div className="message sent streaming">
+                        <div className="message-content">
+                          <p>{streamingRewrite}</p>
+                        </div>
+                        <div className="message-meta">
+                          <span className="timestamp">AI is rewriting your message...</span>
+                        </div>
+                      </div>
                     )}
                     <div ref={messagesEndRef} />
                   </div>
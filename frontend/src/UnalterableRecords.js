@@ -369,6 +369,17 @@ function UnalterableRecords({ currentUser }) {
               <div className="record-body">
                 <h4>{record.title}</h4>
                 {record.description && <p className="record-description">{record.description}</p>}
+
+                {record.matches?.length > 0 && (
+                  <div className="page-matches">
+                    {record.matches.map(match => (
+                      <p key={match.page} className="page-match">
+                        <span className="page-number">Page {match.page}</span>
+                        <span dangerouslySetInnerHTML={{ __html: match.snippet }} />
+                      </p>
+                    ))}
+                  </div>
+                )}
                 
                 <div className="file-details">
                   <p><strong>Original File:</strong> {record.original_file_name}</p>